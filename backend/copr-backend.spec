@@ -6,7 +6,7 @@
 %global tests_version 5
 %global tests_tar test-data-copr-backend
 
-%global copr_common_version 0.20.1.dev1
+%global copr_common_version 0.21.1.dev1
 
 Name:       copr-backend
 Version:    1.173
@@ -137,6 +137,8 @@ make -C docs %{?_smp_mflags} html
 
 
 install -d %{buildroot}%{_sharedstatedir}/copr/public_html/results
+install -d %{buildroot}%{_sharedstatedir}/copr/trash
+install -d %{buildroot}%{_sharedstatedir}/copr-backend
 install -d %{buildroot}%{_pkgdocdir}/lighttpd/
 install -d %{buildroot}%{_sysconfdir}/copr
 install -d %{buildroot}%{_sysconfdir}/logrotate.d/
@@ -199,6 +201,7 @@ useradd -r -g copr -G lighttpd -s /bin/bash -c "COPR user" copr
 %systemd_postun_with_restart copr-backend-log.service
 %systemd_postun_with_restart copr-backend-build.service
 %systemd_postun_with_restart copr-backend-action.service
+%systemd_postun_with_restart copr-backend-trash-reaper.service
 
 %files
 %license LICENSE
@@ -208,6 +211,8 @@ useradd -r -g copr -G lighttpd -s /bin/bash -c "COPR user" copr
 %dir %{_sharedstatedir}/copr
 %dir %attr(0755, copr, copr) %{_sharedstatedir}/copr/public_html/
 %dir %attr(0755, copr, copr) %{_sharedstatedir}/copr/public_html/results
+%dir %attr(0700, copr, copr) %{_sharedstatedir}/copr/trash
+%dir %attr(0755, copr, copr) %{_sharedstatedir}/copr-backend
 %dir %attr(0755, copr, copr) %{_var}/run/copr-backend
 %dir %attr(0755, copr, copr) %{_var}/log/copr-backend
 
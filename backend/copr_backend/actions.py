@@ -6,8 +6,7 @@ import time
 import traceback
 import base64
 
-from distutils.dir_util import copy_tree
-from distutils.errors import DistutilsFileError
+from concurrent.futures import ThreadPoolExecutor
 from urllib.request import urlretrieve
 from copr.exceptions import CoprRequestException
 from requests import RequestException
@@ -26,8 +25,9 @@ from .exceptions import CreateRepoError, CoprSignError, FrontendClientException
 from .helpers import (get_redis_logger, silent_remove, ensure_dir_exists,
                       get_chroot_arch, format_filename,
                       uses_devel_repo, call_copr_repo, build_chroot_log_name,
-                      copy2_but_hardlink_rpms)
-from .sign import sign_rpms_in_dir, unsign_rpms_in_dir, get_pubkey
+                      copy2_but_hardlink_rpms, copy2_for_fork)
+from .sign import sign_rpms_in_dir, unsign_rpms_in_dir, PubkeyCache
+from .trash import move_to_trash
 
 
 class Action(object):
@@ -154,7 +154,80 @@ class GPGMixin(object):
             return False
 
 
+def _dir_size(path):
+    size = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            size += os.path.getsize(os.path.join(root, name))
+    return size
+
+
 class Fork(Action, GPGMixin):
+    """
+    Fork the project results directory.  The chroot directories are processed
+    in parallel (up to 'fork_workers' at a time).  In each chroot, the builds
+    are copied one by one (non-RPM files are hardlinked, RPMs reflinked if
+    possible), while the already copied builds are being re-signed.
+    """
+
+    def _resign_build(self, dst_path, chroot, sign, data):
+        # Drop old signatures coming from original repo and re-sign.
+        unsign_rpms_in_dir(dst_path, opts=self.opts, log=self.log)
+        if sign:
+            sign_rpms_in_dir(data["user"], data["copr"], dst_path,
+                             chroot, opts=self.opts, log=self.log)
+
+    def _fork_chroot(self, chroot, src_dst_dir, old_path, new_path, sign, data):
+        """
+        Fork one chroot directory, return True if successful.
+        """
+        start = time.time()
+        old_chroot_path = os.path.join(old_path, chroot)
+        new_chroot_path = os.path.join(new_path, chroot)
+        attempted = False
+        forked = 0
+        forked_bytes = 0
+
+        # signing of the previous build overlaps with copying of the next one
+        with ThreadPoolExecutor(max_workers=1) as signer:
+            signing = []
+            for src_dir, dst_dir in src_dst_dir.items():
+                if not src_dir or not dst_dir:
+                    continue
+
+                attempted = True
+                src_path = os.path.join(old_chroot_path, src_dir)
+                dst_path = os.path.join(new_chroot_path, dst_dir)
+
+                ensure_dir_exists(dst_path, self.log)
+
+                try:
+                    shutil.copytree(src_path, dst_path, dirs_exist_ok=True,
+                                    copy_function=copy2_for_fork)
+                except (shutil.Error, OSError) as e:
+                    self.log.error(str(e))
+                    continue
+
+                forked += 1
+                forked_bytes += _dir_size(dst_path)
+                signing.append((src_path, dst_path, signer.submit(
+                    self._resign_build, dst_path, chroot, sign, data)))
+
+            for src_path, dst_path, future in signing:
+                future.result()
+                self.log.info("Forked build %s as %s", src_path, dst_path)
+
+        if not attempted:
+            return True
+
+        result = call_copr_repo(new_chroot_path, logger=self.log)
+        took = time.time() - start
+        self.log.info("Forked chroot %s: %s builds, %.1f MiB in %.1fs "
+                      "(%.1f builds/s, %.1f MiB/s)", chroot, forked,
+                      forked_bytes / 2**20, took, forked / max(took, 0.001),
+                      forked_bytes / 2**20 / max(took, 0.001))
+        return result
+
     def run(self):
         sign = self.opts.do_sign
         self.log.info("Action fork %s", self.data["object_type"])
@@ -176,46 +249,28 @@ class Fork(Action, GPGMixin):
                 # Generate brand new gpg key.
                 self.generate_gpg_key(data["user"], data["copr"])
                 # Put the new public key into forked build directory.
-                get_pubkey(data["user"], data["copr"], self.log, self.opts.sign_domain, pubkey_path)
-
-            chroot_paths = set()
-            for chroot, src_dst_dir in builds_map.items():
-
-                if not chroot or not src_dst_dir:
-                    continue
-
-                for old_dir_name, new_dir_name in src_dst_dir.items():
-                    src_dir, dst_dir = old_dir_name, new_dir_name
-
-                    if not src_dir or not dst_dir:
-                        continue
-
-                    old_chroot_path = os.path.join(old_path, chroot)
-                    new_chroot_path = os.path.join(new_path, chroot)
-                    chroot_paths.add(new_chroot_path)
-
-                    src_path = os.path.join(old_chroot_path, src_dir)
-                    dst_path = os.path.join(new_chroot_path, dst_dir)
-
-                    ensure_dir_exists(dst_path, self.log)
-
-                    try:
-                        copy_tree(src_path, dst_path)
-                    except DistutilsFileError as e:
-                        self.log.error(str(e))
-                        continue
-
-                    # Drop old signatures coming from original repo and re-sign.
-                    unsign_rpms_in_dir(dst_path, opts=self.opts, log=self.log)
-                    if sign:
-                        sign_rpms_in_dir(data["user"], data["copr"], dst_path,
-                                         chroot, opts=self.opts, log=self.log)
-
-                    self.log.info("Forked build %s as %s", src_path, dst_path)
+                PubkeyCache(self.opts, self.log).get(
+                    data["user"], data["copr"], pubkey_path)
+
+            chroots = {chroot: src_dst_dir
+                       for chroot, src_dst_dir in builds_map.items()
+                       if chroot and src_dst_dir}
+            workers = max(1, min(self.opts.fork_workers, len(chroots)))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = [
+                    executor.submit(self._fork_chroot, chroot, src_dst_dir,
+                                    old_path, new_path, sign, data)
+                    for chroot, src_dst_dir in chroots.items()
+                ]
+                # wait for all the chroots, even if some of them fail
+                results = [future.exception() or future.result()
+                           for future in futures]
 
             result = ActionResult.SUCCESS
-            for chroot_path in chroot_paths:
-                if not call_copr_repo(chroot_path, logger=self.log):
+            for chroot_result in results:
+                if isinstance(chroot_result, Exception):
+                    raise chroot_result
+                if not chroot_result:
                     result = ActionResult.FAILURE
 
         except (CoprSignError, CreateRepoError, CoprRequestException, IOError) as ex:
@@ -255,17 +310,17 @@ class Delete(Action):
                                       logger=self.log):
                     result = ActionResult.FAILURE
 
+            log_paths = []
             for build_id in build_ids or []:
-                log_paths = [
+                log_paths += [
                     os.path.join(chroot_path, build_chroot_log_name(build_id)),
                     # we used to create those before
                     os.path.join(chroot_path, 'build-{}.rsync.log'.format(build_id)),
                     os.path.join(chroot_path, 'build-{}.log'.format(build_id))]
-                for log_path in log_paths:
-                    try:
-                        os.unlink(log_path)
-                    except OSError:
-                        self.log.debug("can't remove %s", log_path)
+            try:
+                move_to_trash(self.opts, log_paths, self.log)
+            except OSError:
+                self.log.exception("can't remove %s", ", ".join(log_paths))
         return result
 
 
@@ -283,6 +338,7 @@ class DeleteProject(Delete):
             result = ActionResult.FAILURE
             return result
 
+        paths = []
         for dirname in project_dirnames:
             if not dirname:
                 self.log.warning("Received empty dirname!")
@@ -290,7 +346,8 @@ class DeleteProject(Delete):
             path = os.path.join(self.destdir, ownername, dirname)
             if os.path.exists(path):
                 self.log.info("Removing copr dir %s", path)
-                shutil.rmtree(path)
+                paths.append(path)
+        move_to_trash(self.opts, paths, self.log)
         return result
 
 
@@ -401,7 +458,7 @@ class DeleteChroot(Delete):
         if not os.path.isdir(chroot_path):
             self.log.error("Directory %s not found", chroot_path)
             return ActionResult.SUCCESS
-        shutil.rmtree(chroot_path)
+        move_to_trash(self.opts, [chroot_path], self.log)
         return ActionResult.SUCCESS
 
 
@@ -526,10 +583,10 @@ class RemoveDirs(Action):
             assert ':pr:' in copr_dir
             directory = os.path.join(self.destdir, copr_dir)
             self.log.info("RemoveDirs: removing %s", directory)
-            try:
-                shutil.rmtree(directory)
-            except FileNotFoundError:
+            if not os.path.exists(directory):
                 self.log.error("RemoveDirs: %s not found", directory)
+                continue
+            move_to_trash(self.opts, [directory], self.log)
 
     def run(self):
         result = ActionResult.FAILURE
@@ -23,12 +23,13 @@ from copr_backend.exceptions import (
     CoprBackendError,
     FrontendClientException,
 )
+from copr_backend.frontend import FrontendUpdateQueue
 from copr_backend.helpers import (
     call_copr_repo, run_cmd, register_build_result, format_evr,
 )
 from copr_backend.job import BuildJob
 from copr_backend.msgbus import MessageSender
-from copr_backend.sign import sign_rpms_in_dir, get_pubkey
+from copr_backend.sign import sign_rpms_in_dir, PubkeyCache
 from copr_backend.sshcmd import SSHConnection, SSHConnectionError
 from copr_backend.vm_alloc import ResallocHostFactory
 
@@ -262,6 +263,15 @@ class BuildBackgroundWorker(BackendBackgroundWorker):
             ))
 
     def _update_frontend_task(self, data):
+        if self.opts.frontend_update_batching and self.has_wm:
+            # Sent to frontend by the build dispatcher, in batches
+            self.log.info("Queueing build state for frontend: %s",
+                          json.dumps(data, indent=4))
+            queue = FrontendUpdateQueue(self._redis, log=self.log)
+            for build in data["builds"]:
+                queue.push(build)
+            return
+
         self.log.info("Sending build state back to frontend: %s",
                       json.dumps(data, indent=4))
         self.frontend_client.update(data)
@@ -736,7 +746,7 @@ class BuildBackgroundWorker(BackendBackgroundWorker):
         # TODO: uncomment this when key revoke/change will be implemented
         # if os.path.exists(pubkey_path):
         #    return
-        get_pubkey(user, project, self.log, self.opts.sign_domain, pubkey_path)
+        PubkeyCache(self.opts, self.log).get(user, project, pubkey_path)
         self.log.info("Added pubkey for user %s project %s into: %s",
                       user, project, pubkey_path)
 
@@ -2,8 +2,12 @@
 BuildDispatcher related classes.
 """
 
+import time
+
+from copr_common.redis_helpers import get_redis_connection
 from copr_common.worker_manager import HashWorkerLimit
 from copr_backend.dispatcher import BackendDispatcher
+from copr_backend.frontend import FrontendUpdateQueue
 from copr_backend.rpm_builds import (
     ArchitectureWorkerLimit,
     ArchitectureUserWorkerLimit,
@@ -84,6 +88,14 @@ class BuildDispatcher(BackendDispatcher):
         super().__init__(backend_opts)
         self.max_workers = backend_opts.builds_max_workers
 
+        # the last downloaded build queue, {task_id: raw_task}, and the
+        # corresponding /pending-jobs/delta/ cursor
+        self._pending_jobs = {}
+        self._pending_jobs_cursor = None
+        self._last_full_fetch = 0
+        # FrontendUpdateQueue, if frontend_update_batching is enabled
+        self._update_queue = None
+
         for tag_type in ["arch", "tag", "arch_per_owner"]:
             match tag_type:
                 case "arch":
@@ -105,13 +117,97 @@ class BuildDispatcher(BackendDispatcher):
                 name=limit_type,
             ))
 
+    def _fetch_all_raw_tasks(self):
+        """
+        Download the whole build queue from frontend.  When the delta mode is
+        enabled, get the /pending-jobs/delta/ cursor first, so we don't miss
+        any change happening while the (potentially large) queue is generated.
+        """
+        cursor = None
+        if self.opts.pending_jobs_delta:
+            try:
+                cursor = self.frontend_client.get('pending-jobs/cursor').json()["cursor"]
+            except (FrontendClientException, ValueError, KeyError) as error:
+                self.log.warning("Can't get pending-jobs cursor: %s", error)
+
+        raw_tasks = self.frontend_client.get('pending-jobs').json()
+        self._pending_jobs_cursor = cursor
+        self._pending_jobs = {raw["task_id"]: raw for raw in raw_tasks}
+        self._last_full_fetch = time.time()
+        return raw_tasks
+
+    def _fetch_raw_tasks_delta(self):
+        """
+        Apply the changes in the build queue since the last cursor to the
+        previously downloaded queue.  Return None if full queue download is
+        needed.
+        """
+        if self._pending_jobs_cursor is None:
+            return None
+        if time.time() - self._last_full_fetch > self.opts.pending_jobs_full_fetch_period:
+            return None
+
+        delta = self.frontend_client.get(
+            'pending-jobs/delta/{}'.format(self._pending_jobs_cursor)).json()
+        if delta["full"]:
+            self.log.info("Frontend asks for full pending-jobs download")
+            return None
+
+        changed = set(delta["builds"])
+        self._pending_jobs = {
+            task_id: raw for task_id, raw in self._pending_jobs.items()
+            if raw["build_id"] not in changed
+        }
+        for raw in delta["tasks"]:
+            self._pending_jobs[raw["task_id"]] = raw
+        self._pending_jobs_cursor = delta["cursor"]
+        self.log.info("Applied pending-jobs delta: %s builds changed, "
+                      "%s tasks updated", len(changed), len(delta["tasks"]))
+
+        # The same order as the full /pending-jobs/ output (SRPM tasks first),
+        # so the _PriorityCounter gives us the same numbers.
+        return sorted(self._pending_jobs.values(), key=lambda raw: (
+            "-" in raw["task_id"], bool(raw.get("background")),
+            int(raw["build_id"]), raw["task_id"]))
+
+    def _flush_build_updates(self):
+        """
+        Send the build state updates queued by the build workers to frontend.
+        This needs to happen before the build queue is downloaded, otherwise
+        the already finished tasks could appear as still running or pending.
+        Return False if frontend isn't responding; the updates stay queued, and
+        the build queue must not be downloaded in this cycle.  The updates
+        rejected by frontend don't block the queue, see FrontendUpdateQueue.
+        """
+        if not self.opts.frontend_update_batching:
+            return True
+        if self._update_queue is None:
+            self._update_queue = FrontendUpdateQueue(
+                get_redis_connection(self.opts), self.frontend_client,
+                self.log)
+        try:
+            self._update_queue.flush()
+        except FrontendClientException as error:
+            self.log.exception("Sending the build updates to %s failed, not "
+                               "downloading the build queue: %s",
+                               self.opts.frontend_base_url, error)
+            return False
+        return True
+
     def get_frontend_tasks(self):
         """
         Retrieve a list of build jobs to be done.
         """
+        if not self._flush_build_updates():
+            return []
+
         try:
-            raw_tasks = self.frontend_client.get('pending-jobs').json()
-        except (FrontendClientException, ValueError) as error:
+            raw_tasks = None
+            if self.opts.pending_jobs_delta:
+                raw_tasks = self._fetch_raw_tasks_delta()
+            if raw_tasks is None:
+                raw_tasks = self._fetch_all_raw_tasks()
+        except (FrontendClientException, ValueError, KeyError) as error:
             self.log.exception("Retrieving build jobs from %s failed with error: %s",
                                self.opts.frontend_base_url, error)
             return []
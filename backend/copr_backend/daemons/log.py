@@ -5,6 +5,7 @@ import json
 import logging
 import logging.handlers
 import os
+import time
 from setproctitle import setproctitle
 
 from copr_common.redis_helpers import get_redis_connection
@@ -14,14 +15,61 @@ from .. import constants
 from .. import helpers
 
 
+class BufferedWatchedFileHandler(logging.handlers.WatchedFileHandler):
+    """
+    WatchedFileHandler which doesn't flush (and doesn't stat() the file for
+    the logrotate changes) after each record.  The buffered records are
+    written by an explicit flush_buffer() call.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buffered = 0
+
+    def emit(self, record):
+        try:
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write(self.format(record) + self.terminator)
+            self.buffered += 1
+        except Exception:  # pylint: disable=broad-except
+            self.handleError(record)
+
+    def flush_buffer(self):
+        """
+        Write the buffered records, and re-open the file if it was rotated
+        """
+        if not self.buffered:
+            return
+        self.flush()
+        self.reopenIfNeeded()
+        self.buffered = 0
+
+
 class RedisLogHandler(object):
     """
     Single point to collect logs through redis pub/sub and write
         them through standard python logging lib
+
+    The records are popped from the Redis FIFO per BATCH_SIZE, and written to
+    the log files once there are FLUSH_SIZE records buffered, FLUSH_INTERVAL
+    seconds passed, or the FIFO is empty.
     """
 
+    BATCH_SIZE = 500
+    FLUSH_SIZE = 5000
+    FLUSH_INTERVAL = 1
+    # Report the FIFO backlog in logger.log when it's larger than this
+    BACKLOG_WARNING = 10000
+    BACKLOG_REPORT_INTERVAL = 60
+
     def __init__(self, opts):
         self.opts = opts
+        self.handlers = []
+        self.buffered = 0
+        self.last_flush = time.time()
+        self.backlog = 0
+        self.last_report = 0
 
         self.log_dir = os.path.dirname(self.opts.log_dir)
         if not os.path.exists(self.log_dir):
@@ -41,12 +89,13 @@ class RedisLogHandler(object):
 
         for component in self.components:
             logger = logging.Logger(component)
-            handler = logging.handlers.WatchedFileHandler(
+            handler = BufferedWatchedFileHandler(
                 filename=os.path.join(self.log_dir, "{}.log".format(component)))
             handler.setFormatter(self.opts.log_format)
             handler.setLevel(level)
             logger.addHandler(handler)
             self.loggers[component] = logger
+            self.handlers.append(handler)
 
     def handle_msg(self, json_event):
         try:
@@ -64,13 +113,63 @@ class RedisLogHandler(object):
         except Exception as err:
             self.main_logger.exception(err)
 
+    def flush(self):
+        """
+        Write all the buffered records to the log files
+        """
+        for handler in self.handlers:
+            handler.flush_buffer()
+        self.buffered = 0
+        self.last_flush = time.time()
+
+    def handle_batch(self, rc):
+        """
+        Pop (without blocking) and handle up to BATCH_SIZE records from the
+        Redis FIFO, in one round-trip.  Return the number of handled records.
+        """
+        pipe = rc.pipeline()
+        pipe.lrange(constants.LOG_REDIS_FIFO, 0, self.BATCH_SIZE - 1)
+        pipe.ltrim(constants.LOG_REDIS_FIFO, self.BATCH_SIZE, -1)
+        pipe.llen(constants.LOG_REDIS_FIFO)
+        events, _, self.backlog = pipe.execute()
+
+        for json_event in events:
+            self.handle_msg(json_event)
+
+        self.buffered += len(events)
+        if self.buffered >= self.FLUSH_SIZE \
+                or time.time() - self.last_flush >= self.FLUSH_INTERVAL:
+            self.flush()
+
+        self.report_backlog()
+        return len(events)
+
+    def report_backlog(self):
+        """
+        Show the number of records waiting in the Redis FIFO in the process
+        title, and warn in logger.log if we are falling behind.
+        """
+        now = time.time()
+        if now - self.last_report < self.BACKLOG_REPORT_INTERVAL:
+            return
+        self.last_report = now
+        setproctitle("RedisLogHandler [backlog {}]".format(self.backlog))
+        if self.backlog >= self.BACKLOG_WARNING:
+            self.main_logger.warning("Log FIFO backlog: %s records",
+                                     self.backlog)
+
     def run(self):
         self.setup_logging()
         setproctitle("RedisLogHandler")
 
         rc = get_redis_connection(self.opts)
         while True:
-            # indefinitely wait for the next entry, note that blpop returns
-            # tuple (FIFO_NAME, ELEMENT)
+            if self.handle_batch(rc):
+                continue
+
+            # Nothing to do, write everything and indefinitely wait for the
+            # next entry, note that blpop returns tuple (FIFO_NAME, ELEMENT)
+            self.flush()
             (_, json_event) = rc.blpop([constants.LOG_REDIS_FIFO])
             self.handle_msg(json_event)
+            self.buffered += 1
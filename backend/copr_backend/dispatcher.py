@@ -25,3 +25,5 @@ class BackendDispatcher(Dispatcher):
 
         self.frontend_client = FrontendClient(self.opts, self.log)
         self.sleeptime = opts.sleeptime
+        self.incremental_sync = opts.incremental_queue_sync
+        self.worker_events = opts.worker_events
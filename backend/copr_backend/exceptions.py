@@ -133,3 +133,9 @@ class DispatchBuildError(CoprBackendError):
 
 class FrontendClientException(Exception):
     pass
+
+
+class FrontendClientRejected(FrontendClientException):
+    """
+    Frontend refused the request (HTTP 4xx), repeating it doesn't help
+    """
@@ -3,10 +3,21 @@ The logic behind contacting Copr Frontend from Backend.  All the requests to
 the /backend/ Flask blueprint should go through this FrontendClient API.
 """
 
+import json
 import logging
-
-from copr_common.request import SafeRequest, RequestError
-from copr_backend.exceptions import FrontendClientException
+import time
+
+from copr_common.request import (
+    DEFAULT_POOL_SIZE,
+    RequestClientError,
+    RequestError,
+    SafeRequest,
+    get_session,
+)
+from copr_backend.exceptions import (
+    FrontendClientException,
+    FrontendClientRejected,
+)
 
 # The frontend counterpart is in `backend_general:send_frontend_version`
 MIN_FE_BE_API = 6
@@ -23,6 +34,10 @@ class FrontendClient:
         self.frontend_url = "{}/backend".format(opts.frontend_base_url)
         self.frontend_auth = opts.frontend_auth
         self.try_indefinitely = try_indefinitely
+        # All the FrontendClient instances share the keep-alive connections.
+        self.session = get_session(
+            pool_size=getattr(opts, "frontend_pool_size", DEFAULT_POOL_SIZE))
+        self.compress = getattr(opts, "frontend_gzip_requests", False)
 
         self.msg = None
         self.logger = logger
@@ -72,9 +87,13 @@ class FrontendClient:
 
         try:
             request = SafeRequest(auth=auth, log=self.log,
-                                  try_indefinitely=self.try_indefinitely)
+                                  try_indefinitely=self.try_indefinitely,
+                                  session=self.session,
+                                  compress=self.compress)
             response = request.send(url, method=method, data=data)
             return response
+        except RequestClientError as ex:
+            raise FrontendClientRejected(str(ex)) from ex
         except RequestError as ex:
             raise FrontendClientException(str(ex)) from ex
 
@@ -101,3 +120,135 @@ class FrontendClient:
         """
         data = {"build_id": build_id, "task_id": task_id, "chroot": chroot_name}
         self.post("reschedule_build_chroot", data)
+
+
+class FrontendUpdateQueue:
+    """
+    Coalescing queue of the build state updates (the /backend/update/ payload
+    items), stored in a Redis list.  Background workers push() the updates,
+    and the build dispatcher periodically flush()es them to frontend in
+    batches — so frontend commits one transaction per batch instead of one per
+    each update.
+
+    The updates are sent in the FIFO order.  Frontend only processes one update
+    per build ID in one request, so the batch is also cut before the second
+    update for the same build (e.g. 'running' and 'succeeded' state of the same
+    build chroot).
+
+    The batch size and latency statistics are kept in the STATS_KEY Redis hash.
+
+    When frontend rejects a batch (HTTP 4xx), the batch is bisected to find the
+    rejected updates, and those are moved to the DEAD_LETTER_KEY Redis list,
+    so they don't block the rest of the queue.
+    """
+
+    QUEUE_KEY = "frontend_update_queue:builds"
+    STATS_KEY = "frontend_update_queue:stats"
+    DEAD_LETTER_KEY = "frontend_update_queue:rejected"
+
+    def __init__(self, redis_connection, frontend_client=None, log=None,
+                 max_batch=100):
+        self.redis = redis_connection
+        self.frontend_client = frontend_client
+        self.log = log or logging.getLogger(__name__)
+        self.max_batch = max_batch
+
+    def push(self, build_dict):
+        """
+        Queue the build update (one item of the 'builds' list).
+        """
+        self.redis.rpush(self.QUEUE_KEY, json.dumps({
+            "queued": time.time(),
+            "data": build_dict,
+        }))
+
+    def _next_batch(self):
+        items = self.redis.lrange(self.QUEUE_KEY, 0, self.max_batch - 1)
+        batch = []
+        seen = set()
+        for item in items:
+            item = json.loads(item)
+            build_id = item["data"].get("id")
+            if build_id in seen:
+                break
+            seen.add(build_id)
+            batch.append(item)
+        return batch
+
+    def _record_stats(self, batch, now):
+        latency = now - batch[0]["queued"]
+        pipe = self.redis.pipeline()
+        pipe.hincrby(self.STATS_KEY, "batches", 1)
+        pipe.hincrby(self.STATS_KEY, "updates", len(batch))
+        pipe.hincrbyfloat(self.STATS_KEY, "latency_sum", latency)
+        pipe.execute()
+        # not atomic, but there's only one flush()ing process
+        stats = self.stats()
+        if len(batch) > stats["size_max"]:
+            self.redis.hset(self.STATS_KEY, "size_max", len(batch))
+        if latency > stats["latency_max"]:
+            self.redis.hset(self.STATS_KEY, "latency_max", latency)
+        return latency
+
+    def _send_batch(self, batch, latencies):
+        """
+        Send the BATCH (the head of the queue) to frontend, and drop it from
+        the queue.  Return the number of sent updates.
+        """
+        try:
+            self.frontend_client.update(
+                {"builds": [item["data"] for item in batch]})
+        except FrontendClientRejected as error:
+            if len(batch) > 1:
+                half = len(batch) // 2
+                return self._send_batch(batch[:half], latencies) + \
+                    self._send_batch(batch[half:], latencies)
+            self.log.error("Frontend rejected build update %s, moving it to "
+                           "%s: %s", batch[0]["data"], self.DEAD_LETTER_KEY,
+                           error)
+            pipe = self.redis.pipeline()
+            pipe.rpush(self.DEAD_LETTER_KEY, json.dumps(batch[0]))
+            pipe.ltrim(self.QUEUE_KEY, 1, -1)
+            pipe.execute()
+            return 0
+
+        self.redis.ltrim(self.QUEUE_KEY, len(batch), -1)
+        latencies.append(self._record_stats(batch, time.time()))
+        return len(batch)
+
+    def flush(self):
+        """
+        Send all the queued updates to frontend.  Raise FrontendClientException
+        if frontend isn't responding, the unsent updates are kept queued.  The
+        updates rejected by frontend are moved to DEAD_LETTER_KEY.  Return the
+        number of sent updates.
+        """
+        sent = 0
+        latencies = []
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                break
+            sent += self._send_batch(batch, latencies)
+
+        if sent:
+            self.log.info("Sent %s build updates to frontend in %s batches, "
+                          "max latency %.2fs", sent, len(latencies),
+                          max(latencies))
+        return sent
+
+    def stats(self):
+        """
+        Return the batch statistics dictionary; the number of sent 'batches'
+        and 'updates', the maximum batch size 'size_max', and the latency
+        (time between queueing the first update in the batch and sending the
+        batch) as 'latency_sum' and 'latency_max'.
+        """
+        stats = self.redis.hgetall(self.STATS_KEY)
+        return {
+            "batches": int(stats.get("batches", 0)),
+            "updates": int(stats.get("updates", 0)),
+            "size_max": int(stats.get("size_max", 0)),
+            "latency_sum": float(stats.get("latency_sum", 0)),
+            "latency_max": float(stats.get("latency_max", 0)),
+        }
@@ -5,6 +5,7 @@ import optparse
 import os
 import sys
 import errno
+import fcntl
 import time
 import types
 import glob
@@ -19,7 +20,7 @@ from operator import methodcaller
 import traceback
 
 from datetime import datetime
-from threading import Thread
+from threading import Thread, Timer
 
 import subprocess
 
@@ -309,6 +310,12 @@ class BackendConfigReader(object):
         opts.sign_domain = _get_conf(
             cp, "backend", "sign_domain", DOMAIN)
 
+        opts.sign_parallelism = _get_conf(
+            cp, "backend", "sign_parallelism", 1, mode="int")
+
+        opts.fork_workers = _get_conf(
+            cp, "backend", "fork_workers", 4, mode="int")
+
         opts.build_groups = []
         for group_id in range(opts.build_groups_count):
             archs = _get_conf(cp, "backend",
@@ -366,11 +373,31 @@ class BackendConfigReader(object):
             default=5, mode="int")
 
         opts.destdir = _get_conf(cp, "backend", "destdir", None, mode="path")
+        opts.trash_dir = _get_conf(
+            cp, "backend", "trash_dir", "/var/lib/copr/trash")
+        opts.trash_reaper_rate = _get_conf(
+            cp, "backend", "trash_reaper_rate", 1000, mode="int")
+        opts.trash_reaper_sleeptime = _get_conf(
+            cp, "backend", "trash_reaper_sleeptime", 60, mode="int")
 
         opts.fedmsg_enabled = _get_conf(
             cp, "backend", "fedmsg_enabled", False, mode="bool")
         opts.sleeptime = _get_conf(
             cp, "backend", "sleeptime", 5, mode="int")
+        opts.incremental_queue_sync = _get_conf(
+            cp, "backend", "incremental_queue_sync", False, mode="bool")
+        opts.worker_events = _get_conf(
+            cp, "backend", "worker_events", False, mode="bool")
+        opts.pending_jobs_delta = _get_conf(
+            cp, "backend", "pending_jobs_delta", False, mode="bool")
+        opts.pending_jobs_full_fetch_period = _get_conf(
+            cp, "backend", "pending_jobs_full_fetch_period", 600, mode="int")
+        opts.frontend_pool_size = _get_conf(
+            cp, "backend", "frontend_pool_size", 10, mode="int")
+        opts.frontend_gzip_requests = _get_conf(
+            cp, "backend", "frontend_gzip_requests", False, mode="bool")
+        opts.frontend_update_batching = _get_conf(
+            cp, "backend", "frontend_update_batching", False, mode="bool")
         opts.timeout = _get_conf(
             cp, "builder", "timeout", DEF_BUILD_TIMEOUT, mode="int")
         opts.consecutive_failure_threshold = _get_conf(
@@ -398,6 +425,8 @@ class BackendConfigReader(object):
             cp, "backend", "log_level", "info")
         opts.log_format = _get_conf(
             cp, "backend", "log_format", default_log_format)
+        opts.log_buffer_size = _get_conf(
+            cp, "backend", "log_buffer_size", 0, mode="int")
 
         opts.statsdir = _get_conf(
             cp, "backend", "statsdir", "/var/lib/copr/public_html/stats")
@@ -408,6 +437,9 @@ class BackendConfigReader(object):
 
         opts.prune_days = _get_conf(cp, "backend", "prune_days", None, mode="int")
 
+        opts.pubkey_cache_ttl = _get_conf(
+            cp, "backend", "pubkey_cache_ttl", 86400, mode="int")
+
         opts.gently_gpg_sha256 = _get_conf(
             cp, "backend", "gently_gpg_sha256", True, mode="bool")
 
@@ -494,12 +526,26 @@ def format_tb(ex, ex_traceback):
 class RedisPublishHandler(logging.Handler):
     """
     :type rc: StrictRedis
+
+    When BUFFER_SIZE is set, the records are buffered and pushed to Redis
+    in one RPUSH command, once the buffer is full, a record of ERROR or higher
+    level arrives, or FLUSH_INTERVAL seconds after the first buffered record
+    (by a timer thread, so the records don't stay buffered while the process
+    is idle).  The buffer is also pushed when the handler is closed, e.g. in
+    logging.shutdown().  The buffered records are lost if the process is
+    killed, or exits without logging.shutdown() (e.g. os._exit()).
     """
-    def __init__(self, rc, who, level=logging.NOTSET,):
+    # pylint: disable=too-many-arguments
+    def __init__(self, rc, who, level=logging.NOTSET, buffer_size=0,
+                 flush_interval=5):
         super(RedisPublishHandler, self).__init__(level)
 
         self.rc = rc
         self.who = who
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.buffer = []
+        self.timer = None
 
     def emit(self, record):
         # copr specific semantics
@@ -528,8 +574,39 @@ class RedisPublishHandler(logging.Handler):
         record.exc_text = None
         record.args = ()
 
+        event = json.dumps(record.__dict__)
+        if not self.buffer_size:
+            self._push([event])
+            return
+
+        if not self.buffer:
+            self.timer = Timer(self.flush_interval, self.flush)
+            self.timer.daemon = True
+            self.timer.start()
+        self.buffer.append(event)
+        if len(self.buffer) >= self.buffer_size \
+                or record.levelno >= logging.ERROR:
+            self.flush()
+
+    def flush(self):
+        self.acquire()
+        try:
+            events, self.buffer = self.buffer, []
+            timer, self.timer = self.timer, None
+        finally:
+            self.release()
+        if timer:
+            timer.cancel()
+        if events:
+            self._push(events)
+
+    def close(self):
+        self.flush()
+        super(RedisPublishHandler, self).close()
+
+    def _push(self, events):
         try:
-            self.rc.rpush(constants.LOG_REDIS_FIFO, json.dumps(record.__dict__))
+            self.rc.rpush(constants.LOG_REDIS_FIFO, *events)
         # pylint: disable=W0703
         except Exception as error:
             _, _, ex_tb = sys.exc_info()
@@ -548,7 +625,9 @@ def get_redis_log_handler(opts, component):
     assert component in LOG_COMPONENTS
     rc = get_redis_connection(opts)
     # level=DEBUG, by default we send everything logger gives us
-    handler = RedisPublishHandler(rc, component, level=logging.DEBUG)
+    buffer_size = getattr(opts, "log_buffer_size", 0)
+    handler = RedisPublishHandler(rc, component, level=logging.DEBUG,
+                                  buffer_size=buffer_size)
     return handler
 
 
@@ -695,6 +774,40 @@ def build_chroot_log_name(build_id, package_name=None):
     return 'build-{}.log'.format(build_target_dir(build_id, package_name))
 
 
+# ioctl(2) number from <linux/fs.h>
+FICLONE = 0x40049409
+
+
+def reflink_or_copy2(src, dest):
+    """
+    Create a copy-on-write copy (reflink) of the SRC file if the filesystem
+    supports it, or fall back to the normal shutil.copy2().
+    """
+    try:
+        with open(src, "rb") as src_fd, open(dest, "wb") as dest_fd:
+            fcntl.ioctl(dest_fd.fileno(), FICLONE, src_fd.fileno())
+        shutil.copystat(src, dest)
+        return dest
+    except OSError:
+        return shutil.copy2(src, dest)
+
+
+def copy2_for_fork(src, dest):
+    """
+    The shutil.copytree() copy_function for forking the build results.  The
+    RPMs are going to be re-signed (modified) so they are copied (using reflinks
+    if possible), all the other files are never modified after the build is
+    finished, so they are hardlinked (if possible).
+    """
+    if src.endswith(".rpm"):
+        return reflink_or_copy2(src, dest)
+    try:
+        os.link(src, dest)
+        return dest
+    except OSError:
+        return shutil.copy2(src, dest)
+
+
 def copy2_but_hardlink_rpms(src, dest, **kwargs):
     """
     Link RPMs while otherwise copying using the shutil.copytree() method.
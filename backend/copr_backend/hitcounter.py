@@ -4,6 +4,11 @@ Shared logic for hitcounter scripts
 
 import os
 import re
+import gzip
+import json
+import functools
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
 from requests.utils import unquote
 from copr_common.request import SafeRequest
@@ -15,15 +20,25 @@ rpm_url_regex = re.compile(
     base_regex + r"(?P<build_dir>[^/]*)/(?P<rpm>[^/]*\.rpm)", re.IGNORECASE)
 
 spider_regex = re.compile(
-    '.*(ahrefs|bot/[0-9]|bingbot|borg|google|googlebot|yahoo|slurp|msnbot'
+    '(ahrefs|bot/[0-9]|bingbot|borg|google|googlebot|yahoo|slurp|msnbot'
     '|openbot|archiver|netresearch|lycos|scooter|altavista|teoma|gigabot'
     '|blitzbot|oegp|charlotte|furlbot|http://client|polybot|htdig|ichiro'
     '|larbin|pompos|scrubby|searchsight|seekbot|semanticdiscovery|silk|snappy'
     '|spider|voila|vortex|voyager|zao|zeal|fast-webcrawler|converacrawler'
     '|msrbot|baiduspider|mogimogi|speedy|dataparksearch'
-    '|findlinks|crawler|yandex|blexbot|semrushbot).*',
+    '|findlinks|crawler|yandex|blexbot|semrushbot)',
     re.IGNORECASE)
 
+# Only the user agent may contain spaces and quotes, the other fields are
+# matched by specific patterns, so the regex doesn't backtrack too much.
+logline_regex = re.compile(
+    r'(?P<ip_address>\S+)\s+(?P<hostname>\S+)\s+-\s+\[(?P<timestamp>[^]]*)\]\s+'
+    r'"GET (?P<url>\S+)\s+(?P<protocol>[^"]*)"\s+(?P<code>\S+)\s+(?P<bytes_sent>\S+)\s+'
+    r'"(?P<referer>[^"]*)"\s+"(?P<agent>.*)"', re.IGNORECASE)
+
+LIGHTTPD_TIMESTAMP_FORMAT = "%d/%b/%Y:%H:%M:%S %z"
+S3_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
 
 def url_to_key_strings(url):
     """
@@ -60,11 +75,400 @@ def url_to_key_strings(url):
     return []
 
 
+@functools.lru_cache(maxsize=4096)
+def parse_timestamp(timestamp, timestamp_format):
+    """
+    Convert the access log TIMESTAMP to a unix timestamp.  The accesses are
+    sorted in the logs, so the cache saves us most of the strptime() calls.
+    The wall-clock time is interpreted in the local timezone, regardless of the
+    timezone in the log.
+    """
+    datetime_object = datetime.strptime(timestamp, timestamp_format)
+    return int(datetime_object.replace(tzinfo=None).timestamp())
+
+
+@functools.lru_cache(maxsize=4096)
+def match_spider(agent):
+    """
+    Return the known bot name if the user AGENT is a bot, None otherwise.
+    There's only a limited number of different agents, so the cache saves us
+    most of the spider_regex searches.
+    """
+    bot = spider_regex.search(agent)
+    return bot.group(1) if bot else None
+
+
+def parse_lighttpd_line(line):
+    """
+    Parse one lighttpd access.log line, return the (url, status, user agent,
+    timestamp) tuple, or None for unrecognized lines.
+    """
+    m = logline_regex.match(line)
+    if not m:
+        return None
+    return (m.group("url"), m.group("code"), m.group("agent"),
+            m.group("timestamp"))
+
+
+def open_log(path):
+    """
+    Open the access log for reading as text, gzip-compressed or not
+    """
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace")
+    return open(path, "r", encoding="utf-8", errors="replace")
+
+
+class HitCounter:
+    """
+    Aggregate the hits from the accesses on the fly, without keeping the
+    accesses in memory.  The result is in the format expected by the
+    /stats_rcv/from_backend frontend route.
+    """
+
+    def __init__(self, log, timestamp_format=S3_TIMESTAMP_FORMAT):
+        self.log = log
+        self.timestamp_format = timestamp_format
+        self.hits = {}
+        self.ts_from = None
+        self.ts_to = None
+        self.accesses = 0
+
+    def add(self, url, status, agent, timestamp):
+        """
+        Count one access, unless it is filtered out.  The TIMESTAMP string is
+        in the self.timestamp_format.
+        """
+        # pylint: disable=too-many-return-statements
+        self.accesses += 1
+
+        # The cheap checks first
+        if status == "404":
+            self.log.debug("Skipping: %s (404 Not Found)", url)
+            return
+
+        if agent.startswith("Mock"):
+            self.log.debug("Skipping: %s (user-agent: Mock)", url)
+            return
+
+        bot = match_spider(agent)
+        if bot:
+            self.log.debug("Skipping: %s (user-agent '%s' is a known bot)",
+                           url, bot)
+            return
+
+        # Convert encoded characters from their %40 values back to @.
+        unquoted = unquote(url)
+
+        # I don't know how or why but occasionally there is an URL that is
+        # encoded twice (%2540oamg -> %40oamg - > @oamg), and yet its status
+        # code is 200. AFAIK these appear only for EPEL-7 chroots and their
+        # User-Agent is something like urlgrabber/3.10%20yum/3.4.3
+        # I wasn't able to reproduce such accesses, and we decided to not count
+        # them
+        if unquoted != unquote(unquoted):
+            self.log.warning("Skipping: %s (double encoded URL, user-agent: "
+                             "'%s', status: %s)", url, agent, status)
+            return
+        url = unquoted
+
+        # We don't want to count every accessed URL, only those pointing to
+        # RPM files and repo file
+        key_strings = url_to_key_strings(url)
+        if not key_strings:
+            self.log.debug("Skipping: %s", url)
+            return
+
+        if any(x for x in key_strings
+               if x.startswith("chroot_rpms_dl_stat|")
+               and x.endswith("|srpm-builds")):
+            self.log.debug("Skipping %s (SRPM build)", url)
+            return
+
+        self.log.debug("Processing: %s", url)
+
+        # When counting RPM access, we want to iterate both project hits and
+        # chroot hits. That way we can get multiple `key_strings` for one URL
+        for key_str in key_strings:
+            self.hits[key_str] = self.hits.get(key_str, 0) + 1
+
+        # Remember this access timestamp
+        timestamp = parse_timestamp(timestamp, self.timestamp_format)
+        self._add_timestamp(timestamp)
+
+    def _add_timestamp(self, timestamp):
+        if timestamp is None:
+            return
+        if self.ts_from is None or timestamp < self.ts_from:
+            self.ts_from = timestamp
+        if self.ts_to is None or timestamp > self.ts_to:
+            self.ts_to = timestamp
+
+    def merge(self, other):
+        """
+        Add the hits counted by OTHER HitCounter
+        """
+        for key_str, count in other.hits.items():
+            self.hits[key_str] = self.hits.get(key_str, 0) + count
+        self._add_timestamp(other.ts_from)
+        self._add_timestamp(other.ts_to)
+        self.accesses += other.accesses
+
+    def get_hit_data(self, chunk_size=None):
+        """
+        Return a list of the frontend request bodies, each with CHUNK_SIZE
+        hits at most (all the hits in one request by default).
+        """
+        if not self.hits:
+            return []
+        keys = list(self.hits)
+        chunk_size = chunk_size or len(keys)
+        return [{
+            "ts_from": self.ts_from,
+            "ts_to": self.ts_to,
+            "hits": {key: self.hits[key] for key in keys[i:i+chunk_size]},
+        } for i in range(0, len(keys), chunk_size)]
+
+
+def _count_file_range(path, start, end, parse_line, timestamp_format, log):
+    """
+    Count hits from the lines starting within the <START, END) byte range of
+    the PATH file.
+    """
+    counter = HitCounter(log, timestamp_format)
+    with open(path, "rb") as fd:
+        if start:
+            # Skip the line started in the previous range.  Start one byte
+            # earlier, the line starting right at START belongs to us.
+            fd.seek(start - 1)
+            fd.readline()
+        while fd.tell() < end:
+            line = fd.readline()
+            if not line:
+                break
+            access = parse_line(line.decode("utf-8", errors="replace"))
+            if access:
+                counter.add(*access)
+    return counter
+
+
+def count_hits(path, parse_line, log, timestamp_format=S3_TIMESTAMP_FORMAT,
+               workers=1):
+    """
+    Stream the PATH access log, and count the hits.  PARSE_LINE converts one
+    line into the (url, status, user agent, timestamp) tuple, or None for the
+    lines to be ignored.  Uncompressed files are split into WORKERS ranges and
+    parsed in parallel processes.  Return a HitCounter.
+    """
+    if workers <= 1 or path.endswith(".gz"):
+        counter = HitCounter(log, timestamp_format)
+        with open_log(path) as fd:
+            for line in fd:
+                access = parse_line(line)
+                if access:
+                    counter.add(*access)
+        return counter
+
+    size = os.path.getsize(path)
+    step = size // workers + 1
+    counter = HitCounter(log, timestamp_format)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_count_file_range, path, start,
+                                   min(start + step, size), parse_line,
+                                   timestamp_format, log)
+                   for start in range(0, size, step)]
+        for future in futures:
+            counter.merge(future.result())
+    return counter
+
+
+def parse_cloudfront_file(path, cdn_hostnames, log):
+    """
+    Stream the raw (possibly gzipped) CloudFront access file and count the hits
+    in it.  Return the (HitCounter, None) pair.  The devel and production
+    accesses are mixed together, so if the file contains an access for a CDN
+    hostname not in CDN_HOSTNAMES, stop parsing and return
+    (None, that_hostname).
+    """
+    counter = HitCounter(log)
+    with open_log(path) as fd:
+        # The file starts with meta information and thanks to #Fields, we know
+        # what each column means.
+        assert fd.readline().startswith("#Version:")
+        fields = fd.readline()
+        assert fields.startswith("#Fields:")
+        keys = fields[len("#Fields:"):].split()
+        url, status, agent, date, time, host = [keys.index(key) for key in [
+            "cs-uri-stem", "sc-status", "cs(User-Agent)", "date", "time",
+            "x-host-header"]]
+
+        for line in fd:
+            # Make sure we are not parsing any more meta information
+            assert not line.startswith("#")
+            values = line.split()
+            if values[host] not in cdn_hostnames:
+                return None, values[host]
+            counter.add(values[url], values[status], values[agent],
+                        values[date] + " " + values[time])
+
+    return counter, None
+
+
+class HitcounterJournal:
+    """
+    Local checkpoint journal of the remote access log files being processed,
+    so restarted hitcounter doesn't count them twice.  We remember the files
+    that were "counted" (until they disappear from the remote storage), the
+    files "skipped" because of a different CDN hostname, and the files whose
+    hits are just being "sent" to frontend.
+    """
+
+    def __init__(self, path, dry_run=False):
+        self.path = path
+        self.dry_run = dry_run
+        self.counted = set()
+        self.skipped = {}
+        self.sending = set()
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as fd:
+                data = json.load(fd)
+            self.counted = set(data.get("counted", []))
+            self.skipped = data.get("skipped", {})
+            self.sending = set(data.get("sending", []))
+
+    def save(self):
+        """
+        Atomically replace the journal file
+        """
+        if self.dry_run or not self.path:
+            return
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fd:
+            json.dump({"counted": sorted(self.counted),
+                       "skipped": self.skipped,
+                       "sending": sorted(self.sending)}, fd)
+        os.replace(tmp, self.path)
+
+    def prune(self, existing):
+        """
+        Forget the files that don't EXIST in the remote storage anymore
+        """
+        existing = set(existing)
+        self.counted &= existing
+        self.skipped = {key: host for key, host in self.skipped.items()
+                        if key in existing}
+
+
+def _download_ahead(storage, files, dstdir, workers):
+    """
+    Download FILES from STORAGE to DSTDIR by a pool of WORKERS threads, and
+    yield the (file, local_path) pairs in the original order.  At most
+    2*WORKERS files are downloaded ahead, not to fill the disk.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        files = iter(files)
+        for remote in files:
+            pending.append((remote, executor.submit(storage.download_file,
+                                                    remote, dstdir)))
+            if len(pending) >= 2 * workers:
+                break
+        while pending:
+            remote, future = pending.popleft()
+            next_remote = next(files, None)
+            if next_remote is not None:
+                pending.append((next_remote, executor.submit(
+                    storage.download_file, next_remote, dstdir)))
+            yield remote, future.result()
+
+
+def process_remote_logs(storage, files, dstdir, parse_file, journal, send,
+                        log, workers=4, batch_size=50):
+    """
+    Count hits from the remote access log FILES, and remove them from STORAGE
+    (an object with download_file() and delete_file() methods).
+
+    The files are downloaded in parallel, and PARSE_FILE(path) returns the
+    (HitCounter, skip_reason) pair for each of them.  The hits are aggregated
+    for BATCH_SIZE files, and then handed over to SEND(hit_data) in one go.
+
+    The JOURNAL makes the restarts idempotent.  The counted files aren't
+    counted again even if their removal failed.  Only the batch being sent
+    to frontend during the crash is counted again.
+    """
+    # pylint: disable=too-many-arguments,too-many-locals
+    journal.prune(files)
+    if journal.sending:
+        log.warning("Previous run didn't finish sending %s files, counting "
+                    "them again", len(journal.sending))
+        journal.sending = set()
+    journal.save()
+
+    for remote in sorted(journal.counted):
+        log.debug("Removing %s, already counted", remote)
+        storage.delete_file(remote)
+
+    todo = [remote for remote in files
+            if remote not in journal.counted and remote not in journal.skipped]
+
+    batch = []
+    counter = HitCounter(log)
+
+    def _flush():
+        if not batch:
+            return
+        journal.sending = set(batch)
+        journal.save()
+        for chunk in counter.get_hit_data():
+            send(chunk)
+        journal.counted.update(batch)
+        journal.sending = set()
+        journal.save()
+        for remote in batch:
+            storage.delete_file(remote)
+        log.info("Counted %s files, %s accesses", len(batch),
+                 counter.accesses)
+
+    for i, (remote, path) in enumerate(
+            _download_ahead(storage, todo, dstdir, workers), start=1):
+        try:
+            file_counter, skip_reason = parse_file(path)
+        finally:
+            # Clean temporary files, we don't need them for the rest of
+            # the cycle
+            os.remove(path)
+
+        if skip_reason:
+            log.debug("Skipping: %s (%s)", remote, skip_reason)
+            journal.skipped[remote] = skip_reason
+            continue
+
+        log.debug("[%s/%s] %s (%s accesses)", i, len(todo), remote,
+                  file_counter.accesses)
+        counter.merge(file_counter)
+        batch.append(remote)
+        if len(batch) >= batch_size:
+            _flush()
+            batch = []
+            counter = HitCounter(log)
+
+    _flush()
+    journal.save()
+
+
 def update_frontend(accesses, log, dry_run=False, try_indefinitely=False):
     """
     Increment frontend statistics based on these `accesses`
     """
     result = get_hit_data(accesses, log)
+    send_hit_data(result, log, dry_run=dry_run,
+                  try_indefinitely=try_indefinitely)
+
+
+def send_hit_data(result, log, dry_run=False, try_indefinitely=False):
+    """
+    Send one get_hit_data() or HitCounter.get_hit_data() result to frontend
+    """
     if not result:
         log.debug("No recognizable hits among these accesses, skipping.")
         return
@@ -100,69 +504,10 @@ def get_hit_data(accesses, log):
     Prepare body for the frontend request in the same format that
     copr_log_hitcounter.py does.
     """
-    hits = {}
-    timestamps = []
+    counter = HitCounter(log)
     for access in accesses:
-        url = access["cs-uri-stem"]
-
-        if access["sc-status"] == "404":
-            log.debug("Skipping: %s (404 Not Found)", url)
-            continue
-
-        if access["cs(User-Agent)"].startswith("Mock"):
-            log.debug("Skipping: %s (user-agent: Mock)", url)
-            continue
-
-        bot = spider_regex.match(access["cs(User-Agent)"])
-        if bot:
-            log.debug("Skipping: %s (user-agent '%s' is a known bot)",
-                      url, bot.group(1))
-            continue
-
-        # Convert encoded characters from their %40 values back to @.
-        url = unquote(url)
-
-        # I don't know how or why but occasionally there is an URL that is
-        # encoded twice (%2540oamg -> %40oamg - > @oamg), and yet its status
-        # code is 200. AFAIK these appear only for EPEL-7 chroots and their
-        # User-Agent is something like urlgrabber/3.10%20yum/3.4.3
-        # I wasn't able to reproduce such accesses, and we decided to not count
-        # them
-        if url != unquote(url):
-            log.warning("Skipping: %s (double encoded URL, user-agent: '%s', "
-                        "status: %s)", access["cs-uri-stem"],
-                        access["cs(User-Agent)"], access["sc-status"])
-            continue
-
-        # We don't want to count every accessed URL, only those pointing to
-        # RPM files and repo file
-        key_strings = url_to_key_strings(url)
-        if not key_strings:
-            log.debug("Skipping: %s", url)
-            continue
-
-        if any(x for x in key_strings
-               if x.startswith("chroot_rpms_dl_stat|")
-               and x.endswith("|srpm-builds")):
-            log.debug("Skipping %s (SRPM build)", url)
-            continue
-
-        log.debug("Processing: %s", url)
-
-        # When counting RPM access, we want to iterate both project hits and
-        # chroot hits. That way we can get multiple `key_strings` for one URL
-        for key_str in key_strings:
-            hits.setdefault(key_str, 0)
-            hits[key_str] += 1
-
-        # Remember this access timestamp
-        datetime_format = "%Y-%m-%d %H:%M:%S"
-        datetime_string = "{0} {1}".format(access["date"], access["time"])
-        datetime_object = datetime.strptime(datetime_string, datetime_format)
-        timestamps.append(int(datetime_object.timestamp()))
-
-    return {
-        "ts_from": min(timestamps),
-        "ts_to": max(timestamps),
-        "hits": hits,
-    } if hits else {}
+        counter.add(access["cs-uri-stem"], access["sc-status"],
+                    access["cs(User-Agent)"],
+                    "{0} {1}".format(access["date"], access["time"]))
+    result = counter.get_hit_data()
+    return result[0] if result else {}
@@ -4,12 +4,16 @@
 Wrapper for /bin/sign from obs-sign package
 """
 
+from concurrent.futures import ThreadPoolExecutor
 from subprocess import Popen, PIPE, SubprocessError
+import hashlib
 import os
 import time
 
 from packaging import version
+from redis.exceptions import RedisError
 
+from copr_common.redis_helpers import get_redis_connection
 from copr_common.request import SafeRequest
 from copr_backend.helpers import get_redis_logger
 from .exceptions import CoprSignError, CoprSignNoKeyError, \
@@ -86,6 +90,121 @@ def get_pubkey(username, projectname, log, sign_domain, outfile=None):
     return stdout
 
 
+class PubkeyCache:
+    """
+    Cache of the project public keys, shared in Redis by all the build
+    workers and actions.  The project index points to the sha256 of the key,
+    and the key itself is stored under that digest, so a corrupted entry is
+    detected (and treated as a miss).  Entries expire after
+    opts.pubkey_cache_ttl seconds, and they are invalidated explicitly when
+    a new key-pair is generated.
+    """
+
+    KEY = "copr:backend:pubkey::{0}"
+    BLOB_KEY = "copr:backend:pubkey:blob::{0}"
+    STATS_KEY = "copr:backend:pubkey:stats"
+
+    # One Redis client (with its own connection pool) per Redis server, shared
+    # by all the PubkeyCache objects in the process
+    _connections = {}
+
+    def __init__(self, opts, log):
+        self.opts = opts
+        self.log = log
+        self.ttl = getattr(opts, "pubkey_cache_ttl", 86400)
+        self.redis = self._get_redis_connection(opts)
+
+    @classmethod
+    def _get_redis_connection(cls, opts):
+        key = tuple(getattr(opts, attr, None) for attr in [
+            "redis_host", "redis_port", "redis_db", "redis_password"])
+        if key not in cls._connections:
+            cls._connections[key] = get_redis_connection(opts)
+        return cls._connections[key]
+
+    def _email(self, username, projectname):
+        return create_gpg_email(username, projectname, self.opts.sign_domain)
+
+    def _lookup(self, email):
+        digest = self.redis.get(self.KEY.format(email))
+        if not digest:
+            return None
+        pubkey = self.redis.get(self.BLOB_KEY.format(digest))
+        if pubkey is None:
+            return None
+        if hashlib.sha256(pubkey.encode("utf-8")).hexdigest() != digest:
+            self.log.warning("Cached pubkey for %s is corrupted", email)
+            return None
+        return pubkey
+
+    def _store(self, email, pubkey):
+        digest = hashlib.sha256(pubkey.encode("utf-8")).hexdigest()
+        pipe = self.redis.pipeline()
+        pipe.set(self.BLOB_KEY.format(digest), pubkey, ex=self.ttl)
+        pipe.set(self.KEY.format(email), digest, ex=self.ttl)
+        pipe.execute()
+
+    def _count(self, email, hit):
+        pipe = self.redis.pipeline()
+        pipe.hincrby(self.STATS_KEY, "hits", int(hit))
+        pipe.hincrby(self.STATS_KEY, "misses", int(not hit))
+        hits, misses = pipe.execute()
+        self.log.debug("Pubkey cache %s for %s, hit ratio %.1f%% (%s/%s)",
+                      "hit" if hit else "miss", email,
+                      100.0 * hits / (hits + misses), hits, hits + misses)
+
+    def stats(self):
+        """
+        Return the (hits, misses) tuple, counted since the Redis DB was
+        created.
+        """
+        stats = self.redis.hgetall(self.STATS_KEY)
+        return int(stats.get("hits", 0)), int(stats.get("misses", 0))
+
+    def get(self, username, projectname, outfile=None):
+        """
+        The same as get_pubkey(), but the signer is only asked upon cache
+        miss.  Redis failures are not fatal, we just ask the signer.
+
+        :raises CoprSignError: failed to retrieve key, see error message
+        :raises CoprSignNoKeyError: if there are no such user in keyring
+        """
+        email = self._email(username, projectname)
+        pubkey = None
+        if self.ttl > 0:
+            try:
+                pubkey = self._lookup(email)
+                self._count(email, pubkey is not None)
+            except RedisError:
+                self.log.warning("Can not read pubkey cache for %s", email)
+
+        if pubkey is None:
+            pubkey = get_pubkey(username, projectname, self.log,
+                                self.opts.sign_domain)
+            if self.ttl > 0:
+                try:
+                    self._store(email, pubkey)
+                except RedisError:
+                    self.log.warning("Can not cache pubkey for %s", email)
+
+        if outfile:
+            with open(outfile, "w") as handle:
+                handle.write(pubkey)
+
+        return pubkey
+
+    def invalidate(self, username, projectname):
+        """
+        Drop the cached pubkey for the given project, e.g. when the key-pair
+        is (re)generated.
+        """
+        email = self._email(username, projectname)
+        try:
+            self.redis.delete(self.KEY.format(email))
+        except RedisError:
+            self.log.warning("Can not invalidate pubkey cache for %s", email)
+
+
 def _sign_one(path, email, hashtype, log):
     cmd = [SIGN_BINARY, "-4", "-h", hashtype, "-u", email, "-r", path]
     returncode, stdout, stderr = call_sign_bin(cmd, log)
@@ -136,12 +255,26 @@ def gpg_hashtype_for_chroot(chroot, opts):
     return "sha256"
 
 
+def _sign_one_logged(rpm, email, hashtype, log):
+    """
+    Sign one RPM, and return None, or (rpm, exception) tuple upon failure.
+    """
+    try:
+        _sign_one(rpm, email, hashtype, log)
+        log.info("signed rpm: %s", rpm)
+        return None
+    except CoprSignError as e:
+        log.exception("failed to sign rpm: %s", rpm)
+        return (rpm, e)
+
+
 def sign_rpms_in_dir(username, projectname, path, chroot, opts, log):
     """
     Signs rpms using obs-signd.
 
     If some some pkgs failed to sign, entire build marked as failed,
-    but we continue to try sign other pkgs.
+    but we continue to try sign other pkgs.  Up to opts.sign_parallelism
+    packages are signed concurrently.
 
     :param username: copr username
     :param projectname: copr projectname
@@ -166,21 +299,26 @@ def sign_rpms_in_dir(username, projectname, path, chroot, opts, log):
     hashtype = gpg_hashtype_for_chroot(chroot, opts)
 
     try:
-        get_pubkey(username, projectname, log, opts.sign_domain)
+        PubkeyCache(opts, log).get(username, projectname)
     except CoprSignNoKeyError:
         create_user_keys(username, projectname, opts, try_indefinitely=True)
 
-    errors = []  # tuples (rpm_filepath, exception)
-    for rpm in rpm_list:
-        try:
-            _sign_one(rpm, create_gpg_email(username, projectname, opts.sign_domain),
-                      hashtype, log)
-            log.info("signed rpm: %s", rpm)
-
-        except CoprSignError as e:
-            log.exception("failed to sign rpm: %s", rpm)
-            errors.append((rpm, e))
-
+    email = create_gpg_email(username, projectname, opts.sign_domain)
+    workers = max(1, min(opts.sign_parallelism, len(rpm_list)))
+
+    start = time.time()
+    if workers == 1:
+        results = [_sign_one_logged(rpm, email, hashtype, log)
+                   for rpm in rpm_list]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(
+                lambda rpm: _sign_one_logged(rpm, email, hashtype, log),
+                rpm_list))
+    log.info("Signing %s RPMs in %s took %.2fs (%s in parallel)",
+             len(rpm_list), path, time.time() - start, workers)
+
+    errors = [result for result in results if result]  # (rpm_filepath, exception)
     if errors:
         raise CoprSignError("Rpm sign failed, affected rpms: {}"
                             .format([err[0] for err in errors]))
@@ -219,6 +357,8 @@ def create_user_keys(username, projectname, opts, try_indefinitely=False):
             .format(username, projectname, response.status_code, response.text),
             request=query, response=response)
 
+    PubkeyCache(opts, log).invalidate(username, projectname)
+
 
 def _unsign_one(path):
     # Requires rpm-sign package
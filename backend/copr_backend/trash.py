@@ -0,0 +1,178 @@
+"""
+Asynchronous removal of the result directories.
+
+The Delete* actions only atomically rename() the directories (and files) into
+the "trash" directory (configured by the 'trash_dir' option), and the
+copr-backend-trash-reaper daemon removes the trash contents later with lower
+(I/O) priority.
+"""
+
+import errno
+import os
+import shutil
+import stat
+import tempfile
+import time
+
+
+TRASH_ENTRY_PREFIX = "trash-"
+TRASH_TMP_PREFIX = ".tmp-"
+# moving into trash entry should never take this long (crashed action)
+TRASH_TMP_TIMEOUT = 3600
+
+
+def _ensure_trash_dir(trash_dir):
+    """
+    Create the TRASH_DIR, and make sure only the owner can access it (the
+    trash might be created inside the web server document root)
+    """
+    os.makedirs(trash_dir, mode=0o700, exist_ok=True)
+    if stat.S_IMODE(os.stat(trash_dir).st_mode) != 0o700:
+        os.chmod(trash_dir, 0o700)
+
+
+def move_to_trash(opts, paths, log):
+    """
+    Atomically move the PATHS (files or directories) into a new trash
+    entry, for later removal by TrashReaper.  The non-existing PATHS are
+    ignored.  If the trash is not configured, or if the PATH resides on a
+    different filesystem than the trash directory (so the rename() can not be
+    atomic), the PATH is removed synchronously.
+    """
+    paths = [path for path in paths if os.path.lexists(path)]
+    if not paths:
+        return
+
+    entry = None
+    if opts.trash_dir:
+        _ensure_trash_dir(opts.trash_dir)
+        entry = tempfile.mkdtemp(prefix=TRASH_TMP_PREFIX, dir=opts.trash_dir)
+
+    for index, path in enumerate(paths):
+        if entry:
+            target = os.path.join(
+                entry, "{}-{}".format(index, os.path.basename(path)))
+            try:
+                os.rename(path, target)
+                log.info("Moved %s to %s", path, target)
+                continue
+            except OSError as err:
+                if err.errno != errno.EXDEV:
+                    raise
+                log.warning("Can not move %s to trash (different filesystem), "
+                            "removing synchronously", path)
+
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path)
+        else:
+            os.unlink(path)
+        log.info("Removed %s", path)
+
+    if entry:
+        # The entry is ready for the reaper, the name order is the FIFO order.
+        os.rename(entry, os.path.join(opts.trash_dir, "{}{:020d}{}".format(
+            TRASH_ENTRY_PREFIX, time.time_ns(),
+            os.path.basename(entry)[len(TRASH_TMP_PREFIX) - 1:])))
+
+
+class TrashReaper:
+    """
+    Remove the trash entries created by move_to_trash(), file by file, with at
+    most RATE removed files per second (unlimited if RATE is 0).  The removal
+    is naturally resumed where it stopped (e.g. after a crash) because the
+    entries are removed from the bottom up.
+    """
+
+    progress_period = 60
+
+    def __init__(self, trash_dir, log, rate=0):
+        self.trash_dir = trash_dir
+        self.log = log
+        self.rate = rate
+        self._window_start = None
+        self._window_removed = 0
+        self.removed = 0
+        self.removed_bytes = 0
+
+    def entries(self):
+        """
+        List of the (finished) trash entries, the oldest first.
+        """
+        try:
+            names = os.listdir(self.trash_dir)
+        except FileNotFoundError:
+            return []
+        entries = []
+        for name in sorted(names):
+            path = os.path.join(self.trash_dir, name)
+            if name.startswith(TRASH_TMP_PREFIX):
+                # Being filled by move_to_trash() right now, or left behind
+                # by a crashed action.
+                try:
+                    if time.time() - os.stat(path).st_mtime < TRASH_TMP_TIMEOUT:
+                        continue
+                except FileNotFoundError:
+                    continue
+            entries.append(path)
+        return entries
+
+    def _throttle(self):
+        if not self.rate:
+            return
+        now = time.time()
+        if self._window_start is None or now - self._window_start >= 1:
+            self._window_start = now
+            self._window_removed = 0
+        self._window_removed += 1
+        if self._window_removed >= self.rate:
+            time.sleep(max(0, self._window_start + 1 - now))
+            self._window_start = None
+
+    def _remove(self, path, is_dir=False):
+        try:
+            if is_dir:
+                os.rmdir(path)
+            else:
+                self.removed_bytes += os.lstat(path).st_size
+                os.unlink(path)
+        except FileNotFoundError:
+            return
+        self.removed += 1
+        self._throttle()
+
+    def reap_entry(self, entry):
+        """
+        Remove one trash ENTRY, with all its content.
+        """
+        start = time.time()
+        last_report = start
+        removed, removed_bytes = self.removed, self.removed_bytes
+        for dirpath, dirnames, filenames in os.walk(entry, topdown=False):
+            for name in filenames:
+                self._remove(os.path.join(dirpath, name))
+            for name in dirnames:
+                path = os.path.join(dirpath, name)
+                # os.walk() doesn't follow symlinks, but lists them here
+                self._remove(path, is_dir=not os.path.islink(path))
+
+            if time.time() - last_report > self.progress_period:
+                last_report = time.time()
+                self.log.info("Reaping %s: %s files removed so far",
+                              entry, self.removed - removed)
+        self._remove(entry, is_dir=True)
+        self.log.info("Reaped %s: %s files, %.1f MiB in %.1fs",
+                      entry, self.removed - removed,
+                      (self.removed_bytes - removed_bytes) / 1024 / 1024,
+                      time.time() - start)
+
+    def reap(self):
+        """
+        Remove all the trash entries, return the number of removed entries.
+        """
+        entries = self.entries()
+        if entries:
+            self.log.info("%s entries in %s to reap", len(entries),
+                          self.trash_dir)
+        for entry in entries:
+            self.reap_entry(entry)
+        return len(entries)
@@ -8,48 +8,36 @@ This is script is supposed to be run daily from lighttpd logrotate, e.g.
    endscript
 """
 
-import re
 import os
 import logging
 import argparse
-from datetime import datetime
 from copr_common.log import setup_script_logger
-from copr_backend.hitcounter import update_frontend
+from copr_backend.hitcounter import (
+    LIGHTTPD_TIMESTAMP_FORMAT,
+    count_hits,
+    open_log,
+    parse_lighttpd_line,
+    send_hit_data,
+)
 
 
 log = logging.getLogger(__name__)
 setup_script_logger(log, "/var/log/copr-backend/hitcounter.log")
 
-logline_regex = re.compile(
-    r'(?P<ip_address>.*)\s+(?P<hostname>.*)\s+-\s+\[(?P<timestamp>.*)\]\s+'
-    r'"GET (?P<url>.*)\s+(?P<protocol>.*)"\s+(?P<code>.*)\s+(?P<bytes_sent>.*)\s+'
-    r'"(?P<referer>.*)"\s+"(?P<agent>.*)"', re.IGNORECASE)
+# Number of hits sent to frontend in one request
+CHUNK_SIZE = 10000
 
 
-def parse_access_file(path):
+def parse_access_file(path, workers=1):
     """
-    Take a raw access file and return its contents as a list of dicts.
+    Take a raw access file (possibly gzipped) and count the hits in it, return
+    a HitCounter.
     """
-    with open(path, 'r') as logfile:
-        content = logfile.readlines()
-    assert content[0].startswith("=== start:")
-
-    accesses = []
-    for line in content[1:]:
-        m = logline_regex.match(line)
-        if not m:
-            continue
-        # Rename dict keys to match `copr-aws-s3-hitcounter`
-        access = m.groupdict()
-        access["cs-uri-stem"] = access.pop("url")
-        access["sc-status"] = access.pop("code")
-        access["cs(User-Agent)"] = access.pop("agent")
-        timestamp = datetime.strptime(access.pop("timestamp"),
-                                      "%d/%b/%Y:%H:%M:%S %z")
-        access["time"] = timestamp.strftime("%H:%M:%S")
-        access["date"] = timestamp.strftime("%Y-%m-%d")
-        accesses.append(access)
-    return accesses
+    with open_log(path) as logfile:
+        assert logfile.readline().startswith("=== start:")
+    return count_hits(path, parse_lighttpd_line, log,
+                      timestamp_format=LIGHTTPD_TIMESTAMP_FORMAT,
+                      workers=workers)
 
 
 def get_arg_parser():
@@ -62,7 +50,13 @@ def get_arg_parser():
     parser.add_argument(
         'logfile',
         action='store',
-        help='Path to the input logfile')
+        help='Path to the input logfile, optionally gzip-compressed')
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help=("Split the (uncompressed) logfile into this number of parts, "
+              "and parse them in parallel"))
     parser.add_argument(
         "--dry-run",
         action="store_true",
@@ -89,12 +83,10 @@ def main():
     # chunks may succeed, some fail and never be counted. But we try to send
     # each request repeatedly and losing some access hits from time to time
     # isn't a mission critical issue and I would just roll with it.
-    accesses = parse_access_file(args.logfile)
-    size = 1000
-    chunks = [accesses[x:x+size] for x in range(0, len(accesses), size)]
-    for chunk in chunks:
-        update_frontend(chunk, log=log, dry_run=args.dry_run)
-
+    counter = parse_access_file(args.logfile, workers=args.workers)
+    log.info("%s accesses, %s hit keys", counter.accesses, len(counter.hits))
+    for chunk in counter.get_hit_data(CHUNK_SIZE):
+        send_hit_data(chunk, log=log, dry_run=args.dry_run)
 
 if __name__ == "__main__":
     main()
@@ -40,7 +40,14 @@ def do_the_useful_stuff(process_counter, task_id, worker_id, sleep):
     When none of those environment variables are set, we process to do the work
     (sleep) according to the ``sleep`` argument.  We set 'status' according to
     the ``process_counter`` (each 8th is failure).
+
+    'PID_FILE': When set, the daemon PID is written there first.
     """
+    if 'PID_FILE' in os.environ:
+        # let the test know what process to kill when it ends
+        with open(os.environ['PID_FILE'], 'w') as fd:
+            fd.write(str(os.getpid()))
+
     if 'FAIL_EARLY' in os.environ:
         raise Exception("sorry")
 
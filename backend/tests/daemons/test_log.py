@@ -12,7 +12,10 @@ import pytest
 from unittest import mock
 from unittest.mock import patch, MagicMock
 
+from copr_common.redis_helpers import get_redis_connection
+from copr_backend import constants
 from copr_backend.daemons.log import RedisLogHandler
+from copr_backend.helpers import RedisPublishHandler
 
 
 @pytest.yield_fixture
@@ -167,3 +170,103 @@ class TestLog(object):
     #     # import ipdb; ipdb.set_trace()
     #
     #     x = 2
+
+
+class TestRedisLogHandler:
+    def setup_method(self, method):
+        _unused = method
+        self.tmp_dir_path = tempfile.mkdtemp(prefix="copr-test-redis-log-")
+        self.opts = Munch(
+            log_dir=self.tmp_dir_path + "/",
+            log_level="debug",
+            log_format=constants.default_log_format,
+            redis_port=7777,
+            redis_db=9,
+        )
+        self.rc = get_redis_connection(self.opts)
+        self.rc.flushdb()
+
+    def teardown_method(self, method):
+        _unused = method
+        self.rc.flushdb()
+        shutil.rmtree(self.tmp_dir_path)
+
+    def _read(self, component):
+        path = os.path.join(self.tmp_dir_path, component + ".log")
+        if not os.path.exists(path):
+            return []
+        with open(path, "r") as fd:
+            return fd.read().splitlines()
+
+    def _logger(self, **kwargs):
+        logger = logging.Logger("test_redis_log")
+        logger.addHandler(RedisPublishHandler(self.rc, "worker", **kwargs))
+        return logger
+
+    def test_batch(self):
+        logger = self._logger()
+        for i in range(1200):
+            logger.info("message %s", i)
+        logger.error("bad %s", "thing")
+        assert self.rc.llen(constants.LOG_REDIS_FIFO) == 1201
+
+        handler = RedisLogHandler(self.opts)
+        handler.setup_logging()
+        handler.FLUSH_INTERVAL = 3600
+
+        assert handler.handle_batch(self.rc) == handler.BATCH_SIZE
+        assert handler.backlog == 1201 - handler.BATCH_SIZE
+        # buffered, not written completely yet
+        assert len(self._read("worker")) < handler.BATCH_SIZE
+
+        while handler.handle_batch(self.rc):
+            pass
+        handler.flush()
+        lines = self._read("worker")
+        assert len(lines) == 1201
+        assert lines[0].endswith("message 0")
+        assert lines[1199].endswith("message 1199")
+        assert "ERROR" in lines[-1] and lines[-1].endswith("bad thing")
+        assert handler.backlog == 0
+
+    def test_flush_size(self):
+        logger = self._logger()
+        for i in range(30):
+            logger.info("message %s", i)
+
+        handler = RedisLogHandler(self.opts)
+        handler.setup_logging()
+        handler.BATCH_SIZE = 10
+        handler.FLUSH_SIZE = 20
+        handler.FLUSH_INTERVAL = 3600
+        handler.handle_batch(self.rc)
+        assert handler.buffered == 10
+        handler.handle_batch(self.rc)
+        assert handler.buffered == 0
+        assert len(self._read("worker")) == 20
+
+    def test_client_buffer(self):
+        logger = self._logger(buffer_size=10, flush_interval=3600)
+        for i in range(15):
+            logger.info("message %s", i)
+        assert self.rc.llen(constants.LOG_REDIS_FIFO) == 10
+
+        # errors are sent immediately, together with the buffer
+        logger.error("error")
+        assert self.rc.llen(constants.LOG_REDIS_FIFO) == 16
+
+        logger.info("last")
+        logger.handlers[0].close()
+        assert self.rc.llen(constants.LOG_REDIS_FIFO) == 17
+
+    def test_client_buffer_timer(self):
+        logger = self._logger(buffer_size=10, flush_interval=0.1)
+        logger.info("idle")
+        assert self.rc.llen(constants.LOG_REDIS_FIFO) == 0
+        # no other record arrives, the timer sends the buffer
+        for _ in range(50):
+            if self.rc.llen(constants.LOG_REDIS_FIFO):
+                break
+            time.sleep(0.1)
+        assert self.rc.llen(constants.LOG_REDIS_FIFO) == 1
+        assert logger.handlers[0].timer is None
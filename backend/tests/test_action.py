@@ -15,7 +15,11 @@ from unittest import mock
 from unittest.mock import MagicMock
 
 from copr_backend.actions import Action, ActionType, ActionResult
-from copr_backend.exceptions import CreateRepoError, CoprKeygenRequestError
+from copr_backend.exceptions import (
+    CoprKeygenRequestError,
+    CoprSignError,
+    CreateRepoError,
+)
 from requests import RequestException
 
 from testlib.repodata import load_primary_xml
@@ -57,6 +61,8 @@ class TestAction(object):
             results_baseurl=RESULTS_ROOT_URL,
 
             do_sign=False,
+            fork_workers=2,
+            trash_dir=None,
 
             keygen_host="example.com"
         )
@@ -133,17 +139,33 @@ class TestAction(object):
 
         self.dummy = str(test_action)
 
-    @mock.patch("copr_backend.actions.os.makedirs")
-    @mock.patch("copr_backend.actions.copy_tree")
-    @mock.patch("copr_backend.actions.os.path.exists")
     @mock.patch("copr_backend.actions.unsign_rpms_in_dir")
     @mock.patch("copr_backend.helpers.subprocess.Popen")
     def test_action_handle_forks(self, mc_popen, mc_unsign_rpms_in_dir,
-                                 mc_exists, mc_copy_tree, _mc_os_makedirs,
                                  mc_time):
         mc_popen.return_value.communicate.return_value = ("", "")
+        mc_popen.return_value.returncode = 0
         mc_time.time.return_value = self.test_time
-        mc_exists = True
+        builds_map = {
+            'srpm-builds': {
+                '00000002': '00000009', '00000005': '00000010'},
+            'fedora-17-x86_64': {
+                '00000002-pkg1': '00000009-pkg1', '00000005-pkg2': '00000010-pkg2'},
+            'fedora-17-i386': {
+                '00000002-pkg1': '00000009-pkg1', '00000005-pkg2': '00000010-pkg2'}
+        }
+
+        self.opts.destdir = self.make_temp_dir()
+        src_project = os.path.join(self.opts.destdir, "thrnciar", "source-copr")
+        dst_project = os.path.join(self.opts.destdir, "thrnciar", "destination-copr")
+        for chroot, builds in builds_map.items():
+            for src_dir in builds:
+                build_dir = os.path.join(src_project, chroot, src_dir)
+                os.makedirs(build_dir)
+                for name in ["pkg.rpm", "builder-live.log.gz"]:
+                    with open(os.path.join(build_dir, name), "w") as fd:
+                        fd.write(name)
+
         test_action = Action.create_from(
             opts=self.opts,
             action={
@@ -152,15 +174,7 @@ class TestAction(object):
                 "object_type": "copr",
                 "data": json.dumps(
                     {
-                       'builds_map':
-                        {
-                            'srpm-builds': {
-                                '00000002': '00000009', '00000005': '00000010'},
-                            'fedora-17-x86_64': {
-                                '00000002-pkg1': '00000009-pkg1', '00000005-pkg2': '00000010-pkg2'},
-                            'fedora-17-i386': {
-                                '00000002-pkg1': '00000009-pkg1', '00000005-pkg2': '00000010-pkg2'}
-                        },
+                        'builds_map': builds_map,
                         "user": "thrnciar",
                         "copr": "source-copr",
                         "appstream": True,
@@ -169,27 +183,28 @@ class TestAction(object):
                 "new_value": "thrnciar/destination-copr",
             },
         )
-        test_action.run()
-        calls = mc_copy_tree.call_args_list
-        assert len(calls) == 6
-        assert calls[0][0] == (
-            "/var/lib/copr/public_html/results/thrnciar/source-copr/srpm-builds/00000002",
-            "/var/lib/copr/public_html/results/thrnciar/destination-copr/srpm-builds/00000009")
-        assert calls[1][0] == (
-            "/var/lib/copr/public_html/results/thrnciar/source-copr/srpm-builds/00000005",
-            "/var/lib/copr/public_html/results/thrnciar/destination-copr/srpm-builds/00000010")
-        assert calls[2][0] == (
-            "/var/lib/copr/public_html/results/thrnciar/source-copr/fedora-17-x86_64/00000002-pkg1",
-            "/var/lib/copr/public_html/results/thrnciar/destination-copr/fedora-17-x86_64/00000009-pkg1")
-        assert calls[3][0] == (
-            "/var/lib/copr/public_html/results/thrnciar/source-copr/fedora-17-x86_64/00000005-pkg2",
-            "/var/lib/copr/public_html/results/thrnciar/destination-copr/fedora-17-x86_64/00000010-pkg2")
-        assert calls[4][0] == (
-            "/var/lib/copr/public_html/results/thrnciar/source-copr/fedora-17-i386/00000002-pkg1",
-            "/var/lib/copr/public_html/results/thrnciar/destination-copr/fedora-17-i386/00000009-pkg1")
-        assert calls[5][0] == (
-            "/var/lib/copr/public_html/results/thrnciar/source-copr/fedora-17-i386/00000005-pkg2",
-            "/var/lib/copr/public_html/results/thrnciar/destination-copr/fedora-17-i386/00000010-pkg2")
+        assert test_action.run() == ActionResult.SUCCESS
+
+        unsigned = set()
+        for call in mc_unsign_rpms_in_dir.call_args_list:
+            unsigned.add(call[0][0])
+        assert len(mc_unsign_rpms_in_dir.call_args_list) == 6
+
+        for chroot, builds in builds_map.items():
+            for src_dir, dst_dir in builds.items():
+                src = os.path.join(src_project, chroot, src_dir)
+                dst = os.path.join(dst_project, chroot, dst_dir)
+                assert dst in unsigned
+                # RPMs are re-signed, so they need to be copied
+                src_stat = os.stat(os.path.join(src, "pkg.rpm"))
+                dst_stat = os.stat(os.path.join(dst, "pkg.rpm"))
+                assert src_stat.st_ino != dst_stat.st_ino
+                with open(os.path.join(dst, "pkg.rpm")) as fd:
+                    assert fd.read() == "pkg.rpm"
+                # other files are hardlinked
+                src_stat = os.stat(os.path.join(src, "builder-live.log.gz"))
+                dst_stat = os.stat(os.path.join(dst, "builder-live.log.gz"))
+                assert src_stat.st_ino == dst_stat.st_ino
 
         # TODO: calling createrepo for srpm-builds is useless
         assert len(mc_popen.call_args_list) == 3
@@ -201,8 +216,42 @@ class TestAction(object):
             dirs.add(args[2])
 
         for chroot in ['srpm-builds', 'fedora-17-i386', 'fedora-17-x86_64']:
-            dir = '/var/lib/copr/public_html/results/thrnciar/destination-copr/' + chroot
-            assert dir in dirs
+            assert os.path.join(dst_project, chroot) in dirs
+
+    @mock.patch("copr_backend.actions.sign_rpms_in_dir")
+    @mock.patch("copr_backend.actions.unsign_rpms_in_dir")
+    @mock.patch("copr_backend.helpers.subprocess.Popen")
+    def test_action_handle_forks_sign_error(self, mc_popen, _mc_unsign,
+                                            mc_sign, mc_time):
+        mc_popen.return_value.communicate.return_value = ("", "")
+        mc_time.time.return_value = self.test_time
+        mc_sign.side_effect = CoprSignError("sign failed")
+        self.opts.do_sign = True
+        self.opts.sign_domain = "fedorahosted.org"
+        self.opts.destdir = self.make_temp_dir()
+        build_dir = os.path.join(self.opts.destdir, "thrnciar", "source-copr",
+                                 "fedora-17-x86_64", "00000002-pkg1")
+        os.makedirs(build_dir)
+        test_action = Action.create_from(
+            opts=self.opts,
+            action={
+                "action_type": ActionType.FORK,
+                "id": 1,
+                "object_type": "copr",
+                "data": json.dumps({
+                    'builds_map': {'fedora-17-x86_64': {
+                        '00000002-pkg1': '00000009-pkg1'}},
+                    "user": "thrnciar",
+                    "copr": "source-copr",
+                }),
+                "old_value": "thrnciar/source-copr",
+                "new_value": "thrnciar/destination-copr",
+            },
+        )
+        with mock.patch.object(test_action, "generate_gpg_key"), \
+                mock.patch("copr_backend.actions.PubkeyCache"):
+            assert test_action.run() == ActionResult.FAILURE
+        assert mc_sign.called
 
     @unittest.skip("Fixme, test doesn't work.")
     def test_action_run_rename(self, mc_time):
@@ -301,6 +350,7 @@ class TestAction(object):
     def test_action_run_delete_copr(self, mc_time):
         tmp_dir = self.make_temp_dir()
         self.opts.destdir = tmp_dir
+        self.opts.trash_dir = os.path.join(tmp_dir, "trash")
 
         test_action = Action.create_from(
             opts=self.opts,
@@ -323,6 +373,12 @@ class TestAction(object):
         assert os.path.exists(os.path.join(tmp_dir, "old_dir"))
         assert not os.path.exists(os.path.join(tmp_dir, "foo", "bar"))
 
+        # moved to trash, not removed yet
+        entries = os.listdir(self.opts.trash_dir)
+        assert len(entries) == 1
+        assert os.listdir(os.path.join(self.opts.trash_dir, entries[0])) == \
+            ["0-bar"]
+
     @unittest.skip("Fixme, test doesn't work.")
     def test_action_run_delete_copr_remove_folders(self, mc_time):
         mc_time.time.return_value = self.test_time
@@ -978,9 +1034,12 @@ class TestAction(object):
             lines = fd.readlines()
             assert lines == [text]
 
-    @mock.patch("copr_backend.actions.shutil.rmtree")
-    def test_remove_dirs(self, mock_rmtree, mc_time):
+    def test_remove_dirs(self, mc_time):
         _unused = mc_time
+        self.opts.destdir = self.make_temp_dir()
+        self.opts.trash_dir = os.path.join(self.opts.destdir, "trash")
+        for copr_dir in ["@python/python3.8:pr:11", "jdoe/some:pr:123"]:
+            os.makedirs(os.path.join(self.opts.destdir, copr_dir, "fedora-rawhide-x86_64"))
         test_action = Action.create_from(
             opts=self.opts,
             action={
@@ -992,7 +1051,9 @@ class TestAction(object):
             },
         )
         assert test_action.run() == ActionResult.SUCCESS
-        assert mock_rmtree.call_args_list == [
-            mock.call('/var/lib/copr/public_html/results/@python/python3.8:pr:11'),
-            mock.call('/var/lib/copr/public_html/results/jdoe/some:pr:123'),
-        ]
+        assert os.listdir(os.path.join(self.opts.destdir, "@python")) == []
+        assert os.listdir(os.path.join(self.opts.destdir, "jdoe")) == []
+        trashed = set()
+        for entry in os.listdir(self.opts.trash_dir):
+            trashed.update(os.listdir(os.path.join(self.opts.trash_dir, entry)))
+        assert trashed == {"0-python3.8:pr:11", "0-some:pr:123"}
@@ -18,12 +18,14 @@ from unittest import mock
 from munch import Munch
 import pytest
 
+from copr_common.redis_helpers import get_worker_events_channel
 from copr_backend.constants import LOG_REDIS_FIFO
 from copr_backend.background_worker_build import (
     BuildBackgroundWorker, MESSAGES, BackendError, _average_step,
 )
 from copr_backend.job import BuildJob
 from copr_backend.exceptions import CoprSignError, FrontendClientException
+from copr_backend.frontend import FrontendUpdateQueue
 from copr_backend.vm_alloc import ResallocHost, RemoteHostAllocationTerminated
 from copr_backend.background_worker_build import COMMANDS, MIN_BUILDER_VERSION
 from copr_backend.sshcmd import SSHConnectionError
@@ -435,6 +437,46 @@ def test_build_info_file_failure(f_build_rpm_case):
     assert "Backend process error: Can't write to " in str(err.value)
     assert "00848963-example/build.info'" in str(err.value)
 
+def test_queued_frontend_updates(f_build_rpm_case):
+    config = f_build_rpm_case
+    worker = config.bw
+    worker.opts.frontend_update_batching = True
+    worker._update_frontend_task({"builds": [
+        {"id": 848963, "status": 3},
+        {"id": 848964, "status": 3},
+    ]})
+    worker._update_frontend_task({"builds": [{"id": 848963, "status": 1}]})
+    fe_client = config.fe_client.return_value
+    assert not fe_client.update.called
+
+    queue = FrontendUpdateQueue(worker._redis, fe_client)
+    assert queue.flush() == 3
+    assert fe_client.update.call_args_list == [
+        mock.call({"builds": [{"id": 848963, "status": 3},
+                              {"id": 848964, "status": 3}]}),
+        mock.call({"builds": [{"id": 848963, "status": 1}]}),
+    ]
+
+def test_worker_events_published(f_build_rpm_case):
+    config = f_build_rpm_case
+    worker = config.bw
+    pubsub = worker._redis.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(get_worker_events_channel(
+        config.worker_id.rsplit(":", 1)[0]))
+    pubsub.get_message(timeout=1)
+
+    # disabled by default, the flag is only stored
+    worker.redis_set_worker_flag("started", 1)
+    assert worker.redis_get_worker_flag("started") == "1"
+    assert pubsub.get_message(timeout=0.1) is None
+
+    worker.opts.worker_events = True
+    worker.redis_set_worker_flag("status", 1)
+    message = pubsub.get_message(timeout=1)
+    assert json.loads(message["data"]) == {
+        "worker_id": config.worker_id, "event": "status"}
+    pubsub.close()
+
 def test_invalid_job_info(f_build_rpm_case, caplog):
     config = f_build_rpm_case
     worker = config.bw
@@ -1,9 +1,23 @@
 """ test counting priority of build task """
 
+import json
+import logging
+from unittest import mock
+
+from munch import Munch
 import pytest
 
+from copr_common.redis_helpers import get_redis_connection
+from copr_backend.exceptions import (
+    FrontendClientException,
+    FrontendClientRejected,
+)
+from copr_backend.frontend import FrontendUpdateQueue
 from copr_backend.rpm_builds import BuildQueueTask, PRIORITY_SECTION_SIZE
-from copr_backend.daemons.build_dispatcher import _PriorityCounter
+from copr_backend.daemons.build_dispatcher import (
+    BuildDispatcher,
+    _PriorityCounter,
+)
 
 
 def test_priority_numbers():
@@ -109,3 +123,200 @@ def test_sandbox_priority():
         "background": True,
         "sandbox": "cecil/baz--submitter",
     })) == 1  # the same arch, but different sandbox
+
+
+def _raw_task(task_id, background=False):
+    build_id, _, chroot = task_id.partition("-")
+    return {
+        "build_id": int(build_id),
+        "task_id": task_id,
+        "chroot": chroot or None,
+        "project_owner": "cecil",
+        "sandbox": "cecil/foo--submitter",
+        "background": background,
+    }
+
+
+class _FakeResponse:
+    def __init__(self, data):
+        self._data = data
+
+    def json(self):
+        """ Mimic requests.Response.json() """
+        return self._data
+
+
+class _FakeFrontendClient:
+    """ Simulate the /pending-jobs/ routes on frontend """
+    def __init__(self, queue):
+        self.queue = queue
+        self.cursor = 10
+        self.delta = {"full": False, "cursor": 10, "builds": [], "tasks": []}
+        self.requests = []
+        self.rejected = set()
+        self.updated = []
+        self.down = False
+
+    def update(self, data):
+        """ Mimic FrontendClient.update(), reject the self.rejected builds """
+        self.requests.append("update")
+        if self.down:
+            raise FrontendClientException("Frontend is not responding")
+        ids = [build["id"] for build in data["builds"]]
+        if self.rejected.intersection(ids):
+            raise FrontendClientRejected("400 BAD REQUEST")
+        self.updated.extend(ids)
+
+    def get(self, url_path):
+        """ Mimic FrontendClient.get() """
+        self.requests.append(url_path)
+        if url_path == "pending-jobs":
+            return _FakeResponse(self.queue)
+        if url_path == "pending-jobs/cursor":
+            return _FakeResponse({"cursor": self.cursor})
+        assert url_path == "pending-jobs/delta/{}".format(self.cursor)
+        return _FakeResponse(self.delta)
+
+
+class TestPendingJobsDelta:
+    """ BuildDispatcher.get_frontend_tasks() with pending_jobs_delta """
+
+    def setup_method(self, method):
+        _unused = method
+        self.opts = Munch(
+            builds_max_workers=10,
+            builds_limits={"arch": {}, "tag": {}, "arch_per_owner": {},
+                           "sandbox": 10, "owner": 10},
+            sleeptime=10,
+            incremental_queue_sync=True,
+            worker_events=False,
+            pending_jobs_delta=True,
+            pending_jobs_full_fetch_period=600,
+            frontend_update_batching=False,
+            frontend_base_url="http://frontend",
+            frontend_auth="auth",
+        )
+        with mock.patch("copr_backend.dispatcher.get_redis_logger",
+                        return_value=logging.getLogger()):
+            self.dispatcher = BuildDispatcher(self.opts)
+        self.frontend = _FakeFrontendClient([
+            _raw_task("1"),
+            _raw_task("2-fedora-rawhide-x86_64"),
+            _raw_task("3-fedora-rawhide-x86_64"),
+            _raw_task("3-fedora-rawhide-i386"),
+        ])
+        self.dispatcher.frontend_client = self.frontend
+
+    @staticmethod
+    def _ids(tasks):
+        return [(task.id, task.backend_priority) for task in tasks]
+
+    def test_delta_applied(self):
+        full = self.dispatcher.get_frontend_tasks()
+        assert self.frontend.requests == ["pending-jobs/cursor", "pending-jobs"]
+
+        self.frontend.delta = {
+            "full": False,
+            "cursor": 15,
+            "builds": [2, 3, 4],
+            "tasks": [
+                _raw_task("3-fedora-rawhide-x86_64"),
+                _raw_task("4-fedora-rawhide-x86_64"),
+                _raw_task("4"),
+            ],
+        }
+        tasks = self.dispatcher.get_frontend_tasks()
+        assert self.frontend.requests[-1] == "pending-jobs/delta/10"
+        assert self._ids(tasks) == [
+            ("1", 1),
+            ("4", 2),
+            ("3-fedora-rawhide-x86_64", 1),
+            ("4-fedora-rawhide-x86_64", 2),
+        ]
+
+        # the same as if we downloaded the whole queue
+        self.frontend.queue = [
+            _raw_task("1"),
+            _raw_task("4"),
+            _raw_task("3-fedora-rawhide-x86_64"),
+            _raw_task("4-fedora-rawhide-x86_64"),
+        ]
+        self.frontend.cursor = 15
+        self.opts.pending_jobs_delta = False
+        assert self._ids(self.dispatcher.get_frontend_tasks()) == self._ids(tasks)
+        assert len(full) == 4
+
+    def test_full_fetch_requested(self):
+        self.dispatcher.get_frontend_tasks()
+        self.frontend.delta = {"full": True}
+        self.frontend.queue = [_raw_task("5")]
+        tasks = self.dispatcher.get_frontend_tasks()
+        assert self.frontend.requests == [
+            "pending-jobs/cursor", "pending-jobs",
+            "pending-jobs/delta/10",
+            "pending-jobs/cursor", "pending-jobs",
+        ]
+        assert self._ids(tasks) == [("5", 1)]
+
+    def test_full_fetch_period(self):
+        self.dispatcher.get_frontend_tasks()
+        self.dispatcher._last_full_fetch -= 601  # pylint: disable=protected-access
+        self.dispatcher.get_frontend_tasks()
+        assert self.frontend.requests == [
+            "pending-jobs/cursor", "pending-jobs",
+            "pending-jobs/cursor", "pending-jobs",
+        ]
+
+    def test_update_queue_flushed_first(self):
+        self.opts.frontend_update_batching = True
+        self.dispatcher._update_queue = mock.MagicMock()
+        self.dispatcher._update_queue.flush.side_effect = \
+            lambda: self.frontend.requests.append("update")
+        self.dispatcher.get_frontend_tasks()
+        assert self.frontend.requests == [
+            "update", "pending-jobs/cursor", "pending-jobs"]
+
+
+    def test_failed_flush(self):
+        self.opts.frontend_update_batching = True
+        redis = get_redis_connection(Munch(redis_db=9, redis_port=7777))
+        redis.flushdb()
+        queue = FrontendUpdateQueue(redis, self.frontend)
+        self.dispatcher._update_queue = queue
+        queue.push({"id": 1, "status": 1})
+        self.frontend.down = True
+
+        # the finished task would appear as still running in the downloaded
+        # queue, and it would be started again
+        assert self.dispatcher.get_frontend_tasks() == []
+        assert self.frontend.requests == ["update"]
+        assert redis.llen(FrontendUpdateQueue.QUEUE_KEY) == 1
+
+        self.frontend.down = False
+        assert len(self.dispatcher.get_frontend_tasks()) == 4
+        assert self.frontend.updated == [1]
+        redis.flushdb()
+
+    def test_rejected_update(self):
+        self.opts.frontend_update_batching = True
+        redis = get_redis_connection(Munch(redis_db=9, redis_port=7777))
+        redis.flushdb()
+        queue = FrontendUpdateQueue(redis, self.frontend, max_batch=10)
+        self.dispatcher._update_queue = queue
+        for build_id in range(1, 8):
+            queue.push({"id": build_id, "status": 1})
+        self.frontend.rejected = {5}
+
+        assert len(self.dispatcher.get_frontend_tasks()) == 4
+        assert self.frontend.updated == [1, 2, 3, 4, 6, 7]
+        assert self.frontend.requests[-2:] == [
+            "pending-jobs/cursor", "pending-jobs"]
+        assert redis.llen(FrontendUpdateQueue.QUEUE_KEY) == 0
+        rejected = redis.lrange(FrontendUpdateQueue.DEAD_LETTER_KEY, 0, -1)
+        assert [json.loads(item)["data"]["id"] for item in rejected] == [5]
+
+        # the rejected update is not re-tried
+        self.frontend.requests = []
+        self.dispatcher.get_frontend_tasks()
+        assert "update" not in self.frontend.requests
+        redis.flushdb()
@@ -1,11 +1,14 @@
 # coding: utf-8
 
+import json
+
 from munch import Munch
 from requests import Response
 
+from copr_common.redis_helpers import get_redis_connection
 from copr_common.request import RequestRetryError
-from copr_backend.frontend import FrontendClient
-from copr_backend.exceptions import FrontendClientException
+from copr_backend.frontend import FrontendClient, FrontendUpdateQueue
+from copr_backend.exceptions import FrontendClientException, FrontendClientRejected
 
 from unittest import mock
 from unittest.mock import MagicMock
@@ -13,13 +16,13 @@ import pytest
 
 @pytest.yield_fixture
 def post_req():
-    with mock.patch("copr_common.request.post") as obj:
+    with mock.patch("copr_common.request.Session.request") as obj:
         yield obj
 
 @pytest.fixture(scope='function', params=['get', 'post', 'put'])
 def f_request_method(request):
-    'mock the requests.{get,post,put} method'
-    with mock.patch("copr_common.request.{}".format(request.param)) as ctx:
+    'mock the requests.Session.request method, for get, post and put'
+    with mock.patch("copr_common.request.Session.request") as ctx:
         ctx.return_value.headers = {
             "Copr-FE-BE-API-Version": "666",
         }
@@ -71,6 +74,7 @@ class TestFrontendClient(object):
         method.return_value.status_code = 200
         self.fc.send(self.url_path, method=name, data=self.data)
         assert method.called
+        assert method.call_args[0][0] == name
 
     def test_post_to_frontend_wrappers(self, f_request_method):
         name, method = f_request_method
@@ -119,7 +123,7 @@ class TestFrontendClient(object):
         ]
 
         mc_time.time.return_value = 0
-        with pytest.raises(FrontendClientException):
+        with pytest.raises(FrontendClientRejected):
             assert self.fc.post(self.data, self.url_path) == response
         assert mc_time.sleep.called
 
@@ -157,6 +161,19 @@ class TestFrontendClient(object):
         assert "Sending POST request to frontend" in caplog.records[0].getMessage()
         assert "Copr FE/BE API is too old on Frontend" in caplog.records[1].msg
 
+    def test_compressed_pooled_requests(self, post_req):
+        post_req.return_value.status_code = 200
+        post_req.return_value.headers = {"Copr-FE-BE-API-Version": "8"}
+        self.opts.frontend_gzip_requests = True
+        self.opts.frontend_pool_size = 3
+        fc = FrontendClient(self.opts)
+        assert fc.session is FrontendClient(self.opts).session
+        assert fc.session is not self.fc.session
+        fc.update({"builds": [{"id": i} for i in range(100)]})
+        assert post_req.call_args[1]["headers"]["content-encoding"] == "gzip"
+        self.fc.update({"builds": [{"id": i} for i in range(100)]})
+        assert "content-encoding" not in post_req.call_args[1]["headers"]
+
     def test_update(self):
         ptfr = MagicMock()
         self.fc.post = ptfr
@@ -196,3 +213,73 @@ class TestFrontendClient(object):
             'chroot': self.chroot_name,
         })
         assert ptfr.call_args == expected
+
+
+class TestFrontendUpdateQueue:
+    # pylint: disable=attribute-defined-outside-init
+
+    def setup_method(self, method):
+        _unused = method
+        self.redis = get_redis_connection(Munch(redis_db=9, redis_port=7777))
+        self.redis.flushdb()
+        self.fc = MagicMock()
+        self.queue = FrontendUpdateQueue(self.redis, self.fc, max_batch=3)
+
+    def teardown_method(self, method):
+        _unused = method
+        self.redis.flushdb()
+
+    def _sent(self):
+        return [[(b["id"], b["status"]) for b in call[0][0]["builds"]]
+                for call in self.fc.update.call_args_list]
+
+    def test_batches(self):
+        for build_id, status in [(1, 3), (2, 3), (1, 1), (3, 1), (4, 0),
+                                 (5, 1), (6, 1), (7, 1)]:
+            self.queue.push({"id": build_id, "status": status})
+        assert self.queue.flush() == 8
+        assert self._sent() == [
+            # cut before the second update of build 1
+            [(1, 3), (2, 3)],
+            [(1, 1), (3, 1), (4, 0)],
+            [(5, 1), (6, 1), (7, 1)],
+        ]
+        assert self.redis.llen(FrontendUpdateQueue.QUEUE_KEY) == 0
+        stats = self.queue.stats()
+        assert stats["batches"] == 3
+        assert stats["updates"] == 8
+        assert stats["size_max"] == 3
+        assert 0 <= stats["latency_max"] <= stats["latency_sum"]
+        assert self.queue.flush() == 0
+
+    def test_frontend_failure(self):
+        for build_id in range(5):
+            self.queue.push({"id": build_id, "status": 1})
+        self.fc.update.side_effect = [None, FrontendClientException("down")]
+        with pytest.raises(FrontendClientException):
+            self.queue.flush()
+        # the unsent updates are kept in the queue, in the same order
+        assert self.redis.llen(FrontendUpdateQueue.QUEUE_KEY) == 2
+        self.fc.update.side_effect = None
+        self.fc.update.reset_mock()
+        assert self.queue.flush() == 2
+        assert self._sent() == [[(3, 1), (4, 1)]]
+        assert self.queue.stats()["updates"] == 5
+
+    def test_rejected_update(self):
+        for build_id in range(6):
+            self.queue.push({"id": build_id, "status": 1})
+
+        def _update(data):
+            if 4 in [build["id"] for build in data["builds"]]:
+                raise FrontendClientRejected("400 BAD REQUEST")
+        self.fc.update.side_effect = _update
+
+        assert self.queue.flush() == 5
+        # [3, 4, 5] is bisected to [3], [4, 5], and [4, 5] to [4], [5]
+        assert self._sent() == [[(0, 1), (1, 1), (2, 1)], [(3, 1), (4, 1), (5, 1)],
+                                [(3, 1)], [(4, 1), (5, 1)], [(4, 1)], [(5, 1)]]
+        assert self.redis.llen(FrontendUpdateQueue.QUEUE_KEY) == 0
+        rejected = self.redis.lrange(FrontendUpdateQueue.DEAD_LETTER_KEY, 0, -1)
+        assert [json.loads(item)["data"] for item in rejected] == \
+            [{"id": 4, "status": 1}]
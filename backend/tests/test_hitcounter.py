@@ -0,0 +1,296 @@
+"""
+Tests for the shared hitcounter logic
+"""
+
+import gzip
+import logging
+import os
+import shutil
+import tempfile
+
+import pytest
+
+from copr_backend.hitcounter import (
+    LIGHTTPD_TIMESTAMP_FORMAT,
+    HitcounterJournal,
+    count_hits,
+    get_hit_data,
+    parse_cloudfront_file,
+    parse_lighttpd_line,
+    parse_timestamp,
+    process_remote_logs,
+)
+
+log = logging.getLogger(__name__)
+
+LINE = (
+    '1.2.3.4 copr-be.example.com - [08/Dec/2021:{time} +0000] '
+    '"GET {url} HTTP/1.1" {status} 1234 "-" "{agent}"\n'
+)
+
+RPM = "/results/%40copr/copr-dev/fedora-35-x86_64/0001-foo/foo-1.0.noarch.rpm"
+REPOMD = "/results/praiskup/ping/fedora-35-x86_64/repodata/repomd.xml"
+
+ACCESSES = [
+    # url, status, agent
+    (RPM, "200", "libdnf (Fedora Linux 35)"),
+    (REPOMD, "200", "libdnf (Fedora Linux 35)"),
+    (RPM, "404", "libdnf (Fedora Linux 35)"),
+    (RPM, "200", "Mozilla/5.0 (compatible; bingbot/2.0)"),
+    (RPM, "200", "Mock (Fedora Linux 35)"),
+    ("/results/praiskup/ping/srpm-builds/0001/foo.src.rpm", "200", "curl"),
+    ("/results/%2540copr/copr-dev/fedora-35-x86_64/0001/foo.rpm", "200",
+     "urlgrabber/3.10%20yum/3.4.3"),
+    ("/results/praiskup/ping/fedora-35-x86_64/", "200", "curl"),
+]
+
+EXPECTED = {
+    "chroot_rpms_dl_stat|@copr|copr-dev|fedora-35-x86_64": 1,
+    "project_rpms_dl_stat|@copr|copr-dev": 1,
+    "chroot_repo_metadata_dl_stat|praiskup|ping|fedora-35-x86_64": 1,
+}
+
+
+class TestHitCounter:
+    workdir = None
+
+    def setup_method(self):
+        self.workdir = tempfile.mkdtemp(prefix="copr-hitcounter-test-")
+
+    def teardown_method(self):
+        shutil.rmtree(self.workdir)
+
+    def _write_log(self, repeat=1, compress=False):
+        path = os.path.join(self.workdir, "access.log")
+        opener = open
+        if compress:
+            path += ".gz"
+            opener = gzip.open
+        with opener(path, "wt") as fd:
+            fd.write("=== start: 2021-12-08\n")
+            for i in range(repeat):
+                for url, status, agent in ACCESSES:
+                    time = "{0:02}:{1:02}:{2:02}".format(
+                        i // 3600 % 24, i // 60 % 60, i % 60)
+                    fd.write(LINE.format(time=time, url=url, status=status,
+                                         agent=agent))
+        return path
+
+    @staticmethod
+    def _count(path, workers=1):
+        return count_hits(path, parse_lighttpd_line, log,
+                          timestamp_format=LIGHTTPD_TIMESTAMP_FORMAT,
+                          workers=workers)
+
+    def test_filters(self):
+        counter = self._count(self._write_log())
+        assert counter.hits == EXPECTED
+        assert counter.accesses == len(ACCESSES)
+        assert counter.ts_from == counter.ts_to == parse_timestamp(
+            "08/Dec/2021:00:00:00 +0000", LIGHTTPD_TIMESTAMP_FORMAT)
+
+    def test_gzip(self):
+        counter = self._count(self._write_log(repeat=3, compress=True))
+        assert counter.hits == {key: 3 for key in EXPECTED}
+
+    def test_workers(self):
+        """
+        Lines split between the parallel workers are counted exactly once
+        """
+        path = self._write_log(repeat=1000)
+        serial = self._count(path)
+        parallel = self._count(path, workers=7)
+        assert parallel.hits == serial.hits == {key: 1000 for key in EXPECTED}
+        assert parallel.accesses == serial.accesses == 1000 * len(ACCESSES)
+        assert (parallel.ts_from, parallel.ts_to) \
+            == (serial.ts_from, serial.ts_to)
+        assert serial.ts_to - serial.ts_from == 999
+
+    def test_workers_line_at_boundary(self):
+        """
+        The line starting exactly at the range boundary is counted, too
+        """
+        workers = 3
+        lines = [LINE.format(time="00:00:{0:02}".format(i), url=url,
+                             status=status, agent=agent)
+                 for i, (url, status, agent) in enumerate(ACCESSES)]
+        for padding in range(1000):
+            header = "=== start: 2021-12-08{0}\n".format(" " * padding)
+            starts, size = set(), len(header)
+            for line in lines:
+                starts.add(size)
+                size += len(line)
+            if size // workers + 1 in starts:
+                break
+        else:
+            assert False, "no line starts at the boundary"
+
+        path = os.path.join(self.workdir, "access.log")
+        with open(path, "w") as fd:
+            fd.write(header + "".join(lines))
+        counter = self._count(path, workers=workers)
+        assert counter.hits == EXPECTED
+        assert counter.accesses == len(ACCESSES)
+
+    def test_chunks(self):
+        counter = self._count(self._write_log())
+        chunks = counter.get_hit_data(chunk_size=2)
+        assert [len(chunk["hits"]) for chunk in chunks] == [2, 1]
+        merged = {}
+        for chunk in chunks:
+            assert chunk["ts_from"] == counter.ts_from
+            merged.update(chunk["hits"])
+        assert merged == EXPECTED
+
+    def test_get_hit_data(self):
+        accesses = [{
+            "cs-uri-stem": url,
+            "sc-status": status,
+            "cs(User-Agent)": agent,
+            "date": "2021-12-08",
+            "time": "11:22:33",
+        } for url, status, agent in ACCESSES]
+        result = get_hit_data(accesses, log)
+        assert result["hits"] == EXPECTED
+        assert result["ts_from"] == result["ts_to"]
+        assert get_hit_data(accesses[2:3], log) == {}
+
+
+CLOUDFRONT_HEADER = (
+    "#Version: 1.0\n"
+    "#Fields: date time x-edge-location sc-bytes c-ip cs-method cs(Host) "
+    "cs-uri-stem sc-status cs(Referer) cs(User-Agent) x-host-header\n"
+)
+
+CLOUDFRONT_LINE = (
+    "2021-12-08\t11:22:33\tFRA2\t1234\t1.2.3.4\tGET\t"
+    "d1nld9ovj32u75.cloudfront.net\t{url}\t{status}\t-\t{agent}\t{host}\n"
+)
+
+CDN = "download.copr.fedorainfracloud.org"
+
+
+class LocalStorage:
+    """
+    Local stand-in for the S3 bucket, with the access files in a directory
+    """
+    def __init__(self, directory, fail_delete=False):
+        self.directory = directory
+        self.fail_delete = fail_delete
+        self.downloaded = []
+
+    def list_files(self):
+        return sorted(os.listdir(self.directory))
+
+    def download_file(self, remote, dstdir):
+        self.downloaded.append(remote)
+        dst = os.path.join(dstdir, remote)
+        shutil.copy(os.path.join(self.directory, remote), dst)
+        return dst
+
+    def delete_file(self, remote):
+        if self.fail_delete:
+            return
+        os.remove(os.path.join(self.directory, remote))
+
+
+class TestRemoteLogs:
+    workdir = None
+
+    def setup_method(self):
+        self.workdir = tempfile.mkdtemp(prefix="copr-hitcounter-test-")
+        for subdir in ["bucket", "download"]:
+            os.mkdir(os.path.join(self.workdir, subdir))
+        self.journal = os.path.join(self.workdir, "journal.json")
+        self.sent = []
+
+    def teardown_method(self):
+        shutil.rmtree(self.workdir)
+
+    def _write_files(self, count, host=CDN):
+        for i in range(count):
+            path = os.path.join(self.workdir, "bucket",
+                                "E2PUZ.{0:04}.{1}.gz".format(i, host))
+            with gzip.open(path, "wt") as fd:
+                fd.write(CLOUDFRONT_HEADER)
+                for url, status, agent in ACCESSES:
+                    fd.write(CLOUDFRONT_LINE.format(
+                        url=url, status=status, agent=agent.replace(" ", "%20"),
+                        host=host))
+
+    def _parse(self, path):
+        counter, different = parse_cloudfront_file(path, [CDN], log)
+        return counter, "different hostname: {0}".format(different) \
+            if different else None
+
+    def _process(self, storage, batch_size=3, send=None):
+        process_remote_logs(
+            storage, storage.list_files(),
+            os.path.join(self.workdir, "download"),
+            parse_file=self._parse,
+            journal=HitcounterJournal(self.journal),
+            send=send or self.sent.append,
+            log=log, workers=2, batch_size=batch_size)
+
+    def _total(self):
+        total = {}
+        for chunk in self.sent:
+            for key, count in chunk["hits"].items():
+                total[key] = total.get(key, 0) + count
+        return total
+
+    def test_pipeline(self):
+        self._write_files(7)
+        self._write_files(2, host="download.copr-dev.fedorainfracloud.org")
+        storage = LocalStorage(os.path.join(self.workdir, "bucket"))
+        self._process(storage)
+
+        # 7 files in batches per 3 files
+        assert len(self.sent) == 3
+        assert self._total() == {key: 7 for key in EXPECTED}
+        assert len(storage.list_files()) == 2
+        assert not os.listdir(os.path.join(self.workdir, "download"))
+
+        # the devel files are not downloaded again
+        storage.downloaded = []
+        self._process(storage)
+        assert storage.downloaded == []
+        assert len(self.sent) == 3
+
+    def test_restart_after_failed_delete(self):
+        self._write_files(4)
+        storage = LocalStorage(os.path.join(self.workdir, "bucket"),
+                               fail_delete=True)
+        self._process(storage)
+        assert self._total() == {key: 4 for key in EXPECTED}
+
+        # nothing is counted twice, the files are just removed
+        storage.fail_delete = False
+        storage.downloaded = []
+        self._process(storage)
+        assert storage.downloaded == []
+        assert self._total() == {key: 4 for key in EXPECTED}
+        assert storage.list_files() == []
+
+        # the removed files are forgotten by the next run
+        assert len(HitcounterJournal(self.journal).counted) == 4
+        self._process(storage)
+        assert HitcounterJournal(self.journal).counted == set()
+
+    def test_restart_after_crash(self):
+        self._write_files(5)
+        storage = LocalStorage(os.path.join(self.workdir, "bucket"))
+
+        def _crash(chunk):
+            if self.sent:
+                raise RuntimeError("frontend unavailable")
+            self.sent.append(chunk)
+
+        with pytest.raises(RuntimeError):
+            self._process(storage, batch_size=2, send=_crash)
+        assert self._total() == {key: 2 for key in EXPECTED}
+        assert len(HitcounterJournal(self.journal).sending) == 2
+
+        self._process(storage, batch_size=2)
+        assert self._total() == {key: 5 for key in EXPECTED}
+        assert storage.list_files() == []
@@ -9,10 +9,12 @@ from munch import Munch
 import pytest
 
 from copr_backend.exceptions import CoprSignError, CoprSignNoKeyError, CoprKeygenRequestError
+from copr_common.redis_helpers import get_redis_connection
 from copr_backend.sign import (
     get_pubkey, _sign_one, sign_rpms_in_dir, create_user_keys,
     gpg_hashtype_for_chroot,
     call_sign_bin,
+    PubkeyCache,
 )
 
 STDOUT = "stdout"
@@ -33,6 +35,8 @@ class TestSign(object):
         self.opts = Munch(keygen_host="example.com")
         self.opts.gently_gpg_sha256 = False
         self.opts.sign_domain = "fedorahosted.org"
+        self.opts.sign_parallelism = 1
+        self.opts.pubkey_cache_ttl = 0
 
     def teardown_method(self, method):
         if self.tmp_dir_path:
@@ -302,6 +306,128 @@ class TestSign(object):
 
         assert mc_so.called
 
+    @mock.patch("copr_backend.sign._sign_one")
+    @mock.patch("copr_backend.sign.create_user_keys")
+    @mock.patch("copr_backend.sign.get_pubkey")
+    def test_sign_rpms_in_dir_parallel(self, mc_gp, _mc_cuk, mc_so, tmp_dir):
+        names = ["pkg-{}.rpm".format(i) for i in range(8)]
+        for name in names:
+            with open(os.path.join(self.tmp_dir_path, name), "w") as handle:
+                handle.write("1")
+
+        running = set()
+        concurrency = []
+        def _sign(path, *_args):
+            running.add(path)
+            concurrency.append(len(running))
+            time.sleep(0.1)
+            running.remove(path)
+            if path.endswith(("pkg-3.rpm", "pkg-5.rpm")):
+                raise CoprSignError("foobar")
+            return STDOUT, STDERR
+        mc_so.side_effect = _sign
+
+        log = MagicMock()
+        self.opts.sign_parallelism = 4
+        with pytest.raises(CoprSignError) as err:
+            sign_rpms_in_dir(self.username, self.projectname,
+                             self.tmp_dir_path, "fedora-36-x86_64", self.opts,
+                             log=log)
+
+        assert mc_gp.called
+        assert len(mc_so.call_args_list) == 8
+        assert {call[0][1] for call in mc_so.call_args_list} == {self.usermail}
+        assert 1 < max(concurrency) <= 4
+        assert "pkg-3.rpm" in str(err.value)
+        assert "pkg-5.rpm" in str(err.value)
+        assert "pkg-4.rpm" not in str(err.value)
+        assert log.exception.call_count == 2
+        assert any("took" in call[0][0] for call in log.info.call_args_list)
+
+
+class TestPubkeyCache:
+    def setup_method(self, method):
+        self.opts = Munch(
+            keygen_host="example.com",
+            sign_domain="fedorahosted.org",
+            redis_host="127.0.0.1",
+            redis_port=7777,
+            redis_db=9,
+            pubkey_cache_ttl=3600,
+        )
+        self.rc = get_redis_connection(self.opts)
+        self.rc.flushdb()
+
+    def teardown_method(self, method):
+        self.rc.flushdb()
+
+    @mock.patch("copr_backend.sign.get_pubkey")
+    def test_hits(self, mc_gp, tmp_path):
+        mc_gp.return_value = "pubkey foo/bar"
+        cache = PubkeyCache(self.opts, MagicMock())
+        for _ in range(3):
+            assert cache.get("foo", "bar") == "pubkey foo/bar"
+        assert mc_gp.call_count == 1
+
+        # shared by all the workers
+        outfile = str(tmp_path / "pubkey.gpg")
+        PubkeyCache(self.opts, MagicMock()).get("foo", "bar", outfile)
+        with open(outfile, "r") as handle:
+            assert handle.read() == "pubkey foo/bar"
+        assert mc_gp.call_count == 1
+        assert cache.stats() == (3, 1)
+
+        mc_gp.return_value = "pubkey foo/baz"
+        assert cache.get("foo", "baz") == "pubkey foo/baz"
+        assert mc_gp.call_count == 2
+        assert cache.stats() == (3, 2)
+
+    def test_shared_connection(self):
+        first = PubkeyCache(self.opts, MagicMock())
+        assert PubkeyCache(self.opts, MagicMock()).redis is first.redis
+        self.opts.redis_db = 8
+        assert PubkeyCache(self.opts, MagicMock()).redis is not first.redis
+
+    @mock.patch("copr_backend.sign.SafeRequest.send")
+    @mock.patch("copr_backend.sign.get_pubkey")
+    def test_invalidate_on_new_key(self, mc_gp, mc_request):
+        mc_request.return_value.status_code = 200
+        mc_gp.return_value = "old key"
+        cache = PubkeyCache(self.opts, MagicMock())
+        cache.get("foo", "bar")
+
+        create_user_keys("foo", "bar", self.opts)
+        mc_gp.return_value = "new key"
+        assert cache.get("foo", "bar") == "new key"
+        assert mc_gp.call_count == 2
+
+    @mock.patch("copr_backend.sign.get_pubkey")
+    def test_ttl_and_corruption(self, mc_gp):
+        mc_gp.return_value = "pubkey"
+        cache = PubkeyCache(self.opts, MagicMock())
+        cache.get("foo", "bar")
+        key = PubkeyCache.KEY.format("foo#bar@copr.fedorahosted.org")
+        digest = self.rc.get(key)
+        assert 0 < self.rc.ttl(key) <= 3600
+        self.rc.set(PubkeyCache.BLOB_KEY.format(digest), "tampered")
+        assert cache.get("foo", "bar") == "pubkey"
+        assert mc_gp.call_count == 2
+
+        self.opts.pubkey_cache_ttl = 0
+        self.rc.flushdb()
+        PubkeyCache(self.opts, MagicMock()).get("foo", "bar")
+        assert mc_gp.call_count == 3
+        assert self.rc.keys("*") == []
+
+    @mock.patch("copr_backend.sign.get_pubkey")
+    def test_redis_unavailable(self, mc_gp):
+        mc_gp.return_value = "pubkey"
+        self.opts.redis_port = 1
+        log = MagicMock()
+        cache = PubkeyCache(self.opts, log)
+        assert cache.get("foo", "bar") == "pubkey"
+        assert log.warning.call_count == 2
+
 
 def test_chroot_gpg_hashes():
     chroots = [
@@ -0,0 +1,151 @@
+"""
+Tests for the asynchronous removal of result directories
+"""
+
+import errno
+import logging
+import os
+import stat
+import time
+from unittest import mock
+
+import pytest
+from munch import Munch
+
+from copr_backend.trash import (
+    TRASH_TMP_PREFIX,
+    TRASH_TMP_TIMEOUT,
+    TrashReaper,
+    move_to_trash,
+)
+
+LOG = logging.getLogger(__name__)
+
+
+def _make_tree(path, files=3):
+    os.makedirs(os.path.join(path, "sub"))
+    for i in range(files):
+        with open(os.path.join(path, "sub", "file{}".format(i)), "w") as fd:
+            fd.write("content\n")
+
+
+@pytest.fixture(name="f_trash")
+def fixture_trash(f_temp_directory):
+    """ destdir with one project, and the trash directory """
+    destdir = os.path.join(f_temp_directory.workdir, "results")
+    _make_tree(os.path.join(destdir, "user", "project", "fedora-rawhide-x86_64"))
+    opts = Munch(destdir=destdir,
+                 trash_dir=os.path.join(f_temp_directory.workdir, "trash"))
+    yield opts
+
+
+def test_move_to_trash(f_trash):
+    project = os.path.join(f_trash.destdir, "user", "project")
+    log = os.path.join(f_trash.destdir, "user", "build-00000001.log")
+    with open(log, "w"):
+        pass
+    missing = os.path.join(f_trash.destdir, "user", "missing")
+    move_to_trash(f_trash, [project, missing, log], LOG)
+    assert os.listdir(os.path.join(f_trash.destdir, "user")) == []
+
+    entries = os.listdir(f_trash.trash_dir)
+    assert len(entries) == 1
+    entry = os.path.join(f_trash.trash_dir, entries[0])
+    assert sorted(os.listdir(entry)) == ["0-project", "1-build-00000001.log"]
+    assert os.path.isdir(os.path.join(entry, "0-project",
+                                      "fedora-rawhide-x86_64", "sub"))
+
+    # nothing to be done
+    move_to_trash(f_trash, [missing], LOG)
+    assert len(os.listdir(f_trash.trash_dir)) == 1
+
+
+def test_trash_dir_mode(f_trash):
+    project = os.path.join(f_trash.destdir, "user", "project")
+    os.makedirs(f_trash.trash_dir, mode=0o755)
+    os.chmod(f_trash.trash_dir, 0o755)
+    move_to_trash(f_trash, [project], LOG)
+    assert stat.S_IMODE(os.stat(f_trash.trash_dir).st_mode) == 0o700
+
+
+def test_move_to_trash_synchronous(f_trash):
+    project = os.path.join(f_trash.destdir, "user", "project")
+    f_trash.trash_dir = None
+    move_to_trash(f_trash, [project], LOG)
+    assert not os.path.exists(project)
+
+
+def test_move_to_trash_other_filesystem(f_trash):
+    project = os.path.join(f_trash.destdir, "user", "project")
+    exdev = OSError(errno.EXDEV, "Invalid cross-device link")
+    with mock.patch("copr_backend.trash.os.rename", side_effect=[exdev, None]):
+        move_to_trash(f_trash, [project], LOG)
+    assert not os.path.exists(project)
+
+
+def test_reaper(f_trash):
+    projects = []
+    for name in ["first", "second"]:
+        projects.append(os.path.join(f_trash.destdir, "user", name))
+        _make_tree(projects[-1])
+        move_to_trash(f_trash, [projects[-1]], LOG)
+
+    # symlinks are removed, not followed
+    project = os.path.join(f_trash.destdir, "user", "project")
+    link = os.path.join(f_trash.destdir, "user", "link")
+    os.symlink(project, link)
+    move_to_trash(f_trash, [link], LOG)
+
+    reaper = TrashReaper(f_trash.trash_dir, LOG)
+    first, second, third = reaper.entries()
+    assert os.listdir(first) == ["0-first"]
+    assert os.listdir(second) == ["0-second"]
+    assert os.listdir(third) == ["0-link"]
+
+    assert reaper.reap() == 3
+    assert os.listdir(f_trash.trash_dir) == []
+    # 3 files, 2 directories and the entry per each project, plus the link
+    # and its entry
+    assert reaper.removed == 2 * (3 + 2 + 1) + 2
+    assert os.path.isdir(os.path.join(project, "fedora-rawhide-x86_64", "sub"))
+    assert reaper.reap() == 0
+
+
+def test_reaper_resume(f_trash):
+    project = os.path.join(f_trash.destdir, "user", "project")
+    move_to_trash(f_trash, [project], LOG)
+    reaper = TrashReaper(f_trash.trash_dir, LOG)
+    entry = reaper.entries()[0]
+
+    # simulate a crash in the middle of the removal
+    subdir = os.path.join(entry, "0-project", "fedora-rawhide-x86_64", "sub")
+    os.unlink(os.path.join(subdir, "file0"))
+
+    assert reaper.reap() == 1
+    assert not os.path.exists(entry)
+    assert reaper.removed == 2 + 3 + 1
+
+
+def test_reaper_unfinished_entry(f_trash):
+    reaper = TrashReaper(f_trash.trash_dir, LOG)
+    unfinished = os.path.join(f_trash.trash_dir, TRASH_TMP_PREFIX + "abcd")
+    os.makedirs(unfinished)
+    assert reaper.entries() == []
+
+    # left behind by a crashed action
+    old = time.time() - TRASH_TMP_TIMEOUT - 1
+    os.utime(unfinished, (old, old))
+    assert reaper.entries() == [unfinished]
+    assert reaper.reap() == 1
+    assert os.listdir(f_trash.trash_dir) == []
+
+
+@mock.patch("copr_backend.trash.time.sleep")
+def test_reaper_throttling(mc_sleep, f_trash):
+    project = os.path.join(f_trash.destdir, "user", "project")
+    move_to_trash(f_trash, [project], LOG)
+    reaper = TrashReaper(f_trash.trash_dir, LOG, rate=2)
+    reaper.reap()
+    # 3 files, 4 directories (including the entry), sleep after each 2nd
+    assert reaper.removed == 7
+    assert len(mc_sleep.call_args_list) == 3
@@ -83,6 +83,18 @@ def test_predicate_worker_limit():
     wl.clear()
     assert set(wl._refs.keys()) == set([])
 
+def test_predicate_worker_limit_removed():
+    wl = PredicateWorkerLimit(lambda x: x.always_true, 2)
+    wl.worker_added("1", _QT(1))
+    wl.worker_added("2", _QT(2))
+    assert not wl.check(_QT(3))
+    assert wl.quota_key(_QT(3)) is True
+    assert wl.worker_removed("1") is True
+    assert wl.worker_removed("1") is None
+    assert wl.worker_removed("7") is None
+    assert wl.check(_QT(3))
+    assert wl._refs.keys() == set(["2"])
+
 def test_predicate_worker_limit_sometimes():
     # pylint: disable=protected-access
     wl = PredicateWorkerLimit(lambda x: x.sometimes_true, 2)
@@ -111,6 +123,21 @@ def test_group_worker_limit():
     assert wl._groups._counter == {}
     assert wl._refs == {}
 
+def test_group_worker_limit_removed():
+    wl = HashWorkerLimit(lambda x: x.group, 2)
+    wl.worker_added("0", _QT("0"))
+    wl.worker_added("3", _QT("3"))
+    # adding the same worker twice doesn't count
+    wl.worker_added("3", _QT("3"))
+    assert not wl.check(_QT("6"))
+    assert wl.quota_key(_QT("6")) == "group_0"
+    assert wl.worker_removed("3") == "group_0"
+    assert wl.check(_QT("6"))
+    assert wl.worker_removed("0") == "group_0"
+    assert wl.worker_removed("0") is None
+    assert wl._groups._counter == {}
+    assert wl._refs == {}
+
 def test_worker_limit_info():
     limits = [
         PredicateWorkerLimit(lambda _: True, 8),
@@ -151,3 +178,8 @@ def test_string_counter():
     counter2.add("baz")
     assert str(counter) == "foo=2, bar=1"
     assert str(counter2) == "baz=1"
+    counter.remove("bar")
+    counter.remove("foo")
+    counter.remove(None)
+    assert str(counter) == "foo=1"
+    assert counter.count("bar") == 0
@@ -3,19 +3,29 @@
 import os
 import sys
 import copy
+import json
 import time
+import itertools
 import logging
+import shutil
+import signal
+import tempfile
+import threading
 from unittest.mock import MagicMock, patch
 
 import pytest
 from munch import Munch
 from copr_common.enums import DefaultActionPriorityEnum
 
-from copr_common.redis_helpers import get_redis_connection
+from copr_common.redis_helpers import (
+    get_redis_connection,
+    get_worker_events_channel,
+)
 from copr_common.worker_manager import (
     JobQueue,
     WorkerManager,
     PredicateWorkerLimit,
+    HashWorkerLimit,
 )
 from copr_backend.actions import ActionWorkerManager, ActionQueueTask, Action
 from copr_backend.worker_manager import BackendQueueTask
@@ -39,6 +49,12 @@ class ToyWorkerManager(WorkerManager):
     task_sleep = 0
     started_in_cycle = 0
     expected_terminations_in_cycle = None
+    # The daemons outlive the test if not killed, and they would write into
+    # the Redis DB used by the following tests.  Each daemon writes its PID
+    # into a separate file in pid_dir, see BaseTestWorkerManager.
+    pid_dir = None
+    pid_files = []
+    pid_counter = itertools.count()
 
     def start_task(self, worker_id, task):
         self.process_counter += 1
@@ -56,6 +72,11 @@ class ToyWorkerManager(WorkerManager):
         task_env = getattr(self, 'environ', None)
         if task_env:
            environ.update(task_env)
+        if self.pid_dir:
+            pid_file = os.path.join(self.pid_dir,
+                                    str(next(self.pid_counter)))
+            self.pid_files.append(pid_file)
+            environ["PID_FILE"] = pid_file
 
         start = time.time()
         #subprocess.check_call(list(map(str, cmd)), env=environ)
@@ -104,6 +125,31 @@ class ToyQueueTask(BackendQueueTask):
         return bool(int(self.id) % 2)
 
 
+class PrioToyQueueTask(ToyQueueTask):
+    """ Toy task with an explicitly set priority """
+    def __init__(self, _id, priority=0):
+        super().__init__(_id)
+        self._priority = priority
+
+    @property
+    def priority(self):
+        return self._priority
+
+
+class NoopWorkerManager(WorkerManager):
+    """ Don't start any background process, just track the started tasks """
+    # pylint: disable=abstract-method
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.started = []
+
+    def start_task(self, worker_id, task):
+        self.started.append(task.id)
+
+    def finish_task(self, worker_id, task_info):
+        pass
+
+
 class TestPrioQueue(object):
     def setup_method(self, method):
         raw_actions = [0, 1, 2, 3, 3, 3, 4, 5, 6, 7, 8, 9]
@@ -142,6 +188,24 @@ class TestPrioQueue(object):
         self.queue.add_task(6) # move forward
         assert self.get_tasks() == [6, 7, 9, 0, 1, 2, 3, 4, 5, 8]
 
+    def test_update_task(self):
+        assert not self.queue.update_task(9, priority=10)  # no-op
+        assert self.queue.update_task(8, priority=5)
+        assert self.queue.update_task(12, priority=0)
+        assert self.get_tasks() == [12, 7, 8, 0, 1, 2, 3, 4, 5, 6, 9]
+
+    def test_compact(self):
+        # 3 duplicates + 7 re-prioritized
+        assert self.queue.removed_count == 3
+        self.queue.compact()
+        assert len(self.queue.prio_queue) == 13
+        for task in [0, 1, 2, 3, 4, 5]:
+            self.queue.remove_task(task)
+        self.queue.compact()
+        assert self.queue.removed_count == 0
+        assert len(self.queue.prio_queue) == 4
+        assert self.get_tasks() == [7, 6, 8, 9]
+
 
 class BaseTestWorkerManager:
     redis = None
@@ -149,10 +213,51 @@ class BaseTestWorkerManager:
 
     def setup_method(self, method):
         log.setLevel(logging.DEBUG)
+        ToyWorkerManager.pid_dir = tempfile.mkdtemp(prefix="copr-test-wm-")
+        ToyWorkerManager.pid_files = []
         self.setup_redis()
         self.setup_worker_manager()
         self.setup_tasks()
 
+    def teardown_method(self, method):
+        self.kill_daemons()
+        self.redis.flushall()
+        shutil.rmtree(ToyWorkerManager.pid_dir)
+        ToyWorkerManager.pid_dir = None
+
+    @staticmethod
+    def kill_daemons(timeout=10):
+        """
+        Kill the background workers started by the test, so they don't touch
+        the Redis DB of the following tests.
+        """
+        pids = []
+        deadline = time.time() + timeout
+        for pid_file in ToyWorkerManager.pid_files:
+            while not os.path.exists(pid_file) and time.time() < deadline:
+                time.sleep(0.05)
+            try:
+                with open(pid_file, "r") as fd:
+                    pids.append(int(fd.read()))
+            except (OSError, ValueError):
+                pass
+
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+        for pid in pids:
+            while time.time() < deadline:
+                try:
+                    with open("/proc/{}/stat".format(pid), "r") as fd:
+                        if fd.read().split(")")[-1].split()[0] == "Z":
+                            break
+                except OSError:
+                    break
+                time.sleep(0.05)
+
     def setup_redis(self):
         self.redis = get_redis_connection(REDIS_OPTS)
         self.redis.flushall()
@@ -241,19 +346,16 @@ class TestLimitedWorkerManager(BaseTestWorkerManager):
         assert ('root', logging.INFO, "Finished worker worker:5") \
                 in caplog.record_tuples
 
-        # worker 7 is not yet started, it waits for next run() because run()
-        # doesn't free the limit quota when removing worker from Redis (see
-        # issue #1415)
+        # worker 7 is started in the same run() call, because removing
+        # worker 5 immediately freed the "odd" quota
         worker_7_started = "Starting worker worker:7, task.priority=0"
-        assert ('root', logging.INFO, worker_7_started) not in \
-            caplog.record_tuples
-
-        # another run finally takes the task 7, because 5 is done
-        self.setup_tasks(exclude=[5])
-        self.worker_manager.run(timeout=150)
         assert ('root', logging.INFO, worker_7_started) in \
             caplog.record_tuples
 
+        # but only one "odd" task
+        worker_9_started = "Starting worker worker:9, task.priority=0"
+        assert ('root', logging.INFO, worker_9_started) not in \
+            caplog.record_tuples
 
 class TestWorkerManager(BaseTestWorkerManager):
     def test_worker_starts(self):
@@ -262,8 +364,18 @@ class TestWorkerManager(BaseTestWorkerManager):
         self.worker_manager._start_worker(task, time.time())
         worker_id = self.worker_manager.get_worker_id(repr(task))
         assert len(self.redis.keys(worker_id)) == 1
+        assert self.worker_manager.worker_ids() == [worker_id]
         self.worker_manager._clean_daemon_processes()
 
+    def test_worker_registry(self):
+        self.redis.hset("worker:old", "allocated", 1)
+        self.redis.hset("other:1", "allocated", 1)
+        self.setup_worker_manager()
+        assert self.worker_manager.worker_ids() == ["worker:old"]
+        self.worker_manager._delete_worker("worker:old")
+        assert self.worker_manager.worker_ids() == []
+        assert self.redis.keys("worker*") == []
+
     def test_number_of_tasks(self):
         assert self.remaining_tasks() == 10
 
@@ -276,12 +388,33 @@ class TestWorkerManager(BaseTestWorkerManager):
         """ from previous systemctl restart """
         fake_worker_name = self.worker_manager.worker_prefix + ":fake"
         self.redis.hset(fake_worker_name, "foo", "bar")
+        # the worker manager adopts the old workers when it starts
+        self.setup_worker_manager()
         self.worker_manager.run(timeout=0.0001)
         msg = "Missing 'allocated' flag for worker " + fake_worker_name
         assert ('root', logging.INFO, msg) in caplog.record_tuples
 
+    @patch('copr_common.worker_manager.time.sleep')
+    def test_recreated_worker_key(self, _mc_sleep, caplog):
+        """ worker wrote into Redis after we deleted it """
+        self.worker_manager.clean_tasks()
+        self.worker_manager.run(timeout=0.0001)
+        self.redis.hset("worker:zombie", "status", "1")
+
+        # not noticed before the reconcile period
+        self.worker_manager.run(timeout=0.0001)
+        assert self.redis.exists("worker:zombie")
+
+        self.worker_manager.worker_registry_reconcile_period = 0
+        self.worker_manager.run(timeout=0.0001)
+        msg = "Missing 'allocated' flag for worker worker:zombie"
+        assert ('root', logging.INFO, msg) in caplog.record_tuples
+        assert not self.redis.exists("worker:zombie")
+        assert "worker:zombie" not in self.worker_manager.worker_ids()
+
     def test_cancel_task(self):
         self.redis.hset('worker:4', 'allocated', 1)
+        self.redis.sadd('worker_registry:worker', 'worker:4')
         self.worker_manager.cancel_task_id(3)
         self.worker_manager.cancel_task_id(4)
         self.worker_manager.cancel_task_id(666)
@@ -314,6 +447,197 @@ class TestWorkerManager(BaseTestWorkerManager):
         assert t2 - t1 < 2
 
 
+class TestWorkerManagerSync(BaseTestWorkerManager):
+    """
+    Test the incremental WorkerManager.sync_tasks() method.
+    """
+    limits = []
+
+    def setup_worker_manager(self):
+        self.limits = [
+            PredicateWorkerLimit(lambda x: not x.is_odd, 2, name="even"),
+            HashWorkerLimit(lambda x: int(x.id) % 3, 2, name="modulo"),
+        ]
+        self.worker_manager = NoopWorkerManager(
+            redis_connection=self.redis,
+            max_workers=50,
+            log=log,
+            limits=self.limits)
+        self.worker_manager.worker_timeout_start = 1000
+
+    def setup_tasks(self, exclude=None):
+        _unused = (self, exclude)
+
+    @staticmethod
+    def _pop_all(worker_manager):
+        tasks = []
+        while True:
+            try:
+                tasks.append(worker_manager.tasks.pop_task())
+            except KeyError:
+                return [(task.id, task.priority) for task in tasks]
+
+    @patch('copr_common.worker_manager.time.sleep')
+    @patch('copr_common.worker_manager.time.time')
+    def _run(self, mc_time, _mc_sleep):
+        mc_time.side_effect = range(1000)
+        self.worker_manager.run(timeout=100)
+
+    def test_sync_equals_rebuild(self):
+        tasks = [PrioToyQueueTask(i, priority=i % 4) for i in range(20)]
+        stats = self.worker_manager.sync_tasks(tasks)
+        assert (stats.added, stats.removed, stats.reprioritized) == (20, 0, 0)
+
+        # drop 3 and 7, move 5 to the front, and add 20 and 21
+        new_tasks = [PrioToyQueueTask(i, priority=-2 if i == 5 else i % 4)
+                     for i in range(20) if i not in [3, 7]]
+        new_tasks += [PrioToyQueueTask(20), PrioToyQueueTask(21, priority=-1)]
+        stats = self.worker_manager.sync_tasks(new_tasks)
+        assert (stats.added, stats.removed, stats.reprioritized) == (2, 2, 1)
+        assert stats.changes == 5
+        assert stats.queue_size == 20
+
+        rebuilt = NoopWorkerManager(redis_connection=self.redis, log=log)
+        for task in new_tasks:
+            rebuilt.add_task(task)
+        assert self._pop_all(self.worker_manager) == self._pop_all(rebuilt)
+
+        # nothing changed
+        stats = self.worker_manager.sync_tasks(new_tasks)
+        assert stats.changes == 0
+
+    def test_sync_keeps_limits(self):
+        tasks = [ToyQueueTask(i) for i in range(10)]
+        self.worker_manager.sync_tasks(tasks)
+        self._run()
+        # only two even tasks, and two tasks per each 'modulo' group
+        started = [0, 1, 2, 3, 5, 7]
+        assert self.worker_manager.started == started
+
+        # the skipped tasks stay parked, and the quota isn't counted twice
+        stats = self.worker_manager.sync_tasks(tasks)
+        assert (stats.requeued, stats.queue_size, stats.parked) == (0, 0, 4)
+        self._run()
+        assert self.worker_manager.started == started
+
+        # finish the worker:0 and worker:1 workers, this frees the quota for
+        # the parked tasks 4 and 9
+        self.redis.hset("worker:0", "status", "0")
+        self.redis.hset("worker:1", "status", "0")
+        self._run()
+        assert self.worker_manager.started == started + [4, 9]
+
+        # frontend doesn't report the finished tasks anymore
+        stats = self.worker_manager.sync_tasks(tasks[2:])
+        assert (stats.removed, stats.requeued, stats.parked) == (2, 0, 2)
+        self._run()
+        assert self.worker_manager.started == started + [4, 9]
+
+    def test_parked_chain(self):
+        """
+        Task moved back to queue, but blocked by other limit, doesn't consume
+        the freed quota.
+        """
+        tasks = [ToyQueueTask(i) for i in [0, 2, 3, 6, 4, 9]]
+        self.worker_manager.sync_tasks(tasks)
+        self._run()
+        # 6 and 4 are parked by 'even', 9 by 'modulo'
+        assert self.worker_manager.started == [0, 2, 3]
+        assert self.worker_manager.parked_tasks_count() == 3
+
+        # worker 2 ends, 6 is moved back to queue but it is blocked by
+        # 'modulo', so 4 is moved back to queue (and started)
+        self.redis.hset("worker:2", "status", "0")
+        self._run()
+        assert self.worker_manager.started == [0, 2, 3, 4]
+        assert self.worker_manager.parked_tasks_count() == 2
+
+        # worker 0 ends, this frees one 'modulo' quota
+        self.redis.hset("worker:0", "status", "0")
+        self._run()
+        assert self.worker_manager.started == [0, 2, 3, 4, 9]
+        assert self.worker_manager.parked_tasks_count() == 1
+
+    def test_blocked_tasks_are_parked(self, caplog):
+        """ Tasks blocked by limits aren't re-checked in each cycle """
+        self.worker_manager.sync_tasks([ToyQueueTask(i) for i in range(10)])
+        self._run()
+        assert self.worker_manager.parked_tasks_count() == 4
+        caplog.clear()
+
+        self._run()
+        assert not [msg for (_, _, msg) in caplog.record_tuples
+                    if "skipped" in msg]
+        assert self.worker_manager.parked_tasks_count() == 4
+        assert self.remaining_tasks() == 0
+
+    def test_sync_reprioritizes_parked(self):
+        tasks = [PrioToyQueueTask(i) for i in [0, 2, 4, 6, 8]]
+        self.worker_manager.sync_tasks(tasks)
+        self._run()
+        assert self.worker_manager.started == [0, 2]
+
+        tasks[-1] = PrioToyQueueTask(8, priority=-1)
+        stats = self.worker_manager.sync_tasks(tasks[:-2] + [tasks[-1]])
+        assert (stats.removed, stats.reprioritized, stats.parked) == (1, 1, 2)
+
+        self.redis.hset("worker:0", "status", "0")
+        self._run()
+        assert self.worker_manager.started == [0, 2, 8]
+
+
+class TestWorkerEvents(BaseTestWorkerManager):
+    """
+    WorkerManager with worker events enabled
+    """
+    def setup_worker_manager(self):
+        self.worker_manager = NoopWorkerManager(
+            redis_connection=self.redis,
+            max_workers=1,
+            log=log,
+            worker_events=True)
+        # no periodic cleanup during the test
+        self.worker_manager.worker_cleanup_safety_period = 1000
+
+    def setup_tasks(self, exclude=None):
+        _unused = exclude
+        for task in [0, 1]:
+            self.worker_manager.add_task(ToyQueueTask(task))
+
+    def _finish_worker(self, worker_id, delay):
+        time.sleep(delay)
+        self.redis.hset(worker_id, "status", "0")
+        self.redis.publish(
+            get_worker_events_channel(self.worker_manager.worker_prefix),
+            json.dumps({"worker_id": worker_id, "event": "status"}))
+
+    def test_finished_worker_event(self, caplog):
+        thread = threading.Thread(target=self._finish_worker,
+                                  args=("worker:0", 0.5))
+        thread.start()
+        self.worker_manager.run(timeout=3)
+        thread.join()
+        assert self.worker_manager.started == [0, 1]
+        assert ('root', logging.INFO, "Finished worker worker:0") in \
+            caplog.record_tuples
+        # only the initial full cleanup was done, the finished worker was
+        # recognized from the event
+        assert [msg for (_, _, msg) in caplog.record_tuples
+                if msg == "Trying to clean old workers"] == \
+            ["Trying to clean old workers"]
+
+    def test_unexpected_event(self, caplog):
+        self.redis.publish(
+            get_worker_events_channel(self.worker_manager.worker_prefix),
+            "garbage")
+        self.worker_manager.run(timeout=0.5)
+        assert ('root', logging.WARNING, "Unexpected worker event: "
+                "{'type': 'message', 'pattern': None, 'channel': "
+                "'worker_events:worker', 'data': 'garbage'}") in \
+            caplog.record_tuples
+        assert self.worker_manager.started == [0]
+
+
 def wait_pid_exit(pid):
     """ wait till pid stops responding to no-op kill 0 """
     while True:
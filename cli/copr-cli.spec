@@ -6,7 +6,7 @@
 %global with_python3 1
 %endif
 
-%global min_python_copr_version 1.128.1
+%global min_python_copr_version 1.130.1.dev1
 
 Name:       copr-cli
 Version:    1.110
@@ -575,7 +575,7 @@ class Commands(object):
         :param args: argparse arguments provided by the user
         """
         ownername, projectname = self.parse_name(args.project)
-        pagination = {"limit": 1000}
+        pagination = {"limit": 1000, "order_type": "DESC", "cursor": ""}
 
         builds_list = self.client.build_proxy.get_list(ownername, projectname,
                                                        pagination=pagination)
@@ -873,7 +873,7 @@ class Commands(object):
         if args.with_all_builds:
             fields.insert(1, "builds")
 
-        pagination = {"limit": 1000}
+        pagination = {"limit": 1000, "cursor": ""}
         packages = self.client.package_proxy.get_list(
             ownername=ownername, projectname=projectname,
             with_latest_build=args.with_latest_build,
@@ -892,7 +892,7 @@ class Commands(object):
 
     def action_list_package_names(self, args):
         ownername, projectname = self.parse_name(args.copr)
-        pagination = {"limit": 1000}
+        pagination = {"limit": 1000, "cursor": ""}
         packages = self.client.package_proxy.get_list(ownername=ownername, projectname=projectname,
                                                       pagination=pagination)
         while packages:
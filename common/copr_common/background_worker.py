@@ -4,6 +4,7 @@ Helper methods/classes for 'copr-backend-*' scripts.
 
 import os
 import sys
+import json
 import argparse
 import contextlib
 import logging
@@ -11,7 +12,10 @@ import daemon
 
 import setproctitle
 
-from copr_common.redis_helpers import get_redis_connection
+from copr_common.redis_helpers import (
+    get_redis_connection,
+    get_worker_events_channel,
+)
 
 
 class BackgroundWorker:
@@ -48,14 +52,31 @@ class BackgroundWorker:
             self._redis_conn = get_redis_connection(self.opts)
         return self._redis_conn
 
+    @property
+    def worker_events(self):
+        """
+        True if the WorkerManager listens to the worker events, see the
+        ``worker_events`` config option.
+        """
+        return bool(getattr(self.opts, "worker_events", False))
+
     def redis_set_worker_flag(self, flag, value=1):
         """
-        Set flag in Reids DB for corresponding worker.  NO-OP if there's no
-        redis connection (when run manually).
+        Set flag in Reids DB for corresponding worker, and let the
+        WorkerManager know about the change (publish the worker event, if
+        enabled).  NO-OP if there's no redis connection (when run manually).
         """
         if not self.has_wm:
             return
-        self._redis.hset(self.args.worker_id, flag, value)
+        if not self.worker_events:
+            self._redis.hset(self.args.worker_id, flag, value)
+            return
+        worker_prefix = self.args.worker_id.rsplit(':', 1)[0]
+        event = json.dumps({"worker_id": self.args.worker_id, "event": flag})
+        pipe = self._redis.pipeline()
+        pipe.hset(self.args.worker_id, flag, value)
+        pipe.publish(get_worker_events_channel(worker_prefix), event)
+        pipe.execute()
 
     def redis_get_worker_flag(self, flag):
         """
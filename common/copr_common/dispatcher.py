@@ -43,6 +43,12 @@ class Dispatcher(multiprocessing.Process):
         super().__init__(name=self.task_type + '-dispatcher')
 
         self.sleeptime = 0
+        # When True, WorkerManager.sync_tasks() is used instead of re-building
+        # the whole priority queue in each cycle.
+        self.incremental_sync = False
+        # When True, WorkerManager waits for the events published by the
+        # background workers instead of periodically polling their state.
+        self.worker_events = False
         self.opts = opts
         self.log = logging.getLogger()
         self.frontend_client = None
@@ -97,6 +103,7 @@ class Dispatcher(multiprocessing.Process):
             max_workers=self.max_workers,
             frontend_client=self.frontend_client,
             limits=self.limits,
+            worker_events=self.worker_events,
         )
 
         timeout = self.sleeptime
@@ -106,12 +113,16 @@ class Dispatcher(multiprocessing.Process):
             start = time.time()
 
             tasks = self.get_frontend_tasks()
-            if tasks:
-                worker_manager.clean_tasks()
-
             self._print_added_jobs(tasks)
-            for task in tasks:
-                worker_manager.add_task(task)
+            if tasks and self.incremental_sync:
+                stats = worker_manager.sync_tasks(tasks)
+                log_method = self.log.info if stats.changes else self.log.debug
+                log_method("Queue sync: %s", stats)
+            else:
+                if tasks:
+                    worker_manager.clean_tasks()
+                for task in tasks:
+                    worker_manager.add_task(task)
 
             self._update_process_title("getting cancel requests")
             for task_id in self.get_cancel_requests_ids():
@@ -149,6 +160,8 @@ class Dispatcher(multiprocessing.Process):
                 return
 
             priority, count, task = entry
+            if task is worker_manager.tasks.removed:
+                continue
             queue.append([priority, count, task.id])
 
         name = "copr-{0}-queue.json".format(self.name)
@@ -22,3 +22,20 @@ def get_redis_connection(opts):
         kwargs["password"] = opts.redis_password
 
     return StrictRedis(encoding="utf-8", decode_responses=True, **kwargs)
+
+
+def get_worker_events_channel(worker_prefix):
+    """
+    Name of the Redis Pub/Sub channel where the background workers (see
+    BackgroundWorker class) announce their state changes to the WorkerManager
+    with the given WORKER_PREFIX.
+    """
+    return "worker_events:{}".format(worker_prefix)
+
+
+def get_worker_registry_key(worker_prefix):
+    """
+    Name of the Redis SET with the IDs of the background workers tracked by
+    the WorkerManager with the given WORKER_PREFIX.
+    """
+    return "worker_registry:{}".format(worker_prefix)
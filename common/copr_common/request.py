@@ -2,9 +2,54 @@
 Common Copr code for dealing with HTTP requests
 """
 
+import gzip
 import json
+import os
+import threading
 import time
-from requests import get, post, put, RequestException
+from requests import Session, RequestException
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+# Number of connections kept alive per one host
+DEFAULT_POOL_SIZE = 10
+
+# Don't bother with compressing small request bodies
+GZIP_MIN_SIZE = 1024
+
+_SESSIONS = {}
+_SESSIONS_LOCK = threading.Lock()
+
+
+def get_session(pool_size=DEFAULT_POOL_SIZE, retries=3, backoff_factor=0.5):
+    """
+    Return a process-wide requests.Session object with a pool of POOL_SIZE
+    keep-alive connections per host.  Failed connection attempts are repeated
+    RETRIES times by the adapter (with exponential BACKOFF_FACTOR), before the
+    SafeRequest retry logic takes over.  Read errors are never repeated by the
+    adapter, as the (non-idempotent) request might have been already processed
+    by the server.
+
+    The session is shared by all the threads, but never inherited by the
+    forked child processes.
+    """
+    key = (os.getpid(), pool_size, retries, backoff_factor)
+    with _SESSIONS_LOCK:
+        session = _SESSIONS.get(key)
+        if session:
+            return session
+        retry = Retry(total=retries, connect=retries, read=0, redirect=None,
+                      status=0, backoff_factor=backoff_factor,
+                      raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=pool_size,
+                              pool_maxsize=pool_size,
+                              max_retries=retry)
+        session = Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        _SESSIONS[key] = session
+        return session
 
 
 class SafeRequest:
@@ -13,16 +58,25 @@ class SafeRequest:
 
     If the server cannot be reached, the request is repeated either indefinitely
     or until a timeout is reached.
+
+    The requests are sent through the SESSION (by default the get_session()
+    one) so the open connections are re-used.  With COMPRESS=True, the larger
+    request bodies are sent compressed (Content-Encoding: gzip), and the server
+    needs to support that.
     """
 
     # Prolong the sleep time before asking frontend again
     SLEEP_INCREMENT_TIME = 5
 
-    def __init__(self, auth=None, log=None, try_indefinitely=False, timeout=2 * 60):
+    def __init__(self, auth=None, log=None, try_indefinitely=False, timeout=2 * 60,
+                 session=None, compress=False):
+        # pylint: disable=too-many-arguments
         self.auth = auth
         self.log = log
         self.try_indefinitely = try_indefinitely
         self.timeout = timeout
+        self.session = session or get_session()
+        self.compress = compress
 
     def get(self, url, **kwargs):
         """
@@ -61,11 +115,14 @@ class SafeRequest:
             req_args["timeout"] = self.timeout / 5
             method = method.lower()
             if method in ['post', 'put']:
-                req_args['data'] = json.dumps(data)
-                method = post if method == 'post' else put
+                body = json.dumps(data).encode("utf-8")
+                if self.compress and len(body) >= GZIP_MIN_SIZE:
+                    body = gzip.compress(body)
+                    headers["content-encoding"] = "gzip"
+                req_args['data'] = body
             else:
-                method = get
-            response = method(url, **req_args)
+                method = 'get'
+            response = self.session.request(method, url, **req_args)
         except RequestException as ex:
             raise RequestRetryError(
                 "Requests error on {}: {}".format(url, str(ex)))
@@ -80,7 +137,7 @@ class SafeRequest:
         if response.status_code >= 400:
             # Client error.  The mistake is on our side, it doesn't make sense
             # to continue with retries.
-            raise RequestError(
+            raise RequestClientError(
                 "Request client error on {}: {} {}".format(
                     url, response.status_code, response.reason))
 
@@ -123,3 +180,9 @@ class RequestError(Exception):
     """
     Request to server failed
     """
+
+
+class RequestClientError(RequestError):
+    """
+    Server refused the request (HTTP 4xx), it doesn't make sense to repeat it
+    """
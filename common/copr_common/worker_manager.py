@@ -3,12 +3,18 @@ WorkerManager for processing a priority queue and starting background jobs
 """
 
 import os
+import json
 import time
-from heapq import heappop, heappush
+from heapq import heapify, heappop, heappush
 import itertools
 import logging
 import subprocess
 
+from copr_common.redis_helpers import (
+    get_worker_events_channel,
+    get_worker_registry_key,
+)
+
 
 class WorkerLimit:
     """
@@ -18,14 +24,15 @@ class WorkerLimit:
     that should be processed.  Then WorkerManager is completely responsible for
     sorting out the queue, and behave -> respect the given limits.
 
-    WorkerManager implements really stupid algorithm to respect the limits;  we
-    simply drop the task from queue (and continue to the next task) if it was
-    about to exceed any given limit.  This is the only option at this moment
-    because JobQueue doesn't allow us to skip some task, and return to it later.
-    It is not a problem for Copr dispatchers though because we re-add the
-    dropped tasks to JobQueue anyways -- after the next call to the
-    Dispatcher.get_frontend_tasks() method (see "sleeptime" configuration
-    option).
+    When a task is about to exceed some limit, WorkerManager doesn't drop it
+    but "parks" it aside of the priority queue -- in a bucket identified by
+    the limit and the quota_key() of the task (e.g. the owner name for the
+    per-owner limit).  Once a worker consuming the same quota ends (see
+    worker_removed()), the best parked task from the bucket is moved back to
+    the priority queue.  So the tasks blocked by limits don't need to be
+    re-checked over and over again in WorkerManager.run(), and they are
+    processed as soon as the limit allows it (not only after the next
+    Dispatcher.get_frontend_tasks() call).
 
     Each Limit object works as a statistic counter for the list of _currently
     processed_ tasks (i.e. not queued tasks!).  And we may want to query the
@@ -48,10 +55,24 @@ class WorkerLimit:
         """ Add worker and it's task to statistics.  """
         raise NotImplementedError
 
+    def worker_removed(self, worker_id):
+        """
+        Remove worker from statistics (if counted).  Return the quota_key()
+        the worker was counted for, or None if the worker wasn't counted.
+        """
+        raise NotImplementedError
+
     def check(self, task):
         """ Check if the task can be added without crossing the limit. """
         raise NotImplementedError
 
+    def quota_key(self, task):
+        """
+        Return hashable identifier of the quota the task consumes (the tasks
+        blocked by this limit are parked per this key).
+        """
+        raise NotImplementedError
+
     def clear(self):
         """ Clear the statistics. """
         raise NotImplementedError
@@ -88,11 +109,18 @@ class PredicateWorkerLimit(WorkerLimit):
             return
         self._refs[worker_id] = True
 
+    def worker_removed(self, worker_id):
+        return self._refs.pop(worker_id, None)
+
     def check(self, task):
         if not self._predicate(task):
             return True
         return len(self._refs) < self._limit
 
+    def quota_key(self, task):
+        # all the matching tasks share the same quota
+        return True
+
     def info(self):
         text = super().info()
         matching = ', '.join(self._refs.keys())
@@ -117,6 +145,14 @@ class StringCounter:
         else:
             self._counter[string] = 1
 
+    def remove(self, string):
+        """ Remove one ``string`` occurrence from counter """
+        if string is None:
+            return
+        self._counter[string] -= 1
+        if not self._counter[string]:
+            del self._counter[string]
+
     def count(self, string):
         """ Return number ``string`` occurrences """
         return self._counter.get(string, 0)
@@ -149,15 +185,28 @@ class HashWorkerLimit(WorkerLimit):
         self._refs = {}
 
     def worker_added(self, worker_id, task):
+        if worker_id in self._refs:
+            # already counted
+            return
         # remember it
         group_name = self._refs[worker_id] = self._hasher(task)
         # count it
         self._groups.add(group_name)
 
+    def worker_removed(self, worker_id):
+        if worker_id not in self._refs:
+            return None
+        group_name = self._refs.pop(worker_id)
+        self._groups.remove(group_name)
+        return group_name
+
     def check(self, task):
         group_name = self._hasher(task)
         return self._groups.count(group_name) < self._limit
 
+    def quota_key(self, task):
+        return self._hasher(task)
+
     def info(self):
         text = super().info()
         return "{}, counter: {}".format(text, str(self._groups))
@@ -175,6 +224,7 @@ class JobQueue():
         self.entry_finder = {}           # mapping of tasks to entries
         self.removed = removed           # placeholder for a removed task
         self.counter = itertools.count() # unique sequence count
+        self.removed_count = 0           # removed entries still in heap
 
     def add_task(self, task, priority=0):
         'Add a new task or update the priority of an existing task'
@@ -195,6 +245,20 @@ class JobQueue():
         """
         entry = self.entry_finder.pop(task_id)
         entry[-1] = self.removed
+        self.removed_count += 1
+
+    def update_task(self, task, priority=0):
+        """
+        Same as add_task(), but if the TASK is already queued with the same
+        PRIORITY, only the task object is replaced (no heap operation).  Return
+        True if the task was (re-)pushed to the heap.
+        """
+        entry = self.entry_finder.get(repr(task))
+        if entry is None or entry[0] != priority:
+            self.add_task(task, priority)
+            return True
+        entry[-1] = task
+        return False
 
     def pop_task(self):
         'Remove and return the lowest priority task. Raise KeyError if empty.'
@@ -203,8 +267,47 @@ class JobQueue():
             if task is not self.removed:
                 del self.entry_finder[repr(task)]
                 return task
+            self.removed_count -= 1
         raise KeyError('pop from an empty priority queue')
 
+    def compact(self):
+        """
+        Drop the removed-task placeholders from the heap, but only if there's
+        more garbage than valid entries (so the amortized cost is small).
+        """
+        if self.removed_count <= len(self.entry_finder):
+            return
+        self.prio_queue = [entry for entry in self.prio_queue
+                           if entry[-1] is not self.removed]
+        heapify(self.prio_queue)
+        self.removed_count = 0
+
+
+class QueueSyncStats:
+    """
+    Statistics about one WorkerManager.sync_tasks() call.
+    """
+    def __init__(self):
+        self.added = 0
+        self.removed = 0
+        self.reprioritized = 0
+        self.requeued = 0
+        self.queue_size = 0
+        self.parked = 0
+        self.duration = 0.0
+
+    @property
+    def changes(self):
+        """ Number of queue changes done by the sync """
+        return self.added + self.removed + self.reprioritized + self.requeued
+
+    def __str__(self):
+        return ("added={}, removed={}, reprioritized={}, requeued={}, "
+                "queue_size={}, parked={}, took {:.3f}s").format(
+                    self.added, self.removed, self.reprioritized,
+                    self.requeued, self.queue_size, self.parked,
+                    self.duration)
+
 
 class QueueTask:
     """
@@ -253,6 +356,15 @@ class WorkerManager():
             Fill float value in seconds.
     :cvar worker_cleanup_period: How often should WorkerManager try to cleanup
             workers? (value is a period in seconds)
+    :cvar worker_cleanup_safety_period: The same as worker_cleanup_period,
+            but used when the worker events are enabled (see the
+            ``worker_events`` argument).  The workers notifying us about their
+            state changes are checked immediately, so the periodic cleanup is
+            only a safety net (e.g. for the dead workers).
+    :cvar worker_registry_reconcile_period: How often should WorkerManager
+            look for the worker keys missing in the worker registry (e.g.
+            re-created by a worker writing to Redis after we deleted it), so
+            they are cleaned up too.  Value is a period in seconds.
     """
 
     # pylint: disable=too-many-instance-attributes
@@ -261,15 +373,18 @@ class WorkerManager():
     worker_timeout_start = 30
     worker_timeout_deadcheck = 3*60
     worker_cleanup_period = 3.0
+    worker_cleanup_safety_period = 30.0
+    worker_registry_reconcile_period = 300.0
 
 
     def __init__(self, redis_connection=None, max_workers=8, log=None,
-                 frontend_client=None, limits=None):
+                 frontend_client=None, limits=None, worker_events=False):
         self.tasks = JobQueue()
         self.log = log if log else logging.getLogger()
         self.redis = redis_connection
         self.max_workers = max_workers
         self.frontend_client = frontend_client
+        self._register_orphaned_workers()
         # We have to frequently ask for the actually tracked list of workers —
         # therefore we keep it here to not re-query the list from Redis all the
         # time.  We have to load the list from Redis initially, when the process
@@ -278,6 +393,28 @@ class WorkerManager():
         self._tracked_workers = set(self.worker_ids())
         self._limits = limits or []
         self._last_worker_cleanup = None
+        self._last_registry_reconcile = time.time()
+        # Tasks blocked by limits, see WorkerLimit docs.  The buckets are
+        # JobQueue objects indexed by (limit, quota_key) tuples.  We also
+        # track the bucket of each parked task, and the bucket each task was
+        # taken from back to the priority queue.
+        self._parked = {}
+        self._parked_task_ids = {}
+        self._unparked_from = {}
+        # The state kept between the sync_tasks() calls.  The last synced set
+        # of tasks (task_id => task), and the task IDs we took from queue but
+        # didn't finish them (canceled, or their worker ended).
+        self._synced_tasks = {}
+        self._requeue_task_ids = set()
+        # When the worker events are enabled, we subscribe to the channel the
+        # background workers publish their state changes to, and we keep the
+        # set of worker IDs to be checked in the next _cleanup_workers() call.
+        self._pubsub = None
+        self._worker_events = set()
+        if worker_events:
+            self._pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            self._pubsub.subscribe(
+                get_worker_events_channel(self.worker_prefix))
 
     def start_task(self, worker_id, task):
         """
@@ -366,6 +503,62 @@ class WorkerManager():
         for limit in self._limits:
             limit.worker_added(worker_id, task)
 
+    def _release_limits_for_worker(self, worker_id):
+        """
+        Stop counting the worker in limits, and move the parked tasks waiting
+        for the freed quota back to queue.
+        """
+        for limit in self._limits:
+            quota_key = limit.worker_removed(worker_id)
+            if quota_key is not None:
+                self._unpark_task((limit, quota_key))
+
+    def _park_task(self, task, limit):
+        """
+        Put the TASK blocked by LIMIT aside of the priority queue.
+        """
+        task_id = repr(task)
+        bucket_key = (limit, limit.quota_key(task))
+        self._parked.setdefault(bucket_key, JobQueue()).add_task(
+            task, task.priority)
+        self._parked_task_ids[task_id] = bucket_key
+        origin = self._unparked_from.pop(task_id, None)
+        if origin is not None and origin != bucket_key:
+            # The quota freed in the ORIGIN bucket wasn't consumed by this
+            # task (blocked by other limit), try the next one.
+            self._unpark_task(origin)
+
+    def _unpark_task(self, bucket_key):
+        """
+        Move the best task from the given bucket back to the priority queue.
+        """
+        bucket = self._parked.get(bucket_key)
+        if bucket is None:
+            return
+        task = bucket.pop_task()
+        if not bucket.entry_finder:
+            del self._parked[bucket_key]
+        task_id = repr(task)
+        del self._parked_task_ids[task_id]
+        self._unparked_from[task_id] = bucket_key
+        self.log.debug("Task %s moved back to queue", task_id)
+        self.tasks.add_task(task, task.priority)
+
+    def _drop_parked_task_id(self, task_id):
+        bucket_key = self._parked_task_ids.pop(task_id, None)
+        if bucket_key is None:
+            return
+        bucket = self._parked[bucket_key]
+        bucket.remove_task_by_id(task_id)
+        if not bucket.entry_finder:
+            del self._parked[bucket_key]
+
+    def parked_tasks_count(self):
+        """
+        Return the number of tasks blocked by limits.
+        """
+        return len(self._parked_task_ids)
+
     def cancel_request_done(self, task):
         """ Report back to frontend that the cancel request was finished. """
 
@@ -388,6 +581,8 @@ class WorkerManager():
         self.tasks.add_task(task, task.priority)
 
     def _drop_task_id_safe(self, task_id):
+        self._drop_parked_task_id(task_id)
+        self._unparked_from.pop(task_id, None)
         try:
             self.tasks.remove_task_by_id(task_id)
         except KeyError:
@@ -401,8 +596,9 @@ class WorkerManager():
         :return: True if worker is running on background, False otherwise
         """
         self._drop_task_id_safe(task_id)
+        self._requeue_task_ids.add(str(task_id))
         worker_id = self.get_worker_id(task_id)
-        if worker_id not in self.worker_ids():
+        if not self.redis.sismember(self._registry, worker_id):
             self.log.info("Cancel request, worker %s is not running", worker_id)
             return False
         self.log.info("Cancel request, worker %s requested to cancel",
@@ -410,11 +606,40 @@ class WorkerManager():
         self.redis.hset(worker_id, 'cancel_request', 1)
         return True
 
+    @property
+    def _registry(self):
+        """
+        Redis SET with the IDs of the workers (started by this manager) which
+        are tracked in the Redis DB.  We don't want to use the KEYS command as
+        it is slow and blocks the other Redis clients.
+        """
+        return get_worker_registry_key(self.worker_prefix)
+
     def worker_ids(self):
         """
         Return the redis keys representing workers running on background.
         """
-        return self.redis.keys(self.worker_prefix + ':*')
+        return list(self.redis.smembers(self._registry))
+
+    def _register_orphaned_workers(self):
+        """
+        Add the workers not yet tracked in the worker registry (e.g. started by
+        older Copr versions, without the registry, or re-created by a worker
+        which touched Redis after we deleted it) to the registry, so we can
+        adopt or clean them up.  This is done when the manager is created,
+        and then once per worker_registry_reconcile_period.  The keys are
+        iterated by the SCAN command (not to block Redis).  Return the list of
+        newly registered worker IDs.
+        """
+        registered = set(self.worker_ids())
+        worker_ids = [
+            worker_id for worker_id in self.redis.scan_iter(
+                match=self.worker_prefix + ':*')
+            if worker_id not in registered
+        ]
+        if worker_ids:
+            self.redis.sadd(self._registry, *worker_ids)
+        return worker_ids
 
     def run(self, timeout=float('inf')):
         """
@@ -441,7 +666,7 @@ class WorkerManager():
             worker_count = len(self._tracked_workers)
             if worker_count >= self.max_workers:
                 self.log.debug("Worker count on a limit %s", worker_count)
-                time.sleep(1)
+                self._wait_for_workers(1)
                 continue
 
             # We can allocate some workers, if there's something to do.
@@ -452,7 +677,7 @@ class WorkerManager():
                 if worker_count:
                     # It still makes sense to cycle to finish the workers.
                     self.log.debug("No more tasks, waiting for workers")
-                    time.sleep(1)
+                    self._wait_for_workers(1)
                     continue
                 # Optimization part, nobody is working now, and there's nothing
                 # to do.  Just simply wait till the end of the cycle.
@@ -460,11 +685,12 @@ class WorkerManager():
 
             break_on_limit = False
             for limit in self._limits:
-                # just skip this task, it will be processed in the next
-                # run because we keep re-filling the queue
+                # park this task, it will be moved back to queue once some
+                # worker frees the quota
                 if not limit.check(task):
                     self.log.debug("Task '%s' skipped, limit info: %s",
                                    task.id, limit.info())
+                    self._park_task(task, limit)
                     break_on_limit = True
                     break
             if break_on_limit:
@@ -477,7 +703,11 @@ class WorkerManager():
 
     def _start_worker(self, task, time_now):
         worker_id = self.get_worker_id(repr(task))
-        self.redis.hset(worker_id, 'allocated', time_now)
+        self._unparked_from.pop(repr(task), None)
+        pipe = self.redis.pipeline()
+        pipe.hset(worker_id, 'allocated', time_now)
+        pipe.sadd(self._registry, worker_id)
+        pipe.execute()
         self._tracked_workers.add(worker_id)
         self.log.info("Starting worker %s, task.priority=%s", worker_id,
                       task.priority)
@@ -491,10 +721,107 @@ class WorkerManager():
         self.tasks = JobQueue()
         for limit in self._limits:
             limit.clear()
+        self._parked = {}
+        self._parked_task_ids = {}
+        self._unparked_from = {}
+        self._synced_tasks = {}
+        self._requeue_task_ids = set()
+
+    def sync_tasks(self, tasks):
+        """
+        Incremental alternative to the clean_tasks() + add_task() sequence.
+        The TASKS argument is the full list of tasks (e.g. the output of
+        Dispatcher.get_frontend_tasks()), but we keep the priority queue and
+        the limit statistics from the previous call and only apply the
+        difference -- newly added tasks are queued, vanished tasks are dropped
+        and the tasks with changed priority are re-ordered (even if they are
+        parked because of limits).  The tasks which were taken from queue but
+        not finished in the meantime (canceled, or their worker ended) are
+        queued again.  The resulting queue is the same as if it was re-built
+        from scratch.
+
+        :return: QueueSyncStats object
+        """
+        start = time.time()
+        stats = QueueSyncStats()
+
+        new_tasks = {repr(task): task for task in tasks}
+
+        for task_id in self._synced_tasks.keys() - new_tasks.keys():
+            self.log.debug("Dropping task %s from queue", task_id)
+            self._drop_task_id_safe(task_id)
+            worker_id = self.get_worker_id(task_id)
+            if worker_id in self._tracked_workers:
+                # Not counted in statistics once frontend stops reporting it.
+                self._release_limits_for_worker(worker_id)
+            stats.removed += 1
+
+        for task_id, task in new_tasks.items():
+            if task_id not in self._synced_tasks:
+                self.add_task(task)
+                stats.added += 1
+            elif task_id in self._requeue_task_ids:
+                self.add_task(task)
+                stats.requeued += 1
+            elif task_id in self.tasks.entry_finder:
+                if self.tasks.update_task(task, task.priority):
+                    stats.reprioritized += 1
+            elif task_id in self._parked_task_ids:
+                bucket = self._parked[self._parked_task_ids[task_id]]
+                if bucket.update_task(task, task.priority):
+                    stats.reprioritized += 1
+
+        self._synced_tasks = new_tasks
+        self._requeue_task_ids = set()
+        self.tasks.compact()
+        stats.queue_size = len(self.tasks.entry_finder)
+        stats.parked = self.parked_tasks_count()
+        stats.duration = time.time() - start
+        return stats
 
     def _delete_worker(self, worker_id):
-        self.redis.delete(worker_id)
+        pipe = self.redis.pipeline()
+        pipe.delete(worker_id)
+        pipe.srem(self._registry, worker_id)
+        pipe.execute()
         self._tracked_workers.discard(worker_id)
+        self._release_limits_for_worker(worker_id)
+        # for the next sync_tasks() call
+        self._requeue_task_ids.add(self.get_task_id_from_worker_id(worker_id))
+
+    def _store_worker_event(self, message):
+        try:
+            self._worker_events.add(json.loads(message["data"])["worker_id"])
+        except (TypeError, ValueError, KeyError):
+            self.log.warning("Unexpected worker event: %s", message)
+
+    def _wait_for_workers(self, timeout):
+        """
+        Sleep for TIMEOUT seconds, or (when the worker events are enabled)
+        until some of the background workers changes its state.
+        """
+        if not self._pubsub:
+            time.sleep(timeout)
+            return
+        message = self._pubsub.get_message(timeout=timeout)
+        if message:
+            self._store_worker_event(message)
+
+    def _collect_worker_events(self):
+        """
+        Return the set of tracked workers which announced their state change
+        since the last call.
+        """
+        if not self._pubsub:
+            return set()
+        while True:
+            message = self._pubsub.get_message()
+            if not message:
+                break
+            self._store_worker_event(message)
+        worker_ids = self._worker_events & self._tracked_workers
+        self._worker_events = set()
+        return worker_ids
 
     def _cleanup_workers(self, now):
         """
@@ -506,59 +833,83 @@ class WorkerManager():
         # for each of the attempts to start a worker in the self.run() method).
         # Because the likelihood that some of the background workers changed
         # state is pretty low, we control the frequency of the cleanup here.
+        # With worker events enabled, we only check the workers that notified
+        # us, and the full cleanup is done much less frequently.
         now = time.time()
-        if now - self._last_worker_cleanup < self.worker_cleanup_period:
+        event_worker_ids = self._collect_worker_events()
+        period = self.worker_cleanup_safety_period if self._pubsub \
+            else self.worker_cleanup_period
+        if now - self._last_worker_cleanup < period:
+            for worker_id in event_worker_ids:
+                self._cleanup_worker(worker_id, now)
             return
 
         self.log.debug("Trying to clean old workers")
         self._last_worker_cleanup = time.time()
 
-        for worker_id in self.worker_ids():
+        if now - self._last_registry_reconcile >= \
+                self.worker_registry_reconcile_period:
+            self._last_registry_reconcile = now
+            orphans = self._register_orphaned_workers()
+            if orphans:
+                self.log.info("Found unregistered workers: %s",
+                              ", ".join(sorted(orphans)))
+
+        # Download the state of all the workers in one round-trip.
+        worker_ids = self.worker_ids()
+        pipe = self.redis.pipeline(transaction=False)
+        for worker_id in worker_ids:
+            pipe.hgetall(worker_id)
+        for worker_id, info in zip(worker_ids, pipe.execute()):
+            self._cleanup_worker(worker_id, now, info)
+
+    def _cleanup_worker(self, worker_id, now, info=None):
+        if info is None:
             info = self.redis.hgetall(worker_id)
 
-            allocated = info.get('allocated', None)
-            if not allocated:
-                # In worker manager, we _always_ add 'allocated' tag when we
-                # start worker.  So this may only happen when worker is
-                # orphaned for some reason (we gave up with him), and it still
-                # touches the database on background.
-                self.log.info("Missing 'allocated' flag for worker %s", worker_id)
-                self._delete_worker(worker_id)
-                continue
+        allocated = info.get('allocated', None)
+        if not allocated:
+            # In worker manager, we _always_ add 'allocated' tag when we
+            # start worker.  So this may only happen when worker is
+            # orphaned for some reason (we gave up with him), and it still
+            # touches the database on background.
+            self.log.info("Missing 'allocated' flag for worker %s", worker_id)
+            self._delete_worker(worker_id)
+            return
 
-            allocated = float(allocated)
+        allocated = float(allocated)
 
-            if self.has_worker_ended(worker_id, info):
-                # finished worker
-                self.log.info("Finished worker %s", worker_id)
-                self.finish_task(worker_id, info)
-                self._delete_worker(worker_id)
-                continue
+        if self.has_worker_ended(worker_id, info):
+            # finished worker
+            self.log.info("Finished worker %s", worker_id)
+            self.finish_task(worker_id, info)
+            self._delete_worker(worker_id)
+            return
 
-            if info.get('delete'):
-                self.log.warning("worker %s deleted", worker_id)
-                self._delete_worker(worker_id)
-                continue
+        if info.get('delete'):
+            self.log.warning("worker %s deleted", worker_id)
+            self._delete_worker(worker_id)
+            return
 
-            if not self.has_worker_started(worker_id, info):
-                if now - allocated > self.worker_timeout_start:
-                    # This worker failed to start?
-                    self.log.error("worker %s failed to start", worker_id)
-                    self._delete_worker(worker_id)
-                continue
+        if not self.has_worker_started(worker_id, info):
+            if now - allocated > self.worker_timeout_start:
+                # This worker failed to start?
+                self.log.error("worker %s failed to start", worker_id)
+                self._delete_worker(worker_id)
+            return
 
-            checked = info.get('checked', allocated)
+        checked = info.get('checked', allocated)
 
-            if now - float(checked) > self.worker_timeout_deadcheck:
-                self.log.info("checking worker %s", worker_id)
-                self.redis.hset(worker_id, 'checked', now)
-                if self.is_worker_alive(worker_id, info):
-                    continue
-                self.log.error("dead worker %s", worker_id)
+        if now - float(checked) > self.worker_timeout_deadcheck:
+            self.log.info("checking worker %s", worker_id)
+            self.redis.hset(worker_id, 'checked', now)
+            if self.is_worker_alive(worker_id, info):
+                return
+            self.log.error("dead worker %s", worker_id)
 
-                # The worker could finish in the meantime, make sure we
-                # hgetall() once more.
-                self.redis.hset(worker_id, 'delete', 1)
+            # The worker could finish in the meantime, make sure we
+            # hgetall() once more.
+            self.redis.hset(worker_id, 'delete', 1)
 
     def start_daemon_on_background(self, command, env=None):
         """
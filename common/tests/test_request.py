@@ -1,7 +1,9 @@
+import gzip
+import json
 import logging
 from unittest import TestCase
 from requests import RequestException
-from copr_common.request import SafeRequest, RequestRetryError
+from copr_common.request import SafeRequest, RequestRetryError, get_session
 from . import mock
 
 
@@ -15,7 +17,7 @@ class TestStringMethods(TestCase):
         }
         self.log = logging.getLogger("testlog")
 
-    @mock.patch("copr_common.request.post")
+    @mock.patch("copr_common.request.Session.request")
     def test_send_request_not_200(self, post_req):
         post_req.return_value.status_code = 501
         with self.assertRaises(RequestRetryError):
@@ -23,10 +25,36 @@ class TestStringMethods(TestCase):
             request._send_request(self.url, "post", self.data)
         self.assertTrue(post_req.called)
 
-    @mock.patch("copr_common.request.post")
+    @mock.patch("copr_common.request.Session.request")
     def test_send_request_post_error(self, post_req):
         post_req.side_effect = RequestException()
         with self.assertRaises(RequestRetryError):
             request = SafeRequest(log=self.log)
             request._send_request(self.url, "post", self.data)
         self.assertTrue(post_req.called)
+
+    @mock.patch("copr_common.request.Session.request")
+    def test_send_request_compressed(self, req):
+        req.return_value.status_code = 200
+        data = {"foo": "bar" * 1000}
+        request = SafeRequest(log=self.log, compress=True)
+        request._send_request(self.url, "post", data)
+        args = req.call_args
+        assert args[0] == ("post", self.url)
+        assert args[1]["headers"]["content-encoding"] == "gzip"
+        assert json.loads(gzip.decompress(args[1]["data"])) == data
+
+        # small requests are not compressed
+        request._send_request(self.url, "put", self.data)
+        args = req.call_args
+        assert args[0] == ("put", self.url)
+        assert "content-encoding" not in args[1]["headers"]
+        assert json.loads(args[1]["data"]) == self.data
+
+    def test_shared_session(self):
+        assert SafeRequest().session is get_session()
+        assert get_session(pool_size=2) is get_session(pool_size=2)
+        assert get_session(pool_size=2) is not get_session()
+        adapter = get_session(pool_size=2).get_adapter(self.url)
+        assert adapter.max_retries.connect == 3
+        assert adapter.max_retries.read == 0
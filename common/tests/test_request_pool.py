@@ -0,0 +1,85 @@
+"""
+Tests for the pooled SafeRequest connections, talking to a local stub HTTP
+server (keep-alive enabled, like the real Copr Frontend is).
+"""
+
+import gzip
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from copr_common.request import SafeRequest, get_session
+
+
+class _StubFrontendHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # headers and body are written separately, avoid the delayed ACK stalls
+    disable_nagle_algorithm = True
+    connections = set()
+
+    def _respond(self, data):
+        self.connections.add(self.client_address)
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """ Emulate /backend/pending-jobs/ """
+        self._respond([])
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        """ Emulate /backend/update/, echo the received data """
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        if self.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        self._respond(json.loads(body))
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+
+@pytest.fixture(name="f_stub_frontend")
+def fixture_stub_frontend():
+    """ Start the stub frontend server on a random port, return the URL """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubFrontendHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    _StubFrontendHandler.connections = set()
+    yield "http://127.0.0.1:{}/backend/".format(server.server_address[1])
+    server.shutdown()
+    server.server_close()
+
+
+def test_compressed_post(f_stub_frontend):
+    """ The stub server receives the same data """
+    data = {"builds": [{"id": i, "status": 1} for i in range(100)]}
+    request = SafeRequest(log=logging.getLogger(), compress=True)
+    response = request.post(f_stub_frontend + "update/", data)
+    assert response.json() == data
+
+
+def test_pooled_connections(f_stub_frontend):
+    """
+    The pooled requests re-use one keep-alive connection, unlike the fresh
+    connection per request (module-level requests.get)
+    """
+    count = 10
+    session = get_session()
+    url = f_stub_frontend + "pending-jobs/"
+    log = logging.getLogger()
+
+    for _ in range(count):
+        SafeRequest(log=log, session=session).get(url)
+    assert len(_StubFrontendHandler.connections) == 1
+
+    _StubFrontendHandler.connections = set()
+    for _ in range(count):
+        requests.get(url, timeout=5)
+    assert len(_StubFrontendHandler.connections) == count
@@ -0,0 +1,83 @@
+"""
+Tests for the WorkerManager worker cleanup, requires running Redis server (the
+same one as the copr-backend test-suite uses).
+"""
+
+import os
+import time
+import logging
+from unittest import mock
+
+import pytest
+
+redis = pytest.importorskip("redis")
+
+# pylint: disable=wrong-import-position
+from copr_common.redis_helpers import get_redis_connection
+from copr_common.worker_manager import WorkerManager
+
+
+class _Opts:
+    # pylint: disable=too-few-public-methods
+    redis_db = 9
+    redis_port = 7777
+
+
+class _ToyWorkerManager(WorkerManager):
+    # pylint: disable=abstract-method
+    worker_prefix = "toy_worker"
+
+    def finish_task(self, worker_id, task_info):
+        pass
+
+
+@pytest.fixture(name="f_redis")
+def fixture_redis():
+    """ Flushed Redis DB connection, or skip if Redis isn't running """
+    conn = get_redis_connection(_Opts)
+    try:
+        conn.flushdb()
+    except redis.exceptions.ConnectionError:
+        pytest.skip("Redis server is not running on port 7777")
+    yield conn
+    conn.flushdb()
+
+
+def _fill_workers(conn, count):
+    """ Simulate COUNT running (started, alive) background workers """
+    registry = "worker_registry:" + _ToyWorkerManager.worker_prefix
+    pipe = conn.pipeline()
+    for i in range(count):
+        worker_id = "{}:{}".format(_ToyWorkerManager.worker_prefix, i)
+        pipe.hset(worker_id, mapping={
+            "allocated": time.time(),
+            "started": 1,
+            "PID": os.getpid(),
+        })
+        pipe.sadd(registry, worker_id)
+    pipe.execute()
+
+
+def test_cleanup_one_round_trip(f_redis):
+    """
+    One full _cleanup_workers() pass downloads the state of all the workers
+    in one round-trip, and keeps the running workers.
+    """
+    count = 20
+    _fill_workers(f_redis, count)
+    manager = _ToyWorkerManager(redis_connection=f_redis,
+                                log=logging.getLogger(__name__))
+    assert len(manager.worker_ids()) == count
+
+    execute = redis.client.Pipeline.execute
+    with mock.patch.object(redis.client.Pipeline, "execute", autospec=True,
+                           side_effect=execute) as pipe_execute, \
+            mock.patch.object(f_redis, "hgetall",
+                              wraps=f_redis.hgetall) as hgetall:
+        manager._last_worker_cleanup = 0.0  # pylint: disable=protected-access
+        manager._cleanup_workers(time.time())  # pylint: disable=protected-access
+
+    assert pipe_execute.call_count == 1
+    assert hgetall.call_count == 0
+    # nothing was removed
+    assert len(manager.worker_ids()) == count
@@ -0,0 +1,31 @@
+"""
+Add pending_job_change table
+
+Revision ID: 3f8a1c2d9b7e
+Revises: ec3528516b0c
+Create Date: 2026-10-17 09:12:31.418208
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+
+revision = '3f8a1c2d9b7e'
+down_revision = 'ec3528516b0c'
+
+def upgrade():
+    op.create_table(
+        'pending_job_change',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('build_id', sa.Integer(), nullable=False),
+        sa.Column('changed_on', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_pending_job_change_changed_on'),
+                    'pending_job_change', ['changed_on'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_pending_job_change_changed_on'),
+                  table_name='pending_job_change')
+    op.drop_table('pending_job_change')
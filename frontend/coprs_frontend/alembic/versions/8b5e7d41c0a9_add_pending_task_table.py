@@ -0,0 +1,41 @@
+"""
+Add pending_task table
+
+Revision ID: 8b5e7d41c0a9
+Revises: 3f8a1c2d9b7e
+Create Date: 2026-10-17 11:40:05.120937
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+
+revision = '8b5e7d41c0a9'
+down_revision = '3f8a1c2d9b7e'
+
+def upgrade():
+    op.create_table(
+        'pending_task',
+        sa.Column('task_id', sa.String(length=100), nullable=False),
+        sa.Column('build_id', sa.Integer(), nullable=False),
+        sa.Column('status', sa.Integer(), nullable=False),
+        sa.Column('srpm', sa.Boolean(), nullable=False),
+        sa.Column('background', sa.Boolean(), nullable=False),
+        sa.Column('blocked', sa.Boolean(), nullable=False),
+        sa.Column('project_owner', sa.Text(), nullable=False),
+        sa.Column('project', sa.Text(), nullable=False),
+        sa.Column('sandbox', sa.Text(), nullable=False),
+        sa.Column('chroot', sa.Text(), nullable=True),
+        sa.Column('tags', sa.VARCHAR(), nullable=True),
+        sa.PrimaryKeyConstraint('task_id')
+    )
+    op.create_index(op.f('ix_pending_task_build_id'), 'pending_task',
+                    ['build_id'], unique=False)
+    op.create_index('pending_task_queue_order', 'pending_task',
+                    ['blocked', 'srpm', 'background', 'build_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('pending_task_queue_order', table_name='pending_task')
+    op.drop_index(op.f('ix_pending_task_build_id'), table_name='pending_task')
+    op.drop_table('pending_task')
@@ -0,0 +1,74 @@
+"""
+Add latest_build_chroot table
+
+Revision ID: a7c4e9b2f318
+Revises: d3c5e1f0a2b4
+Create Date: 2026-10-17 15:21:08.633710
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+
+revision = 'a7c4e9b2f318'
+down_revision = 'd3c5e1f0a2b4'
+
+BATCH_SIZE = 10000
+
+BACKFILL_BATCH = """
+INSERT INTO latest_build_chroot
+    (package_id, copr_dir_id, mock_chroot_id, build_id, build_chroot_id)
+SELECT latest.package_id, latest.copr_dir_id, latest.mock_chroot_id,
+       latest.build_id, build_chroot.id
+FROM (
+    SELECT build.package_id, build.copr_dir_id, build_chroot.mock_chroot_id,
+           MAX(build.id) AS build_id
+    FROM build
+    JOIN build_chroot ON build_chroot.build_id = build.id
+    WHERE build.package_id >= :first AND build.package_id < :last
+      AND build.copr_dir_id IS NOT NULL
+    GROUP BY build.package_id, build.copr_dir_id, build_chroot.mock_chroot_id
+) AS latest
+JOIN build_chroot ON build_chroot.build_id = latest.build_id
+                 AND build_chroot.mock_chroot_id = latest.mock_chroot_id
+"""
+
+
+def upgrade():
+    op.create_table('latest_build_chroot',
+    sa.Column('package_id', sa.Integer(), nullable=False),
+    sa.Column('copr_dir_id', sa.Integer(), nullable=False),
+    sa.Column('mock_chroot_id', sa.Integer(), nullable=False),
+    sa.Column('build_id', sa.Integer(), nullable=False),
+    sa.Column('build_chroot_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['package_id'], ['package.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['copr_dir_id'], ['copr_dir.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['mock_chroot_id'], ['mock_chroot.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['build_id'], ['build.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['build_chroot_id'], ['build_chroot.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('package_id', 'copr_dir_id', 'mock_chroot_id')
+    )
+    op.create_index(op.f('ix_latest_build_chroot_build_id'),
+                    'latest_build_chroot', ['build_id'], unique=False)
+    op.create_index(op.f('ix_latest_build_chroot_build_chroot_id'),
+                    'latest_build_chroot', ['build_chroot_id'], unique=False)
+
+    # Fill the table per batches of packages, and commit after each batch, not
+    # to keep the build tables locked for the entire backfill.
+    with op.get_context().autocommit_block():
+        conn = op.get_bind()
+        first, last = conn.execute(
+            sa.text("SELECT MIN(id), MAX(id) FROM package")).first()
+        if first is not None:
+            for batch_start in range(first, last + 1, BATCH_SIZE):
+                conn.execute(sa.text(BACKFILL_BATCH),
+                             {"first": batch_start,
+                              "last": batch_start + BATCH_SIZE})
+
+
+def downgrade():
+    op.drop_index(op.f('ix_latest_build_chroot_build_chroot_id'),
+                  table_name='latest_build_chroot')
+    op.drop_index(op.f('ix_latest_build_chroot_build_id'),
+                  table_name='latest_build_chroot')
+    op.drop_table('latest_build_chroot')
@@ -0,0 +1,62 @@
+"""
+Add package.upstream_name column
+
+Revision ID: b9e2d4a6c731
+Revises: a7c4e9b2f318
+Create Date: 2026-10-17 16:02:41.118245
+"""
+
+import json
+
+import sqlalchemy as sa
+from alembic import op
+
+
+revision = 'b9e2d4a6c731'
+down_revision = 'a7c4e9b2f318'
+
+BATCH_SIZE = 1000
+
+# BuildSourceEnum => source_json key, as in Package.UPSTREAM_NAME_KEYS
+UPSTREAM_NAME_KEYS = {
+    5: "pypi_package_name",
+    6: "gem_name",
+}
+
+
+def _upstream_name(source_type, source_json):
+    try:
+        name = json.loads(source_json or "{}").get(UPSTREAM_NAME_KEYS[source_type])
+    except (ValueError, AttributeError):
+        return None
+    return name.lower() if name else None
+
+
+def upgrade():
+    op.add_column('package', sa.Column('upstream_name', sa.Text(), nullable=True))
+
+    conn = op.get_bind()
+    packages = conn.execute(
+        sa.text("SELECT id, source_type, source_json FROM package "
+                "WHERE source_type IN :source_types")
+        .bindparams(sa.bindparam("source_types", expanding=True)),
+        {"source_types": list(UPSTREAM_NAME_KEYS)},
+    ).fetchall()
+
+    updates = []
+    for package_id, source_type, source_json in packages:
+        name = _upstream_name(source_type, source_json)
+        if name:
+            updates.append({"id": package_id, "name": name})
+
+    update = sa.text("UPDATE package SET upstream_name = :name WHERE id = :id")
+    for start in range(0, len(updates), BATCH_SIZE):
+        conn.execute(update, updates[start:start + BATCH_SIZE])
+
+    op.create_index('package_sourcetype_upstream_name', 'package',
+                    ['source_type', 'upstream_name'], unique=False)
+
+
+def downgrade():
+    op.drop_index('package_sourcetype_upstream_name', table_name='package')
+    op.drop_column('package', 'upstream_name')
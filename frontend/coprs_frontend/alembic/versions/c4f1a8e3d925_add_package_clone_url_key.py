@@ -0,0 +1,65 @@
+"""
+Add package.clone_url_key column
+
+Revision ID: c4f1a8e3d925
+Revises: b9e2d4a6c731
+Create Date: 2026-10-17 16:47:12.509318
+"""
+
+import json
+import re
+from urllib.parse import urlparse
+
+import sqlalchemy as sa
+from alembic import op
+
+
+revision = 'c4f1a8e3d925'
+down_revision = 'b9e2d4a6c731'
+
+BATCH_SIZE = 1000
+
+# BuildSourceEnum scm=8, distgit=10, as in Package.CLONE_URL_SOURCE_TYPES
+CLONE_URL_SOURCE_TYPES = [8, 10]
+
+
+def _clone_url_key(source_json):
+    """ The same as helpers.git_url_lookup_key() at the time of writing """
+    try:
+        url = json.loads(source_json or "{}").get("clone_url")
+    except (ValueError, AttributeError):
+        return None
+    if not url:
+        return None
+    parsed = urlparse(re.sub(r'(\.git)?/*$', '', url))
+    return parsed.netloc.lower() + parsed.path
+
+
+def upgrade():
+    op.add_column('package', sa.Column('clone_url_key', sa.Text(), nullable=True))
+
+    conn = op.get_bind()
+    packages = conn.execute(
+        sa.text("SELECT id, source_json FROM package "
+                "WHERE source_type IN :source_types")
+        .bindparams(sa.bindparam("source_types", expanding=True)),
+        {"source_types": CLONE_URL_SOURCE_TYPES},
+    ).fetchall()
+
+    updates = []
+    for package_id, source_json in packages:
+        key = _clone_url_key(source_json)
+        if key:
+            updates.append({"id": package_id, "key": key})
+
+    update = sa.text("UPDATE package SET clone_url_key = :key WHERE id = :id")
+    for start in range(0, len(updates), BATCH_SIZE):
+        conn.execute(update, updates[start:start + BATCH_SIZE])
+
+    op.create_index(op.f('ix_package_clone_url_key'), 'package',
+                    ['clone_url_key'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_package_clone_url_key'), table_name='package')
+    op.drop_column('package', 'clone_url_key')
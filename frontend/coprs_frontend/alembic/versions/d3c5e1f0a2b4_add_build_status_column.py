@@ -0,0 +1,69 @@
+"""
+Add the denormalized build.status column
+
+Revision ID: d3c5e1f0a2b4
+Revises: 8b5e7d41c0a9
+Create Date: 2026-10-17 13:05:44.210392
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+
+revision = 'd3c5e1f0a2b4'
+down_revision = '8b5e7d41c0a9'
+
+BATCH_SIZE = 10000
+
+# The same logic as in the Build.compute_status() method, at the time of
+# writing this migration.  StatusEnum numbers: failed=0, succeeded=1,
+# canceled=2, running=3, pending=4, skipped=5, starting=6, importing=7,
+# forked=8, waiting=9.
+BACKFILL_BATCH = """
+WITH chroot_states AS (
+    SELECT build_id, array_agg(DISTINCT status) AS states
+    FROM build_chroot
+    WHERE build_id >= :first AND build_id < :last
+    GROUP BY build_id
+)
+UPDATE build SET status = CASE
+    WHEN b.canceled THEN 2
+    WHEN b.source_status IN (6, 4, 3, 7, 0) THEN b.source_status
+    WHEN chroot_states.states IS NULL THEN 9
+    WHEN 3 = ANY(chroot_states.states) THEN 3
+    WHEN 6 = ANY(chroot_states.states) THEN 6
+    WHEN 4 = ANY(chroot_states.states) THEN 4
+    WHEN 0 = ANY(chroot_states.states) THEN 0
+    WHEN 1 = ANY(chroot_states.states) THEN 1
+    WHEN 5 = ANY(chroot_states.states) THEN 5
+    WHEN 8 = ANY(chroot_states.states) THEN 8
+    WHEN 9 = ANY(chroot_states.states) THEN 4
+    ELSE NULL
+END
+FROM build AS b
+LEFT JOIN chroot_states ON chroot_states.build_id = b.id
+WHERE build.id = b.id AND b.id >= :first AND b.id < :last
+"""
+
+
+def upgrade():
+    op.add_column('build', sa.Column('status', sa.Integer(), nullable=True))
+
+    # Commit after each batch, not to keep the whole build table locked (and
+    # the changes in one huge transaction) for the entire backfill.
+    with op.get_context().autocommit_block():
+        conn = op.get_bind()
+        first, last = conn.execute(
+            sa.text("SELECT MIN(id), MAX(id) FROM build")).first()
+        if first is not None:
+            for batch_start in range(first, last + 1, BATCH_SIZE):
+                conn.execute(sa.text(BACKFILL_BATCH),
+                             {"first": batch_start,
+                              "last": batch_start + BATCH_SIZE})
+
+    op.create_index(op.f('ix_build_status'), 'build', ['status'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_build_status'), table_name='build')
+    op.drop_column('build', 'status')
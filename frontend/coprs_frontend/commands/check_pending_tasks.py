@@ -0,0 +1,24 @@
+"""
+Check the materialized build queue consistency.
+"""
+
+import click
+from coprs.logic.builds_logic import PendingTasksLogic
+
+
+@click.command()
+def check_pending_tasks():
+    """
+    Compare the "pending_task" table (the materialized build queue, see the
+    PENDING_TASKS_MATERIALIZED option) with the current build states.  Exit
+    with non-zero status if any inconsistency is found; use the
+    'rebuild-pending-tasks' command to fix it.
+    """
+    problems = PendingTasksLogic.check()
+    for problem in problems:
+        print(problem)
+    if problems:
+        print("Found {} inconsistencies".format(len(problems)))
+        return 1
+    print("The pending_task table is consistent")
+    return 0
@@ -0,0 +1,18 @@
+"""
+Re-generate the materialized build queue.
+"""
+
+import click
+from coprs import db
+from coprs.logic.builds_logic import PendingTasksLogic
+
+
+@click.command()
+def rebuild_pending_tasks():
+    """
+    Re-generate the whole "pending_task" table (the materialized build queue,
+    see the PENDING_TASKS_MATERIALIZED option) from the current build states.
+    """
+    count = PendingTasksLogic.rebuild()
+    db.session.commit()
+    print("Generated {} pending tasks".format(count))
@@ -0,0 +1,12 @@
+import click
+from coprs import db
+from coprs.logic.builds_logic import BuildsLogic
+
+@click.command()
+def vacuum_pending_jobs_changes():
+     """
+     Removes old pending-jobs queue change log entries, Backend re-loads the
+     whole queue periodically anyway.
+     """
+     BuildsLogic.vacuum_pending_jobs_changes()
+     db.session.commit()
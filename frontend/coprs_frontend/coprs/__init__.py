@@ -16,7 +16,7 @@ from flask_whooshee import Whooshee
 from openid_teams.teams import TeamsResponse
 
 from coprs.redis_session import RedisSessionInterface
-from coprs.request import get_request_class
+from coprs.request import get_request_class, GzipRequestMiddleware
 
 app = flask.Flask(__name__)
 if "COPRS_ENVIRON_PRODUCTION" in os.environ:
@@ -102,6 +102,7 @@ app.cache = cache
 app.url_map.strict_slashes = False
 
 app.request_class = get_request_class(app)
+app.wsgi_app = GzipRequestMiddleware(app.wsgi_app)
 
 # Tell flask-restx to not append generated suggestions at
 # the end of 404 error messages
@@ -181,6 +181,12 @@ class Config(object):
 
     RECENT_BUILDS_ON_FRONTPAGE = False
 
+    # in seconds, see BuildsLogic.get_pending_jobs_cursor()
+    PENDING_JOBS_SETTLE_PERIOD = 60
+
+    # see PendingTasksLogic
+    PENDING_TASKS_MATERIALIZED = False
+
 
 class ProductionConfig(Config):
     DEBUG = False
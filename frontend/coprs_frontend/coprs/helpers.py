@@ -665,6 +665,17 @@ def get_parsed_git_url(url):
     return urlparse(url)
 
 
+def git_url_lookup_key(url):
+    """
+    Normalize the git clone URL into the "host/path" form (no scheme, no
+    ".git" suffix, no trailing slashes), used for indexed package look-ups.
+    """
+    parsed = get_parsed_git_url(url)
+    if not parsed:
+        return None
+    return parsed.netloc.lower() + parsed.path
+
+
 class SubdirMatch(object):
     def __init__(self, subdir):
         if not subdir:
@@ -6,11 +6,13 @@ import contextlib
 import anytree
 import backoff
 
+from sqlalchemy import and_, case, exists, func, not_, or_, true
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy_utils.functions import quote as sa_quote
+from copr_common.enums import StatusEnum
 from coprs import app, db, cache
-from coprs.helpers import WorkList
-from coprs.models import Batch, Build
+from coprs.helpers import WorkList, FINISHED_STATUSES
+from coprs.models import Batch, Build, BuildChroot
 from coprs.exceptions import BadRequest
 import coprs.logic.builds_logic as bl
 
@@ -94,6 +96,120 @@ class BatchesLogic:
                 batches.add(build.batch)
         return batches
 
+    @staticmethod
+    def _build_finished_clause():
+        """
+        SQL counterpart of the models.Build.finished property.
+        """
+        unfinished_chroot = exists().where(and_(
+            BuildChroot.build_id == Build.id,
+            or_(BuildChroot.status.is_(None),
+                BuildChroot.status.notin_(FINISHED_STATUSES)),
+        ))
+        has_chroot = exists().where(BuildChroot.build_id == Build.id)
+        return or_(
+            # finished_early
+            Build.canceled == true(),
+            Build.source_status.in_([StatusEnum("failed"),
+                                     StatusEnum("canceled")]),
+            # all the build chroots are finished
+            and_(has_chroot, not_(unfinished_chroot)),
+            # no build chroots, yet
+            and_(not_(has_chroot),
+                 Build.source_status.isnot(None),
+                 Build.source_status.in_(FINISHED_STATUSES)),
+        )
+
+    @classmethod
+    def resolve_batches(cls, batch_ids=None):
+        """
+        Calculate the "finished" and "blocked" states for the given BATCH_IDS
+        (list or query), and for all the batches they transitively depend on,
+        using two SQL queries (instead of walking the Batch.blocked_by and
+        Batch.builds relations per batch).  By default, all the batches with
+        processing builds are resolved.
+
+        Return a {batch_id: (blocked, finished)} dictionary.
+        """
+        if batch_ids is None:
+            batch_ids = (
+                bl.BuildsLogic.processing_builds()
+                .filter(Build.batch_id.isnot(None))
+                .with_entities(Build.batch_id)
+            )
+
+        # 1. the transitive closure of the blocking batches
+        chain = (
+            db.session.query(Batch.id, Batch.blocked_by_id)
+            .filter(Batch.id.in_(batch_ids))
+            .cte(name="batch_chain", recursive=True)
+        )
+        chain = chain.union(
+            db.session.query(Batch.id, Batch.blocked_by_id)
+            .join(chain, Batch.id == chain.c.blocked_by_id)
+        )
+        parents = dict(db.session.query(chain.c.id, chain.c.blocked_by_id))
+        if not parents:
+            return {}
+
+        # 2. count the (unfinished) builds in those batches
+        finished = set()
+        builds = (
+            db.session.query(
+                Build.batch_id,
+                func.sum(case((cls._build_finished_clause(), 0), else_=1)),
+            )
+            .filter(Build.batch_id.in_(db.session.query(chain.c.id)))
+            .group_by(Build.batch_id)
+        )
+        for batch_id, unfinished in builds:
+            if not unfinished:
+                finished.add(batch_id)
+
+        # Batch is blocked if any of the parents is not finished.
+        blocked = {}
+        def _blocked(batch_id):
+            if batch_id not in blocked:
+                parent = parents.get(batch_id)
+                blocked[batch_id] = bool(parent) and (
+                    parent not in finished or _blocked(parent))
+            return blocked[batch_id]
+
+        return {
+            batch_id: (_blocked(batch_id), batch_id in finished)
+            for batch_id in parents
+        }
+
+    @classmethod
+    def blocked_batch_ids(cls, batch_ids=None):
+        """
+        Return the set of blocked batch IDs, see resolve_batches().
+        """
+        return {batch_id for batch_id, (blocked, _)
+                in cls.resolve_batches(batch_ids).items() if blocked}
+
+    @classmethod
+    def build_blocked_checker(cls, batch_ids=None):
+        """
+        Return a callable telling whether the given models.Build is blocked.
+        The batch states are resolved lazily (see resolve_batches() for
+        BATCH_IDS), once the first batched build is checked.
+        """
+        states = None
+
+        def _blocked(build):
+            nonlocal states
+            if build.batch_id is None:
+                return False
+            if states is None:
+                states = cls.resolve_batches(batch_ids)
+            if build.batch_id not in states:
+                # not expected, but let's not assume the build isn't blocked
+                return build.blocked
+            return states[build.batch_id][0]
+
+        return _blocked
+
     @classmethod
     @cache.memoize(timeout=60)
     def pending_batch_count_cached(cls):
@@ -132,6 +248,15 @@ class BatchesLogic:
                 wl.schedule(batch.blocked_by)
             else:
                 roots.append(node)
+
+        # the same as Batch.state, but calculated at once for all the batches
+        states = cls.resolve_batches([batch.id for batch in pending_batches])
+        for batch_id, node in node_map.items():
+            blocked, finished = states.get(batch_id, (False, False))
+            if blocked:
+                node.state = "blocked"
+            else:
+                node.state = "finished" if finished else "processing"
         return roots
 
     @classmethod
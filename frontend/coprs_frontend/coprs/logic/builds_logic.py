@@ -1,3 +1,4 @@
+import itertools
 import tempfile
 import shutil
 import json
@@ -6,10 +7,14 @@ import pprint
 import time
 import requests
 
+from sqlalchemy.event import listens_for
 from sqlalchemy.sql import text
 from sqlalchemy.sql.expression import not_
 from sqlalchemy.orm import joinedload, selectinload, load_only, contains_eager
-from sqlalchemy import func, desc, or_, and_
+from sqlalchemy.orm.attributes import get_history
+from sqlalchemy import func, desc, or_, and_, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.sql import false,true
 from werkzeug.utils import secure_filename
 from sqlalchemy import bindparam, Integer, String
@@ -309,7 +314,7 @@ class BuildsLogic(object):
         if data_type in ["for_backend", "overview"]:
 
             load_build_fields = ["is_background", "submitted_by", "batch_id",
-                                 "user_id"]
+                                 "user_id", "source_status"]
             if data_type == "for_backend":
                 # The custom method allows us to set the chroot for SRPM builds
                 load_build_fields += ["source_type", "source_json"]
@@ -359,7 +364,7 @@ class BuildsLogic(object):
 
         if data_type in ["for_backend", "overview"]:
             query = query.options(
-                load_only("build_id", "tags_raw"),
+                load_only("build_id", "tags_raw", "status"),
                 joinedload('build').load_only("id", "is_background", "submitted_by", "batch_id")
                 .options(
                     # from copr project info we only need the project name
@@ -380,6 +385,88 @@ class BuildsLogic(object):
             query = query.filter(models.Build.is_background == (true() if background else false()))
         return query
 
+    @classmethod
+    def get_pending_jobs_cursor(cls, cursor=0):
+        """
+        Return the highest PendingJobChange sequence number which is older than
+        the PENDING_JOBS_SETTLE_PERIOD.  The changes newer than that might still
+        be accompanied by not-yet-committed changes with lower sequence numbers
+        (concurrent transactions), so we rather keep sending them in each delta
+        until they settle.  The CURSOR is returned if nothing newer settled.
+        """
+        settled = int(time.time()) - app.config["PENDING_JOBS_SETTLE_PERIOD"]
+        latest = (
+            db.session.query(func.max(models.PendingJobChange.id))
+            .filter(models.PendingJobChange.changed_on < settled)
+            .scalar()
+        )
+        return max(cursor, latest or 0)
+
+    @classmethod
+    def get_pending_jobs_changes(cls, cursor):
+        """
+        Return the (new_cursor, build_ids) pair, the BUILD_IDS is a list of
+        builds which tasks need to be re-loaded by Backend because they were
+        changed after CURSOR.  This includes the builds that might have been
+        unblocked by the changed builds (batches).  Return None if the cursor
+        is unknown, or too old (the change log has already been vacuumed), and
+        Backend needs to re-load the whole queue.
+        """
+        first, last = db.session.query(
+            func.min(models.PendingJobChange.id),
+            func.max(models.PendingJobChange.id),
+        ).one()
+        if cursor > (last or 0):
+            return None
+        if first is not None and cursor < first - 1:
+            return None
+
+        new_cursor = cls.get_pending_jobs_cursor(cursor)
+
+        changed = (
+            db.session.query(models.PendingJobChange.build_id)
+            .filter(models.PendingJobChange.id > cursor)
+            .distinct()
+        )
+        build_ids = {row.build_id for row in changed}
+        build_ids.update(row.id for row in cls.get_builds_unblocked_by(changed))
+        return new_cursor, sorted(build_ids)
+
+    @classmethod
+    def get_builds_unblocked_by(cls, build_ids):
+        """
+        Return query for IDs of builds that are (potentially) blocked by the
+        BUILD_IDS (list or query), IOW builds in the batches directly depending
+        on the batches of BUILD_IDS.  Finishing any of the BUILD_IDS might
+        unblock those.
+        """
+        batches = (
+            db.session.query(models.Build.batch_id)
+            .filter(models.Build.id.in_(build_ids))
+            .filter(models.Build.batch_id.isnot(None))
+        )
+        return (
+            db.session.query(models.Build.id)
+            .join(models.Batch)
+            .filter(models.Batch.blocked_by_id.in_(batches))
+        )
+
+    @classmethod
+    def vacuum_pending_jobs_changes(cls, max_age=86400):
+        """
+        Remove the PendingJobChange log entries older than MAX_AGE seconds.  The
+        latest entry is always kept so the sequence never "restarts".
+        """
+        last = db.session.query(func.max(models.PendingJobChange.id)).scalar()
+        if last is None:
+            return 0
+        return (
+            models.PendingJobChange.query
+            .filter(models.PendingJobChange.changed_on < time.time() - max_age)
+            .filter(models.PendingJobChange.id < last)
+            .delete()
+        )
+
     @classmethod
     def get_build_task(cls, task_id):
         try:
@@ -1312,6 +1399,18 @@ class BuildsLogic(object):
     def filter_by_package_name(cls, query, package_name):
         return query.join(models.Package).filter(models.Package.name == package_name)
 
+    @classmethod
+    def filter_by_state(cls, query, state):
+        """
+        Filter the builds by the Build.state string, e.g. "succeeded".  This
+        uses the persisted Build.status column, no BuildChroot is loaded.
+        """
+        if state == "unknown":
+            return query.filter(models.Build.status.is_(None))
+        if state not in StatusEnum.vals:
+            return query.filter(false())
+        return query.filter(models.Build.status == StatusEnum(state))
+
     @classmethod
     def clean_old_builds(cls):
         dirs = (
@@ -1496,17 +1595,94 @@ class BuildChrootResultsLogic:
                 for result in results["packages"]]
 
 
+class LatestBuildChrootsLogic:
+    """
+    Maintain the models.LatestBuildChroot table, the pointers to the latest
+    BuildChroot per Package, CoprDir and MockChroot.
+    """
+
+    @staticmethod
+    def _upsert_statement(connection):
+        if connection.dialect.name == "postgresql":
+            return postgresql_insert(models.LatestBuildChroot.__table__)
+        return sqlite_insert(models.LatestBuildChroot.__table__)
+
+    @classmethod
+    def add(cls, connection, build_chroots):
+        """
+        Point to the new BUILD_CHROOTS (list of flushed BuildChroot objects),
+        unless there already is a BuildChroot from a newer build.
+        """
+        rows = [{
+            "package_id": bch.build.package_id,
+            "copr_dir_id": bch.build.copr_dir_id,
+            "mock_chroot_id": bch.mock_chroot_id,
+            "build_id": bch.build_id,
+            "build_chroot_id": bch.id,
+        } for bch in build_chroots
+            if bch.build.package_id and bch.build.copr_dir_id]
+        if not rows:
+            return
+
+        table = models.LatestBuildChroot.__table__
+        stmt = cls._upsert_statement(connection)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["package_id", "copr_dir_id", "mock_chroot_id"],
+            set_={"build_id": stmt.excluded.build_id,
+                  "build_chroot_id": stmt.excluded.build_chroot_id},
+            where=table.c.build_id <= stmt.excluded.build_id,
+        )
+        connection.execute(stmt, rows)
+
+    @classmethod
+    def recompute(cls, connection, package_ids):
+        """
+        Re-generate the pointers for the given packages from the build history,
+        e.g. after a build removal.
+        """
+        table = models.LatestBuildChroot.__table__
+        package_ids = list(package_ids)
+        connection.execute(
+            table.delete().where(table.c.package_id.in_(package_ids)))
+
+        build = models.Build.__table__
+        build_chroot = models.BuildChroot.__table__
+        latest = (
+            select(build.c.package_id, build.c.copr_dir_id,
+                   build_chroot.c.mock_chroot_id,
+                   func.max(build.c.id).label("build_id"))
+            .select_from(build.join(build_chroot))
+            .where(build.c.package_id.in_(package_ids))
+            .where(build.c.copr_dir_id.isnot(None))
+            .group_by(build.c.package_id, build.c.copr_dir_id,
+                      build_chroot.c.mock_chroot_id)
+            .subquery()
+        )
+        rows = (
+            select(latest.c.package_id, latest.c.copr_dir_id,
+                   latest.c.mock_chroot_id, latest.c.build_id,
+                   build_chroot.c.id)
+            .select_from(latest.join(build_chroot, and_(
+                build_chroot.c.build_id == latest.c.build_id,
+                build_chroot.c.mock_chroot_id == latest.c.mock_chroot_id)))
+        )
+        connection.execute(table.insert().from_select(
+            ["package_id", "copr_dir_id", "mock_chroot_id", "build_id",
+             "build_chroot_id"], rows))
+
+
 class BuildsMonitorLogic(object):
     @classmethod
     def package_build_chroots_query(cls, copr_dir, mock_chroot_ids):
         """
-        Return an SQL query returning all BuildChroots assigned to given CoprDir
-        (copr_dir) and MockChroot's (mock_chroot_ids).  The output is sorted by
-        Package.name, and then by Build.id (so callers can easily skip the
-        uninteresting entries).
+        Return an SQL query returning the latest BuildChroots assigned to given
+        CoprDir (copr_dir) and MockChroot's (mock_chroot_ids), per Package.
+        The output is sorted by Package.name, and then by Build.id.
         """
         return (
             models.BuildChroot.query
+            .join(models.LatestBuildChroot,
+                  models.LatestBuildChroot.build_chroot_id == models.BuildChroot.id)
             .join(models.Build)
             .join(models.Package)
             .options(
@@ -1515,8 +1691,8 @@ class BuildsMonitorLogic(object):
                                                   "pkg_version")
                     .contains_eager("package").load_only("name"),
             )
-            .filter(models.BuildChroot.mock_chroot_id.in_(mock_chroot_ids))
-            .filter(models.Build.copr_dir==copr_dir)
+            .filter(models.LatestBuildChroot.mock_chroot_id.in_(mock_chroot_ids))
+            .filter(models.LatestBuildChroot.copr_dir_id == copr_dir.id)
             .order_by(
                 models.Package.name.asc(),
                 models.Build.id.desc(),
@@ -1534,101 +1710,40 @@ class BuildsMonitorLogic(object):
                 "chroots": [ <BuildChroot>, <BuildChroot>, ...  ],
             }, ...]
         """
-
-        class _Finder:
-            def __init__(self, find_mock_chroot_ids):
-                self.searching_for = set(find_mock_chroot_ids)
-                self.package_name = None
-                self._reset()
-
-            def _reset(self):
-                self.mock_chroot_ids_found = set()
-                self.package_name = None
-                self.chroots = []
-
-            def get_data(self):
-                """
-                Return the dictionary to be yielded, or None if no data are
-                already processed.
-                """
-                if not self.chroots:
-                    # no package in the result set
-                    return None
-                return {
-                    "name": self.package_name,
-                    "chroots": self.chroots,
-                }
-
-            def _add_item(self, build_chroot):
-                self.mock_chroot_ids_found.add(build_chroot.mock_chroot_id)
-                self.chroots.append(build_chroot)
-                self.package_name = build_chroot.build.package.name
-
-            def add(self, build_chroot):
-                """
-                Process one BuildChroot instance.  Return the get_data() output
-                if we should flush the package out to caller, or None.
-                """
-                package_name = build_chroot.build.package.name
-
-                if self.package_name is None:
-                    # first package
-                    self._add_item(build_chroot)
-                    return None
-
-                if package_name == self.package_name:
-                    # additional chroot for the same package
-                    mock_chroot_id = build_chroot.mock_chroot_id
-                    if mock_chroot_id in self.mock_chroot_ids_found:
-                        # we already have status for this
-                        return None
-                    self._add_item(build_chroot)
-                    return None
-
-                # a different package, flush the old one
-                return_value = self.get_data()
-                self._reset()
-                self._add_item(build_chroot)
-                return return_value
-
         mock_chroot_ids = {mch.id for mch in copr_dir.copr.active_chroots}
-        package_data = _Finder(mock_chroot_ids)
-        for bch in cls.package_build_chroots_query(copr_dir, mock_chroot_ids).yield_per(1000):
-            if value := package_data.add(bch):
-                yield value
-
-        if value := package_data.get_data():
-            yield value
-
+        query = cls.package_build_chroots_query(copr_dir, mock_chroot_ids)
+        for name, build_chroots in itertools.groupby(
+                query.yield_per(1000), lambda bch: bch.build.package.name):
+            yield {
+                "name": name,
+                "chroots": list(build_chroots),
+            }
 
     @classmethod
     def last_buildchroots(cls, pkg_ids, mock_chroot_ids):
         """
         Query the BuildChroot for given list of package IDs, and mock chroot IDs
         """
-        builds_ids = (
-            models.Build.query.join(models.BuildChroot)
-                  .filter(models.Build.package_id.in_(pkg_ids))
-                  .filter(models.BuildChroot.mock_chroot_id.in_(mock_chroot_ids))
-                  .with_entities(
-                      models.Build.package_id.label('package_id'),
-                      func.max(models.Build.id).label('build_id').label("build_id"),
-                      models.BuildChroot.mock_chroot_id,
-                  )
-                  .group_by(
-                      models.Build.package_id,
-                      models.BuildChroot.mock_chroot_id,
-                  )
-                  .subquery()
+        latest = (
+            db.session.query(
+                models.LatestBuildChroot.package_id.label("package_id"),
+                models.LatestBuildChroot.mock_chroot_id.label("mock_chroot_id"),
+                func.max(models.LatestBuildChroot.build_id).label("build_id"),
+            )
+            .filter(models.LatestBuildChroot.package_id.in_(pkg_ids))
+            .filter(models.LatestBuildChroot.mock_chroot_id.in_(mock_chroot_ids))
+            .group_by(models.LatestBuildChroot.package_id,
+                      models.LatestBuildChroot.mock_chroot_id)
+            .subquery()
         )
 
         return (models.BuildChroot.query
             .join(
-                builds_ids,
-                and_(builds_ids.c.build_id == models.BuildChroot.build_id,
-                     builds_ids.c.mock_chroot_id == models.BuildChroot.mock_chroot_id))
+                latest,
+                and_(latest.c.build_id == models.BuildChroot.build_id,
+                     latest.c.mock_chroot_id == models.BuildChroot.mock_chroot_id))
             .add_columns(
-                builds_ids.c.package_id.label("package_id"),
+                latest.c.package_id.label("package_id"),
             )
         )
 
@@ -1688,3 +1803,303 @@ class BuildsMonitorLogic(object):
                     mapper[package.id].get(chroot.name))
 
         return pagination
+
+
+class PendingTasksLogic:
+    """
+    Maintain the models.PendingTask table, the materialized Backend's build
+    queue.  Enabled by the PENDING_TASKS_MATERIALIZED config option.
+    """
+
+    @classmethod
+    def enabled(cls):
+        """ Is the PendingTask table maintained and used? """
+        return app.config["PENDING_TASKS_MATERIALIZED"]
+
+    @classmethod
+    def get_queue(cls, build_ids=None):
+        """
+        The not-blocked tasks in the same order as the /backend/pending-jobs/
+        route has always provided them; SRPM tasks first, then normal builds
+        first, by build ID.
+        """
+        query = (
+            models.PendingTask.query
+            .filter(models.PendingTask.blocked == false())
+            .order_by(models.PendingTask.srpm.desc(),
+                      models.PendingTask.background.asc(),
+                      models.PendingTask.build_id.asc())
+        )
+        if build_ids is not None:
+            query = query.filter(models.PendingTask.build_id.in_(build_ids))
+        return query
+
+    @classmethod
+    def get_queue_sizes(cls):
+        """
+        Count the pending (not background), starting and running tasks with a
+        single query.
+        """
+        query = (
+            db.session.query(models.PendingTask.status,
+                             models.PendingTask.background,
+                             func.count(models.PendingTask.task_id))
+            .group_by(models.PendingTask.status, models.PendingTask.background)
+        )
+        sizes = {"pending": 0, "starting": 0, "running": 0}
+        for status, background, count in query:
+            state = StatusEnum(status)
+            if state == "pending" and background:
+                continue
+            sizes[state] += count
+        return sizes
+
+    @classmethod
+    def _generate(cls, build_ids=None, batch_ids=None):
+        """
+        Generate PendingTask objects from the current Build and BuildChroot
+        states, optionally only for the given BUILD_IDS (with BATCH_IDS being
+        the batches of those builds).
+        """
+        blocked = BatchesLogic.build_blocked_checker(batch_ids)
+
+        def _filtered(query):
+            if build_ids is None:
+                yield from query
+                return
+            build_id_list = sorted(build_ids)
+            for start in range(0, len(build_id_list), 500):
+                chunk = build_id_list[start:start+500]
+                yield from query.filter(models.Build.id.in_(chunk))
+
+        args = {"data_type": "for_backend"}
+        for build in _filtered(BuildsLogic.get_pending_srpm_build_tasks(**args)):
+            yield models.PendingTask.from_build(build, blocked(build))
+
+        for build_chroot in _filtered(BuildsLogic.get_pending_build_tasks(**args)):
+            yield models.PendingTask.from_build_chroot(
+                build_chroot, blocked(build_chroot.build))
+
+    @classmethod
+    def refresh(cls, build_ids):
+        """
+        Re-generate PendingTask rows for the given BUILD_IDS, and for the
+        builds potentially unblocked by them.
+        """
+        build_ids = set(build_ids)
+        build_ids.update(row.id for row in
+                         BuildsLogic.get_builds_unblocked_by(list(build_ids)))
+
+        # Serialize the concurrent refreshes of the same builds, and batches
+        # (two concurrently finished builds may finish the blocking batch).
+        batch_ids = sorted(
+            row.batch_id for row in
+            db.session.query(models.Build.batch_id).distinct()
+            .filter(models.Build.id.in_(build_ids))
+            .filter(models.Build.batch_id.isnot(None))
+        )
+        if batch_ids:
+            (models.Batch.query.filter(models.Batch.id.in_(batch_ids))
+             .order_by(models.Batch.id).with_for_update().all())
+        (models.Build.query.filter(models.Build.id.in_(build_ids))
+         .order_by(models.Build.id).with_for_update().all())
+
+        (models.PendingTask.query
+         .filter(models.PendingTask.build_id.in_(build_ids))
+         .delete(synchronize_session=False))
+        for task in cls._generate(build_ids, batch_ids):
+            db.session.add(task)
+
+    @classmethod
+    def rebuild(cls):
+        """
+        Re-generate the whole PendingTask table from scratch.  Return the number
+        of tasks.
+        """
+        models.PendingTask.query.delete()
+        counter = 0
+        for task in cls._generate():
+            db.session.add(task)
+            counter += 1
+        return counter
+
+    @classmethod
+    def check(cls):
+        """
+        Compare the PendingTask table with the current Build and BuildChroot
+        states, return a list of found inconsistencies (strings).
+        """
+        # Sandbox is random for builds with unknown submitter.
+        fields = ["build_id", "status", "srpm", "background", "blocked",
+                  "project_owner", "project", "chroot", "tags"]
+
+        def _values(task):
+            return {field: getattr(task, field) for field in fields}
+
+        stored = {task.task_id: _values(task)
+                  for task in models.PendingTask.query}
+        problems = []
+        for task in cls._generate():
+            expected = _values(task)
+            current = stored.pop(task.task_id, None)
+            if current is None:
+                problems.append("Task {} is missing".format(task.task_id))
+            elif current != expected:
+                problems.append("Task {} is outdated, {} != {}".format(
+                    task.task_id, current, expected))
+        for task_id in sorted(stored):
+            problems.append("Task {} should be removed".format(task_id))
+        return problems
+
+
+# Build and BuildChroot attributes which affect the Backend's pending-jobs queue
+_PENDING_JOBS_ATTRIBUTES = {
+    models.Build: ["source_status", "canceled", "is_background", "batch_id"],
+    models.BuildChroot: ["status", "tags_raw"],
+}
+
+
+# Build and BuildChroot attributes that affect Build.status
+_BUILD_STATUS_ATTRIBUTES = {
+    models.Build: ["source_status", "canceled"],
+    models.BuildChroot: ["status"],
+}
+
+
+@listens_for(db.session, "before_flush")
+def update_build_status(session, _flush_context, _instances):
+    """
+    Keep the denormalized Build.status column in sync with the source_status,
+    canceled and the build chroot states, whatever code path changes them
+    (backend updates, cancel, import, fork, ...).
+    """
+    builds = set()
+    for obj in itertools.chain(session.new, session.dirty, session.deleted):
+        attributes = _BUILD_STATUS_ATTRIBUTES.get(type(obj))
+        if not attributes:
+            continue
+        if obj in session.dirty and not any(
+                get_history(obj, attr).has_changes() for attr in attributes):
+            continue
+        build = obj
+        if isinstance(obj, models.BuildChroot):
+            if obj.status is None and obj in session.new:
+                # apply the column default early, for compute_status()
+                obj.status = StatusEnum("waiting")
+            build = obj.build
+            if build is None and obj.build_id is not None:
+                # pending BuildChroot created with build_id only, make it
+                # visible in Build.build_chroots for compute_status()
+                build = session.get(models.Build, obj.build_id)
+                obj.build = build
+        if build is not None and build not in session.deleted:
+            builds.add(build)
+
+    for build in builds:
+        # pylint: disable=protected-access
+        status = build.compute_status(ignored_chroots=session.deleted)
+        if build._status != status:
+            build._status = status
+        build._status_outdated_flag = False
+
+
+@listens_for(db.session, "after_flush")
+def record_pending_jobs_changes(session, _flush_context):
+    """
+    Log all the flushed changes of Builds and BuildChroots that might affect
+    the Backend's pending-jobs queue, see BuildsLogic.get_pending_jobs_changes().
+    The session's new/dirty/deleted lists and the attribute history still
+    reflect the pre-flush state here.
+    """
+    build_ids = set()
+    for obj in itertools.chain(session.new, session.dirty, session.deleted):
+        attributes = _PENDING_JOBS_ATTRIBUTES.get(type(obj))
+        if not attributes:
+            continue
+        if obj in session.dirty and not any(
+                get_history(obj, attr).has_changes() for attr in attributes):
+            continue
+        build_id = obj.id if isinstance(obj, models.Build) else obj.build_id
+        if build_id is not None:
+            build_ids.add(build_id)
+
+    if not build_ids:
+        return
+
+    if PendingTasksLogic.enabled():
+        session.info.setdefault("pending_tasks_changed", set()).update(build_ids)
+
+    now = int(time.time())
+    session.connection().execute(
+        models.PendingJobChange.__table__.insert(),
+        [{"build_id": build_id, "changed_on": now}
+         for build_id in sorted(build_ids)],
+    )
+
+
+@listens_for(db.session, "after_flush")
+def update_latest_build_chroots(session, _flush_context):
+    """
+    Keep the LatestBuildChroot pointers in sync with the flushed changes.  New
+    BuildChroots are just upserted, while removed builds (or builds moved to
+    a different Package or CoprDir) require re-calculating the pointers for
+    the affected packages from the build history.  The affected packages are
+    taken from the flushed objects, not from the pointer table; the pointers
+    to the removed builds are already gone because of ON DELETE CASCADE.
+    """
+    new_build_chroots = []
+    deleted_chroot_build_ids = set()
+    package_ids = set()
+    for obj in itertools.chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, models.BuildChroot):
+            if obj in session.deleted:
+                deleted_chroot_build_ids.add(obj.build_id)
+            elif obj in session.new:
+                new_build_chroots.append(obj)
+        elif isinstance(obj, models.Build):
+            if obj in session.deleted:
+                package_ids.add(obj.package_id)
+            elif obj in session.dirty and any(
+                    get_history(obj, attr).has_changes()
+                    for attr in ["package_id", "copr_dir_id"]):
+                package_ids.add(obj.package_id)
+                package_ids.update(get_history(obj, "package_id").deleted)
+                new_build_chroots.extend(obj.build_chroots)
+        elif isinstance(obj, models.Package) and obj in session.deleted:
+            package_ids.add(obj.id)
+
+    connection = session.connection()
+    deleted_chroot_build_ids.discard(None)
+    if deleted_chroot_build_ids:
+        # the builds which are not removed, too
+        build = models.Build.__table__
+        package_ids.update(connection.execute(
+            select(build.c.package_id).distinct()
+            .where(build.c.id.in_(deleted_chroot_build_ids))).scalars())
+    package_ids.discard(None)
+    if package_ids:
+        LatestBuildChrootsLogic.recompute(connection, package_ids)
+
+    new_build_chroots = [bch for bch in new_build_chroots
+                         if bch not in session.deleted
+                         and bch.build not in session.deleted]
+    if new_build_chroots:
+        LatestBuildChrootsLogic.add(connection, new_build_chroots)
+
+
+@listens_for(db.session, "before_commit")
+def refresh_pending_tasks(session):
+    """
+    Update the materialized build queue for all the builds changed in this
+    transaction, see PendingTasksLogic.
+    """
+    session.flush()
+    build_ids = session.info.pop("pending_tasks_changed", None)
+    if build_ids:
+        PendingTasksLogic.refresh(build_ids)
+
+
+@listens_for(db.session, "after_soft_rollback")
+def forget_pending_tasks(session, _previous_transaction):
+    """ Nothing to refresh after rollback """
+    session.info.pop("pending_tasks_changed", None)
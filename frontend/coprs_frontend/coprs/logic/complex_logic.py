@@ -2,10 +2,14 @@
 
 import os
 import datetime
+import itertools
 import time
 import fnmatch
+import hashlib
+import uuid
 import flask
 import sqlalchemy
+from sqlalchemy.orm.attributes import get_history
 
 from copr_common.enums import StatusEnum
 from coprs import app
@@ -16,7 +20,7 @@ from coprs import exceptions
 from coprs import cache
 from coprs.constants import DEFAULT_COPR_REPO_PRIORITY
 from coprs.exceptions import ObjectNotFound, ActionInProgressException
-from coprs.logic.builds_logic import BuildsLogic
+from coprs.logic.builds_logic import BuildsLogic, PendingTasksLogic
 from coprs.logic.batches_logic import BatchesLogic
 from coprs.logic.packages_logic import PackagesLogic
 from coprs.logic.actions_logic import ActionsLogic
@@ -55,6 +59,29 @@ class ComplexLogic(object):
         if not copr:
             return [], [], []
 
+        generation, closure = RuntimeDependenciesCache.get(copr.id)
+        if closure is None:
+            internal_deps, external_deps, non_existing = \
+                cls._compute_transitive_runtime_dependencies(copr)
+            RuntimeDependenciesCache.set(copr.id, generation, internal_deps,
+                                         external_deps, non_existing)
+            return internal_deps, external_deps, non_existing
+
+        internal_ids = closure["internal"]
+        coprs = {}
+        if internal_ids:
+            coprs = {dep.id: dep for dep in models.Copr.query.filter(
+                models.Copr.id.in_(internal_ids))}
+        internal_deps = [coprs[copr_id] for copr_id in internal_ids
+                         if copr_id in coprs]
+        return internal_deps, closure["external"], closure["non_existing"]
+
+    @classmethod
+    def _compute_transitive_runtime_dependencies(cls, copr):
+        """
+        The uncached variant of get_transitive_runtime_dependencies(), walking
+        the dependency graph one project at a time.
+        """
         wlist = helpers.WorkList([copr])
         internal_deps = set()
         non_existing = set()
@@ -427,12 +454,18 @@ class ComplexLogic(object):
     @staticmethod
     def get_queue_sizes():
         importing = BuildsLogic.get_build_importing_queue(background=False).count()
-        pending = BuildsLogic.get_pending_build_tasks(background=False).count() +\
-            BuildsLogic.get_pending_srpm_build_tasks(background=False).count()
-        running = BuildsLogic.get_build_tasks(StatusEnum("running")).count() +\
-            BuildsLogic.get_srpm_build_tasks(StatusEnum("running")).count()
-        starting = BuildsLogic.get_build_tasks(StatusEnum("starting")).count() +\
-            BuildsLogic.get_srpm_build_tasks(StatusEnum("starting")).count()
+        if PendingTasksLogic.enabled():
+            sizes = PendingTasksLogic.get_queue_sizes()
+            pending = sizes["pending"]
+            running = sizes["running"]
+            starting = sizes["starting"]
+        else:
+            pending = BuildsLogic.get_pending_build_tasks(background=False).count() +\
+                BuildsLogic.get_pending_srpm_build_tasks(background=False).count()
+            running = BuildsLogic.get_build_tasks(StatusEnum("running")).count() +\
+                BuildsLogic.get_srpm_build_tasks(StatusEnum("running")).count()
+            starting = BuildsLogic.get_build_tasks(StatusEnum("starting")).count() +\
+                BuildsLogic.get_srpm_build_tasks(StatusEnum("starting")).count()
 
         return dict(
             importing=importing,
@@ -842,3 +875,200 @@ class ReposLogic:
                     arch_repos[ch64] = ch32
 
             repos_info[name_release]['arch_repos'] = arch_repos
+
+
+class RuntimeDependenciesCache:
+    """
+    Cache of the transitive runtime dependency closures, per project.  Each
+    cached closure is tagged with the "generation" that was current when it
+    was computed.  Any change that might affect any closure (runtime
+    dependencies changed, project created, renamed or deleted) starts a new
+    generation, which invalidates all the cached closures at once.
+    """
+
+    GENERATION_KEY = "runtime_deps_generation"
+    CLOSURE_KEY = "runtime_deps_closure_{0}"
+    TIMEOUT = 24*3600
+
+    @classmethod
+    def get(cls, copr_id):
+        """
+        Return the (generation, closure) pair.  The closure is a dict with the
+        "internal" (Copr IDs), "external" and "non_existing" lists, or None if
+        not cached for the current generation.
+        """
+        generation, closure = cache.get_many(cls.GENERATION_KEY,
+                                             cls.CLOSURE_KEY.format(copr_id))
+        if generation is None:
+            return cls.invalidate(), None
+        if closure and closure["generation"] == generation:
+            return generation, closure
+        return generation, None
+
+    @classmethod
+    def set(cls, copr_id, generation, internal_deps, external_deps,
+            non_existing):
+        """
+        Store the closure for the given project, computed in GENERATION
+        """
+        cache.set(cls.CLOSURE_KEY.format(copr_id), {
+            "generation": generation,
+            "internal": [dep.id for dep in internal_deps],
+            "external": list(external_deps),
+            "non_existing": list(non_existing),
+        }, timeout=cls.TIMEOUT)
+
+    @classmethod
+    def invalidate(cls):
+        """
+        Start a new generation, return its ID
+        """
+        generation = str(uuid.uuid4())
+        cache.set(cls.GENERATION_KEY, generation, timeout=0)
+        return generation
+
+
+# Copr attributes affecting the runtime dependency closures
+_RUNTIME_DEPS_ATTRIBUTES = ["runtime_dependencies", "name", "deleted"]
+
+
+@sqlalchemy.event.listens_for(db.session, "before_flush")
+def detect_runtime_deps_changes(session, _flush_context, _instances):
+    """
+    Remember whether the flushed changes might affect any runtime dependency
+    closure, see RuntimeDependenciesCache.
+    """
+    for obj in itertools.chain(session.new, session.dirty, session.deleted):
+        if not isinstance(obj, models.Copr):
+            continue
+        if obj in session.dirty and not any(
+                get_history(obj, attr).has_changes()
+                for attr in _RUNTIME_DEPS_ATTRIBUTES):
+            continue
+        session.info["runtime_deps_changed"] = True
+        return
+
+
+@sqlalchemy.event.listens_for(db.session, "after_commit")
+def invalidate_runtime_deps(session):
+    """
+    Invalidate the cached closures once the changes are visible to others
+    """
+    if session.info.pop("runtime_deps_changed", False):
+        RuntimeDependenciesCache.invalidate()
+
+
+@sqlalchemy.event.listens_for(db.session, "after_soft_rollback")
+def forget_runtime_deps_changes(session, _previous_transaction):
+    """ Nothing to invalidate after rollback """
+    session.info.pop("runtime_deps_changed", None)
+
+
+class RepoArtifactsCache:
+    """
+    Pre-rendered repo files and rpmrepo metadata (the "artifacts"), together
+    with their ETags for conditional GET requests.  An artifact is valid as
+    long as the generations it was rendered in are current.  There's the
+    per-project generation (project settings, chroots, or directories changed),
+    the global generation (mock chroots, or the project attributes rendered
+    into the dependent projects' repo files changed) and the
+    RuntimeDependenciesCache generation.  The artifacts expire anyway after
+    TIMEOUT, because of the "delete after N days" counters in them.
+    """
+
+    GLOBAL_GENERATION_KEY = "repo_artifacts_generation"
+    PROJECT_GENERATION_KEY = "repo_artifacts_generation_{0}"
+    ARTIFACT_KEY = "repo_artifact_{0}_{1}"
+    TIMEOUT = 3600
+
+    @classmethod
+    def get(cls, copr, name, render):
+        """
+        Return the NAME artifact of the COPR project, a dict with the
+        "content" and "etag" fields.  When not rendered for the current
+        generations yet, call RENDER() which returns the artifact dict (with
+        "content" and arbitrary other fields), and store the result.
+        """
+        generation_keys = [
+            RuntimeDependenciesCache.GENERATION_KEY,
+            cls.GLOBAL_GENERATION_KEY,
+            cls.PROJECT_GENERATION_KEY.format(copr.id),
+        ]
+        artifact_key = cls.ARTIFACT_KEY.format(copr.id, name)
+        values = cache.get_many(*generation_keys, artifact_key)
+
+        generation = []
+        for key, value in zip(generation_keys, values):
+            if value is None:
+                value = str(uuid.uuid4())
+                cache.set(key, value, timeout=0)
+            generation.append(value)
+
+        artifact = values[-1]
+        if artifact and artifact["generation"] == generation:
+            return artifact
+
+        artifact = render()
+        artifact["etag"] = hashlib.sha256(
+            artifact["content"].encode("utf-8")).hexdigest()
+        artifact["generation"] = generation
+        cache.set(artifact_key, artifact, timeout=cls.TIMEOUT)
+        return artifact
+
+    @classmethod
+    def invalidate(cls, copr_ids=None):
+        """
+        Invalidate the artifacts of the given projects, or all the artifacts
+        if COPR_IDS is None.
+        """
+        if copr_ids is None:
+            cache.set(cls.GLOBAL_GENERATION_KEY, str(uuid.uuid4()), timeout=0)
+            return
+        cache.set_many({cls.PROJECT_GENERATION_KEY.format(copr_id):
+                        str(uuid.uuid4()) for copr_id in copr_ids}, timeout=0)
+
+
+# Copr attributes rendered into the repo files, the projects depending on the
+# changed project render them, too
+_REPO_TEMPLATE_ATTRIBUTES = ["repo_priority", "module_hotfixes", "name",
+                             "user_id", "group_id", "deleted"]
+
+
+@sqlalchemy.event.listens_for(db.session, "after_flush")
+def detect_repo_artifacts_changes(session, _flush_context):
+    """
+    Remember the projects with outdated RepoArtifactsCache.  The "None" in the
+    set means that all the artifacts are outdated.
+    """
+    changed = session.info.setdefault("repo_artifacts_changed", set())
+    for obj in itertools.chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, models.MockChroot):
+            changed.add(None)
+        elif isinstance(obj, models.Copr):
+            changed.add(obj.id)
+            if any(get_history(obj, attr).has_changes()
+                   for attr in _REPO_TEMPLATE_ATTRIBUTES):
+                changed.add(None)
+        elif isinstance(obj, (models.CoprChroot, models.CoprDir)):
+            changed.add(obj.copr_id)
+
+
+@sqlalchemy.event.listens_for(db.session, "after_commit")
+def invalidate_repo_artifacts(session):
+    """
+    Invalidate the artifacts once the changes are visible to others
+    """
+    changed = session.info.pop("repo_artifacts_changed", None)
+    if not changed:
+        return
+    if None in changed:
+        RepoArtifactsCache.invalidate()
+        changed.discard(None)
+    if changed:
+        RepoArtifactsCache.invalidate(changed)
+
+
+@sqlalchemy.event.listens_for(db.session, "after_soft_rollback")
+def forget_repo_artifacts_changes(session, _previous_transaction):
+    """ Nothing to invalidate after rollback """
+    session.info.pop("repo_artifacts_changed", None)
@@ -3,7 +3,6 @@ from typing import List, Optional
 
 from sqlalchemy import bindparam, Integer, func, or_
 from sqlalchemy.sql import true, text
-from sqlalchemy.orm import selectinload
 
 from coprs import app
 from coprs import db
@@ -48,12 +47,13 @@ class PackagesLogic(object):
         return cls.get_all(copr_id).order_by(models.Package.name)
 
     @classmethod
-    def webhook_package_candidates(cls, source_type):
+    def webhook_package_candidates(cls, source_type, upstream_names=None):
         """
         Returns a query for list of (package, last_build) pairs for given source
         type.  Last_build can be None if no build has been done.  This query is
         very expensive (several seconds definitely, so please avoid exposing
-        this to users or optimize first).
+        this to users or optimize first) unless the UPSTREAM_NAMES list
+        (lowercased, see Package.upstream_name) limits the set of packages.
         """
         pkg_build_pairs = (
             models.Package.query
@@ -66,9 +66,11 @@ class PackagesLogic(object):
             .filter(models.Package.source_type==source_type)
             .filter(models.Package.webhook_rebuild.is_(True))
             .filter(models.Copr.deleted.is_(False))
-            .group_by('pkg_id')
-            .subquery()
         )
+        if upstream_names is not None:
+            pkg_build_pairs = pkg_build_pairs.filter(
+                models.Package.upstream_name.in_(upstream_names))
+        pkg_build_pairs = pkg_build_pairs.group_by('pkg_id').subquery()
 
         return (
             db.session.query(
@@ -114,8 +116,8 @@ class PackagesLogic(object):
         # map package.id => package object in packages array
         packages_map = {package.id: package for package in packages}
 
+        # The Build.status is persisted, no need to load the build_chroots
         builds = (models.Build.query.filter(models.Build.id.in_(builds_ids))
-                  .options(selectinload('build_chroots'))
                   .yield_per(1000))
 
         for build in builds:
@@ -185,13 +187,16 @@ class PackagesLogic(object):
         cls, copr_id, webhook_secret, clone_url, commits, ref_type, ref, pkg_name: Optional[str]
     ) -> List[Package]:
         clone_url_stripped = cls._normalize_git_clone_url(clone_url)
+        clone_url_key = helpers.git_url_lookup_key(clone_url)
+        if not clone_url_key:
+            return []
 
         packages = (models.Package.query.join(models.Copr)
                     .filter(models.Copr.webhook_secret == webhook_secret)
                     .filter(models.Package.source_type == helpers.BuildSourceEnum("scm"))
                     .filter(models.Package.copr_id == copr_id)
                     .filter(models.Package.webhook_rebuild == true())
-                    .filter(models.Package.source_json.contains(clone_url_stripped)))
+                    .filter(models.Package.clone_url_key == clone_url_key))
 
         result = []
         for package in packages:
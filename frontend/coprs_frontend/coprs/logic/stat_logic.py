@@ -1,5 +1,7 @@
 from collections import defaultdict
 
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm.exc import NoResultFound
 
 from coprs import app
@@ -10,6 +12,9 @@ from coprs import helpers, models
 
 class CounterStatLogic(object):
 
+    # Number of counters upserted by one INSERT statement in incr_many()
+    UPSERT_CHUNK_SIZE = 1000
+
     @classmethod
     def get(cls, name):
         """
@@ -47,6 +52,39 @@ class CounterStatLogic(object):
         db.session.add(csl)
         return csl
 
+    @classmethod
+    def incr_many(cls, counters):
+        """
+        Bulk variant of incr(), COUNTERS is a {(name, counter_type): count}
+        dict.  The counters are created or incremented by multi-row
+        "INSERT .. ON CONFLICT DO UPDATE" statements, atomically, so concurrent
+        callers don't lose each other's increments.  The rows are sorted by
+        name, so concurrent transactions lock them in the same order and don't
+        deadlock.
+        """
+        totals = defaultdict(int)
+        types = {}
+        for (name, counter_type), count in counters.items():
+            totals[name] += count
+            types[name] = counter_type
+
+        rows = [{"name": name, "counter_type": types[name],
+                 "counter": totals[name]} for name in sorted(totals)]
+
+        table = CounterStat.__table__
+        if db.engine.dialect.name == "postgresql":
+            insert = postgresql_insert
+        else:
+            insert = sqlite_insert
+
+        for start in range(0, len(rows), cls.UPSERT_CHUNK_SIZE):
+            stmt = insert(table).values(rows[start:start+cls.UPSERT_CHUNK_SIZE])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c.name],
+                set_={"counter": table.c.counter + stmt.excluded.counter},
+            )
+            db.session.execute(stmt)
+
     @classmethod
     def get_copr_repo_dl_stat(cls, copr):
         # chroot -> stat_name
@@ -103,6 +141,7 @@ def handle_be_stat_message(stat_data):
     """
     app.logger.debug('Got stat data: {}'.format(stat_data))
 
+    counters = defaultdict(int)
     hits = stat_data['hits']
     for key_str, count in hits.items():
         stat_type, key_string = key_str.split("|", 1)
@@ -121,4 +160,6 @@ def handle_be_stat_message(stat_data):
             stat_type=stat_type,
             key_string=key_string,
         )
-        CounterStatLogic.incr(stat_name, stat_type, count)
+        counters[(stat_name, stat_type)] += count
+
+    CounterStatLogic.incr_many(counters)
@@ -19,9 +19,12 @@ import zlib
 
 import modulemd_tools.yaml
 
-from sqlalchemy import outerjoin, text
+from sqlalchemy import inspect, outerjoin, text
 from sqlalchemy.ext.associationproxy import association_proxy
-from sqlalchemy.orm import column_property, validates
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import column_property, object_session, validates
+from sqlalchemy.orm.attributes import get_history
+from sqlalchemy.orm.util import identity_key
 from sqlalchemy.event import listens_for
 from libravatar import libravatar_url
 
@@ -856,8 +859,21 @@ class Package(db.Model, helpers.Serializer, CoprSearchRelatedData):
     __table_args__ = (
         db.Index('package_copr_id_name', 'copr_id', 'name', unique=True),
         db.Index('package_webhook_sourcetype', 'webhook_rebuild', 'source_type'),
+        db.Index('package_sourcetype_upstream_name', 'source_type', 'upstream_name'),
     )
 
+    # source_json keys with the upstream project name, per source type
+    UPSTREAM_NAME_KEYS = {
+        helpers.BuildSourceEnum("pypi"): "pypi_package_name",
+        helpers.BuildSourceEnum("rubygems"): "gem_name",
+    }
+
+    # source types with the git "clone_url" in source_json
+    CLONE_URL_SOURCE_TYPES = [
+        helpers.BuildSourceEnum("scm"),
+        helpers.BuildSourceEnum("distgit"),
+    ]
+
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     # Source of the build: type identifier
@@ -868,6 +884,14 @@ class Package(db.Model, helpers.Serializer, CoprSearchRelatedData):
     webhook_rebuild = db.Column(db.Boolean, default=False)
     # enable networking during a build process
     enable_net = db.Column(db.Boolean, default=False, server_default="0", nullable=False)
+    # Lowercased upstream (PyPI, RubyGems) project name from source_json, for
+    # looking up the packages to be rebuilt upon upstream release.  Maintained
+    # automatically, see compute_upstream_name().
+    upstream_name = db.Column(db.Text)
+    # Normalized clone_url from source_json (see helpers.git_url_lookup_key),
+    # for looking up the packages to be rebuilt upon push/PR events.
+    # Maintained automatically, see compute_clone_url_key().
+    clone_url_key = db.Column(db.Text, index=True)
 
     # don't keep more builds of this package per copr-dir
     max_builds = db.Column(db.Integer, index=True)
@@ -898,6 +922,33 @@ class Package(db.Model, helpers.Serializer, CoprSearchRelatedData):
     def source_type_text(self):
         return helpers.BuildSourceEnum(self.source_type)
 
+    def compute_upstream_name(self):
+        """
+        Return the lowercased upstream project name for the PyPI and RubyGems
+        packages, according to the current source_json.  None otherwise.
+        """
+        key = self.UPSTREAM_NAME_KEYS.get(self.source_type)
+        if not key:
+            return None
+        try:
+            name = self.source_json_dict.get(key)
+        except (ValueError, AttributeError):
+            return None
+        return name.lower() if name else None
+
+    def compute_clone_url_key(self):
+        """
+        Return the normalized clone_url for the SCM and DistGit packages,
+        according to the current source_json.  None otherwise.
+        """
+        if self.source_type not in self.CLONE_URL_SOURCE_TYPES:
+            return None
+        try:
+            clone_url = self.source_json_dict.get("clone_url")
+        except (ValueError, AttributeError):
+            return None
+        return helpers.git_url_lookup_key(clone_url)
+
     @property
     def has_source_type_set(self):
         """
@@ -1095,6 +1146,11 @@ class Build(db.Model, helpers.Serializer):
     # the info that the build was resubmitted
     resubmitted_from_id = db.Column(db.Integer)
 
+    # Denormalized value of the Build.status property (so we don't have to
+    # load all the build chroots), updated on every flush by the
+    # update_build_status() hook in builds_logic.
+    _status = db.Column("status", db.Integer, index=True)
+
     __table_args__ = (
         db.Index('build_canceled', "canceled"),
         db.Index('build_order', "is_background", "id"),
@@ -1109,6 +1165,10 @@ class Build(db.Model, helpers.Serializer):
     _cached_status = None
     _cached_status_set = None
 
+    # Set when some of the build chroots changed since the last flush, see
+    # mark_build_status_outdated()
+    _status_outdated_flag = False
+
     @property
     def group_name(self):
         return self.copr.group.name
@@ -1282,10 +1342,37 @@ class Build(db.Model, helpers.Serializer):
             return "unknown"
         return StatusEnum(self.source_status)
 
-    @property
+    def _status_outdated(self):
+        """
+        Return True if the persisted status value might not reflect the
+        current (not yet flushed) state of the build.
+        """
+        if self._status is None or self._status_outdated_flag:
+            return True
+        if inspect(self).pending:
+            return True
+        return any(get_history(self, attr).has_changes()
+                   for attr in ["source_status", "canceled"])
+
+    @hybrid_property
     def status(self):
         """
-        Return build status.
+        Return build status.  The persisted value is used if the build chroots
+        are not loaded yet, and nothing changed since the last flush.
+        """
+        if "build_chroots" not in self.__dict__ and not self._status_outdated():
+            return self._status
+        return self.compute_status()
+
+    @status.expression
+    def status(cls):
+        # pylint: disable=no-self-argument
+        return cls._status
+
+    def compute_status(self, ignored_chroots=None):
+        """
+        Calculate the build status from the source status and from the states
+        of all the build chroots (except for the IGNORED_CHROOTS).
         """
         if self.canceled:
             return StatusEnum("canceled")
@@ -1294,7 +1381,9 @@ class Build(db.Model, helpers.Serializer):
         if self.source_state in use_src_states:
             return self.source_status
 
-        if not self.chroot_states:
+        chroot_states = [ch.status for ch in self.build_chroots
+                         if not ignored_chroots or ch not in ignored_chroots]
+        if not chroot_states:
             # There were some builds in DB which had source_status equal
             # to 'succeeded', while they had no build_chroots created.
             # The original source of this inconsistency isn't known
@@ -1307,10 +1396,10 @@ class Build(db.Model, helpers.Serializer):
             return StatusEnum("waiting")
 
         for state in ["running", "starting", "pending", "failed", "succeeded", "skipped", "forked"]:
-            if StatusEnum(state) in self.chroot_states:
+            if StatusEnum(state) in chroot_states:
                 return StatusEnum(state)
 
-        if StatusEnum("waiting") in self.chroot_states:
+        if StatusEnum("waiting") in chroot_states:
             # We should atomically flip
             # a) build.source_status: "importing" -> "succeeded" and
             # b) biuld_chroot.status: "waiting" -> "pending"
@@ -1404,6 +1493,8 @@ class Build(db.Model, helpers.Serializer):
         result["src_pkg"] = result["pkgs"]
         del result["pkgs"]
         del result["copr_id"]
+        # the textual "state" below is what we expose
+        result.pop("status", None)
 
         result['source_type'] = helpers.BuildSourceEnum(result['source_type'])
         result["state"] = self.state
@@ -2151,6 +2242,32 @@ class BuildChrootResult(db.Model, helpers.Serializer):
     )
 
 
+class LatestBuildChroot(db.Model):
+    """
+    Pointer to the latest BuildChroot (the one with the highest Build.id) for
+    each Package, CoprDir and MockChroot, so the package monitor and package
+    listings don't have to go through the whole build history.  Maintained
+    by the update_latest_build_chroots() hook in builds_logic.
+    """
+    package_id = db.Column(
+        db.Integer, db.ForeignKey("package.id", ondelete="CASCADE"),
+        primary_key=True)
+    copr_dir_id = db.Column(
+        db.Integer, db.ForeignKey("copr_dir.id", ondelete="CASCADE"),
+        primary_key=True)
+    mock_chroot_id = db.Column(
+        db.Integer, db.ForeignKey("mock_chroot.id", ondelete="CASCADE"),
+        primary_key=True)
+    build_id = db.Column(
+        db.Integer, db.ForeignKey("build.id", ondelete="CASCADE"),
+        nullable=False, index=True)
+    build_chroot_id = db.Column(
+        db.Integer, db.ForeignKey("build_chroot.id", ondelete="CASCADE"),
+        nullable=False, index=True)
+
+    build_chroot = db.relationship("BuildChroot")
+
+
 class LegalFlag(db.Model, helpers.Serializer):
     id = db.Column(db.Integer, primary_key=True)
     # message from user who raised the flag (what he thinks is wrong)
@@ -2554,6 +2671,99 @@ class CancelRequest(db.Model):
     what = db.Column(db.String(100), nullable=False, primary_key=True)
 
 
+class PendingJobChange(db.Model):
+    """
+    Append-only log of Build and BuildChroot changes that (might) affect the
+    Backend's pending-jobs queue; newly submitted, re-scheduled, finished,
+    canceled or removed builds.  The auto-incremented ID is the sequence
+    number used as a cursor by the /backend/pending-jobs/delta/ route.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    # Not a foreign key, we need to keep track of the removed builds, too.
+    build_id = db.Column(db.Integer, nullable=False)
+    changed_on = db.Column(db.Integer, nullable=False, index=True)
+
+
+class PendingTask(db.Model):
+    """
+    Denormalized copy of the Backend's build queue; all the not-canceled SRPM
+    and RPM build tasks in the pending, starting and running states, with
+    exactly the data that Backend needs (see get_build_record(for_backend=True))
+    and the resolved Batch "blocked" flag.  Maintained by PendingTasksLogic
+    when the PENDING_TASKS_MATERIALIZED option is enabled.
+    """
+    __table_args__ = (
+        db.Index("pending_task_queue_order",
+                 "blocked", "srpm", "background", "build_id"),
+    )
+
+    task_id = db.Column(db.String(100), primary_key=True)
+    build_id = db.Column(db.Integer, nullable=False, index=True)
+    status = db.Column(db.Integer, nullable=False)
+    srpm = db.Column(db.Boolean, nullable=False)
+    background = db.Column(db.Boolean, nullable=False)
+    blocked = db.Column(db.Boolean, nullable=False)
+    project_owner = db.Column(db.Text, nullable=False)
+    project = db.Column(db.Text, nullable=False)
+    sandbox = db.Column(db.Text, nullable=False)
+    chroot = db.Column(db.Text)
+    tags = db.Column(JSONEncodedDict)
+
+    @classmethod
+    def from_build(cls, build, blocked):
+        """ Create the SRPM build task, BLOCKED is the resolved Build.blocked """
+        chroot = None
+        if build.source_type_text == "custom":
+            chroot = build.source_json_dict['chroot']
+        return cls(
+            task_id=build.task_id,
+            build_id=build.id,
+            status=build.source_status,
+            srpm=True,
+            background=bool(build.is_background),
+            blocked=blocked,
+            project_owner=build.copr.owner_name,
+            project=build.copr.full_name,
+            sandbox=build.sandbox,
+            chroot=chroot,
+        )
+
+    @classmethod
+    def from_build_chroot(cls, build_chroot, blocked):
+        """ Create the RPM build task, BLOCKED is the resolved Build.blocked """
+        build = build_chroot.build
+        return cls(
+            task_id=build_chroot.task_id,
+            build_id=build.id,
+            status=build_chroot.status,
+            srpm=False,
+            background=bool(build.is_background),
+            blocked=blocked,
+            project_owner=build.copr.owner_name,
+            project=build.copr.full_name,
+            sandbox=build.sandbox,
+            chroot=build_chroot.mock_chroot.name,
+            tags=build_chroot.mock_chroot.tags + build_chroot.tags,
+        )
+
+    def to_backend_dict(self):
+        """
+        The same output as get_build_record(for_backend=True), or
+        get_srpm_build_record(for_backend=True) respectively.
+        """
+        record = {
+            "task_id": self.task_id,
+            "build_id": self.build_id,
+            "project_owner": self.project_owner,
+            "sandbox": self.sandbox,
+            "background": self.background,
+            "chroot": self.chroot,
+        }
+        if not self.srpm:
+            record["tags"] = self.tags or []
+        return record
+
+
 class ReviewedOutdatedChroot(db.Model):
     id = db.Column(db.Integer, primary_key=True)
 
@@ -2580,6 +2790,55 @@ class ReviewedOutdatedChroot(db.Model):
     )
 
 
+@listens_for(BuildChroot.status, "set")
+@listens_for(BuildChroot.build_id, "set")
+@listens_for(BuildChroot.build, "set")
+def mark_build_status_outdated(build_chroot, value, oldvalue, initiator):
+    """
+    Tell the affected builds that their persisted status is outdated until
+    the next flush, so Build.status doesn't have to look for the changed
+    BuildChroots in the whole session.
+    """
+    # pylint: disable=protected-access
+    if value == oldvalue:
+        return
+
+    session = object_session(build_chroot)
+
+    def _get_build(build_id):
+        if session is None or not isinstance(build_id, int):
+            return None
+        return session.identity_map.get(identity_key(Build, build_id))
+
+    if initiator.key == "build":
+        builds = [value, oldvalue]
+    elif initiator.key == "build_id":
+        builds = [_get_build(value), _get_build(oldvalue)]
+    elif "build" in build_chroot.__dict__:
+        builds = [build_chroot.build]
+    elif session is not None:
+        # build_id might be expired, don't flush the half-done changes
+        with session.no_autoflush:
+            builds = [_get_build(build_chroot.build_id)]
+    else:
+        builds = []
+
+    for build in builds:
+        if isinstance(build, Build):
+            build._status_outdated_flag = True
+
+
+@listens_for(Package, "before_insert")
+@listens_for(Package, "before_update")
+def update_package_lookup_columns(_mapper, _connection, package):
+    """
+    Keep the Package.upstream_name and clone_url_key in sync with the
+    source_json
+    """
+    package.upstream_name = package.compute_upstream_name()
+    package.clone_url_key = package.compute_clone_url_key()
+
+
 @listens_for(DistGitInstance.__table__, 'after_create')
 def insert_fedora_distgit(*args, **kwargs):
     db.session.add(DistGitInstance(
@@ -1,8 +1,11 @@
 """
 Use NamedTemporaryFile for large file uploads, so we eventually don't have copy
-the uploaded file to the final destination.
+the uploaded file to the final destination.  Accept gzip-compressed request
+bodies from Copr Backend.
 """
 
+import gzip
+import io
 import os
 import tempfile
 import typing as t
@@ -13,6 +16,9 @@ import flask
 
 NAMED_FILE_FROM_BYTES = 50*1024*1024
 
+# Protect us against "gzip bombs"
+GZIP_REQUEST_MAX_BYTES = 100*1024*1024
+
 
 def get_request_class(app):
     """
@@ -85,3 +91,42 @@ def save_form_file_field_to(field, path: str):
         os.link(stream.name, path)
     else:
         field.data.save(path)
+
+
+class GzipRequestMiddleware:
+    """
+    WSGI middleware decompressing the gzip-encoded request bodies (sent by
+    Copr Backend with 'frontend_gzip_requests = true') for the URL paths
+    starting with one of the PREFIXES.  The Flask views then see the plain
+    request data.
+    """
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self, wsgi_app, prefixes=("/backend/",)):
+        self.wsgi_app = wsgi_app
+        self.prefixes = prefixes
+
+    def __call__(self, environ, start_response):
+        encoding = environ.get("HTTP_CONTENT_ENCODING", "").strip().lower()
+        if encoding == "gzip" and \
+                environ.get("PATH_INFO", "").startswith(self.prefixes):
+            try:
+                data = self._decompress(environ)
+            except (OSError, EOFError, ValueError) as ex:
+                start_response("400 Bad Request",
+                               [("Content-Type", "text/plain")])
+                return [f"Can not decompress request body: {ex}\n".encode()]
+            environ["wsgi.input"] = io.BytesIO(data)
+            environ["CONTENT_LENGTH"] = str(len(data))
+            del environ["HTTP_CONTENT_ENCODING"]
+        return self.wsgi_app(environ, start_response)
+
+    @staticmethod
+    def _decompress(environ):
+        length = int(environ.get("CONTENT_LENGTH") or 0)
+        body = environ["wsgi.input"].read(length)
+        with gzip.GzipFile(fileobj=io.BytesIO(body)) as fd:
+            data = fd.read(GZIP_REQUEST_MAX_BYTES + 1)
+        if len(data) > GZIP_REQUEST_MAX_BYTES:
+            raise ValueError("too large")
+        return data
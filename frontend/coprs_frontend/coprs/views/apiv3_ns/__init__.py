@@ -1,3 +1,5 @@
+import base64
+import binascii
 import json
 import flask
 import wtforms
@@ -117,6 +119,7 @@ class PaginationForm(wtforms.Form):
     order = wtforms.StringField("Order by", validators=[wtforms.validators.Optional()])
     order_type = wtforms.SelectField("Order type", validators=[wtforms.validators.Optional()],
                                      choices=[("ASC", "ASC"), ("DESC", "DESC")], default="ASC")
+    cursor = wtforms.StringField("Cursor", validators=[wtforms.validators.Optional()])
 
 
 def get_copr(ownername=None, projectname=None):
@@ -127,17 +130,32 @@ def get_copr(ownername=None, projectname=None):
 
 
 class Paginator(object):
+    """
+    Apply the limit/offset/order pagination parameters to a query.
+
+    If the (opt-in) cursor parameter is specified (even empty, for the first
+    page), the keyset pagination is used instead of OFFSET.  The `next`
+    field in `meta` is then an opaque cursor for the next page (or None if
+    there are no more objects), and the next page is filtered by the last
+    seen ID, which is fast regardless how deep we are in the result set.
+    """
     LIMIT = None
     OFFSET = 0
     ORDER = "id"
 
-    def __init__(self, query, model, limit=None, offset=None, order=None, order_type=None, **kwargs):
+    def __init__(self, query, model, limit=None, offset=None, order=None,
+                 order_type=None, cursor=None, **kwargs):
         self.query = query
         self.model = model
         self.limit = limit or self.LIMIT
         self.offset = offset or self.OFFSET
         self.order = order or self.ORDER
         self.order_type = order_type
+        self.cursor = cursor
+        self.next = None
+        self._last_id = None
+        if self.cursor:
+            self._decode_cursor()
         if not self.order_type:
             # desc/asc unspecified, use some guessed defaults
             if self.order == 'id':
@@ -145,9 +163,43 @@ class Paginator(object):
             if self.order == 'name':
                 self.order_type = 'ASC'
 
+    def _decode_cursor(self):
+        try:
+            data = json.loads(base64.urlsafe_b64decode(self.cursor))
+            self.order = data["order"]
+            self.order_type = data["order_type"]
+            self._last_id = int(data["last"])
+        except (ValueError, KeyError, TypeError, binascii.Error) as ex:
+            raise BadRequest("Invalid pagination cursor") from ex
+        if self.order_type not in ["ASC", "DESC"]:
+            raise BadRequest("Invalid pagination cursor")
+
+    @staticmethod
+    def _encode_cursor(order, order_type, last_id):
+        data = {"order": order, "order_type": order_type, "last": last_id}
+        return base64.urlsafe_b64encode(json.dumps(data).encode()).decode()
+
     def get(self):
         return self.paginate_query(self.query)
 
+    def all(self):
+        """
+        Return the list of objects on the requested page
+        """
+        return self._remember(self.get().all())
+
+    def _remember(self, objects):
+        """
+        Generate the `next` cursor from the ID of the last object on the page,
+        if we are in the cursor mode and there might be more objects.
+        """
+        if self.cursor is None or not self.limit or len(objects) < self.limit:
+            return objects
+        ids = [obj.id for obj in objects]
+        last_id = min(ids) if self.order_type == "DESC" else max(ids)
+        self.next = self._encode_cursor(self.order, self.order_type, last_id)
+        return objects
+
     def paginate_query(self, query):
         """
         Return `self.query` with all pagination parameters (limit, offset,
@@ -170,19 +222,36 @@ class Paginator(object):
         elif self.order_type == 'DESC':
             order_fun = sqlalchemy.desc
 
+        if self.cursor is not None:
+            if self.order != "id":
+                raise BadRequest("The cursor pagination is supported only "
+                                 "with order=id")
+            if self._last_id is not None:
+                if self.order_type == "DESC":
+                    query = query.filter(order_attr < self._last_id)
+                else:
+                    query = query.filter(order_attr > self._last_id)
+            # The keyset filter only works if this is the only ordering (some
+            # of the queries are pre-ordered)
+            return (query.order_by(None).order_by(order_fun(order_attr))
+                    .limit(self.limit))
+
         return (query.order_by(order_fun(order_attr))
                 .limit(self.limit)
                 .offset(self.offset))
 
     @property
     def meta(self):
-        return {k: getattr(self, k) for k in ["limit", "offset", "order", "order_type"]}
+        meta = {k: getattr(self, k) for k in ["limit", "offset", "order", "order_type"]}
+        if self.cursor is not None:
+            meta["next"] = self.next
+        return meta
 
     def map(self, fun):
-        return [fun(x) for x in self.get()]
+        return [fun(x) for x in self.all()]
 
     def to_dict(self):
-        return [x.to_dict() for x in self.get()]
+        return [x.to_dict() for x in self.all()]
 
 
 class SubqueryPaginator(Paginator):
@@ -200,8 +269,15 @@ class SubqueryPaginator(Paginator):
     def get(self):
         subquery = self.paginate_query(self.subquery).subquery()
         query = self.query.filter(self.pk.in_(subquery))
+        if self.cursor is not None:
+            # keep the page ordered the same way as the subquery
+            query = query.order_by(None).order_by(
+                self.pk.desc() if self.order_type == "DESC" else self.pk.asc())
         return query.all()
 
+    def all(self):
+        return self._remember(self.get())
+
 
 class ListPaginator(Paginator):
     """
@@ -231,6 +307,9 @@ class ListPaginator(Paginator):
 
         return objects[self.offset : limit]
 
+    def all(self):
+        return self.get()
+
 
 def editable_copr(f):
     @wraps(f)
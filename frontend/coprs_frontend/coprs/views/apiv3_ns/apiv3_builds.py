@@ -118,15 +118,6 @@ class GetBuild(Resource):
 def get_build_list(ownername, projectname, packagename=None, status=None, **kwargs):
     copr = get_copr(ownername, projectname)
 
-    # WORKAROUND
-    # We can't filter builds by status directly in the database, because we
-    # use a logic in Build.status property to determine a build status.
-    # Therefore if we want to filter by `status`, we need to query all builds
-    # and filter them in the application and then return the desired number.
-    limit = kwargs["limit"]
-    paginator_limit = None if status else kwargs["limit"]
-    del kwargs["limit"]
-
     # Loading relationships straight away makes running `to_dict` somewhat
     # faster, which adds up over time, and  brings a significant speedup for
     # large projects
@@ -140,15 +131,11 @@ def get_build_list(ownername, projectname, packagename=None, status=None, **kwar
     subquery = query.filter(models.Build.copr == copr)
     if packagename:
         subquery = BuildsLogic.filter_by_package_name(subquery, packagename)
-
-    paginator = SubqueryPaginator(query, subquery, models.Build, limit=paginator_limit, **kwargs)
-
-    builds = paginator.map(to_dict)
-
     if status:
-        builds = [b for b in builds if b["state"] == status][:limit]
-        paginator.limit = limit
+        subquery = BuildsLogic.filter_by_state(subquery, status)
 
+    paginator = SubqueryPaginator(query, subquery, models.Build, **kwargs)
+    builds = paginator.map(to_dict)
     return flask.jsonify(items=builds, meta=paginator.meta)
 
 
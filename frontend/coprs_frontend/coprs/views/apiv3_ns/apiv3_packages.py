@@ -149,7 +149,7 @@ def get_package_list(ownername, projectname, with_latest_build=False,
     copr = get_copr(ownername, projectname)
     query = PackagesLogic.get_all(copr.id)
     paginator = Paginator(query, models.Package, **kwargs)
-    packages = paginator.get().all()
+    packages = paginator.all()
 
     if len(packages) > MAX_PACKAGES_WITHOUT_PAGINATION:
         raise ApiError("Too many packages, please use pagination. "
@@ -10,7 +10,8 @@ from coprs.logic.coprs_logic import (
 )
 
 from coprs.logic.complex_logic import (
-    ComplexLogic
+    ComplexLogic,
+    RepoArtifactsCache,
 )
 
 from coprs.views.apiv3_ns import (
@@ -18,7 +19,6 @@ from coprs.views.apiv3_ns import (
     GET,
 )
 
-from coprs import cache
 from coprs.logic.complex_logic import ReposLogic
 from coprs.logic.stat_logic import CounterStatLogic
 from coprs.helpers import (
@@ -28,12 +28,11 @@ from coprs.helpers import (
     CounterStatType,
 )
 
-@cache.memoize(timeout=2*60)
 def get_project_rpmrepo_metadata(copr):
     """
     Get the copr-related JSON data with available
     chroots/directories/external/etc.  This is parsed by DNF5 copr plugin.
-    We cache (memoize) this for several minutes because generating the data can
+    The output is cached in RepoArtifactsCache because generating the data can
     be relatively DB demanding (for rather larger dependency trees).
     """
 
@@ -128,8 +127,7 @@ def get_project_rpmrepo_metadata(copr):
             }
         })
 
-
-    return flask.jsonify(data)
+    return data
 
 @apiv3_ns.route("/rpmrepo/<ownername>/<dirname>/<name_release>/", methods=GET)
 def rpmrepo_route(ownername, dirname, name_release):
@@ -144,4 +142,10 @@ def rpmrepo_route(ownername, dirname, name_release):
         name_release=name_release,
     )
     CounterStatLogic.incr(name=name, counter_type=CounterStatType.REPO_DL)
-    return get_project_rpmrepo_metadata(copr)
+    artifact = RepoArtifactsCache.get(
+        copr, "rpmrepo",
+        lambda: {"content": flask.json.dumps(get_project_rpmrepo_metadata(copr))},
+    )
+    response = flask.Response(artifact["content"], mimetype="application/json")
+    response.set_etag(artifact["etag"])
+    return response.make_conditional(flask.request)
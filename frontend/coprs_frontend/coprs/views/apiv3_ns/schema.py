@@ -286,11 +286,18 @@ order_type_field = String(
     example="DESC",
 )
 
+cursor_field = String(
+    description=("Opt-in keyset pagination, empty for the first page, or the "
+                 "opaque 'next' value from the previous page meta"),
+    example="",
+)
+
 pagination_schema = {
     "limit_field": limit_field,
     "offset_field": offset_field,
     "order_field": order_field,
     "order_type_field": order_type_field,
+    "cursor_field": cursor_field,
 }
 
 pagination_model = api.model("Pagination", pagination_schema)
@@ -3,7 +3,8 @@ from copr_common.enums import StatusEnum, ActionTypeEnum
 from coprs import db, app
 from coprs import models
 from coprs.logic import actions_logic
-from coprs.logic.builds_logic import BuildsLogic
+from coprs.logic.builds_logic import BuildsLogic, PendingTasksLogic
+from coprs.logic.batches_logic import BatchesLogic
 from coprs.logic.complex_logic import ComplexLogic, BuildConfigLogic
 from coprs.logic.coprs_logic import CoprChrootsLogic, MockChrootsLogic
 from coprs.exceptions import CoprHttpException, ObjectNotFound
@@ -21,7 +22,7 @@ def send_frontend_version(response):
     setup the version according to our needs.
     For the backend counterpart, see the `MIN_FE_BE_API` constant.
     """
-    response.headers['Copr-FE-BE-API-Version'] = '6'
+    response.headers['Copr-FE-BE-API-Version'] = '8'
     return response
 
 
@@ -322,40 +323,82 @@ def pending_action_count():
     return flask.jsonify(actions_logic.ActionsLogic.get_waiting().count())
 
 
+def _pending_jobs_records(build_ids=None):
+    """
+    Generate the Backend's pending-jobs queue records, optionally only those
+    belonging to the BUILD_IDS list.
+    """
+    if PendingTasksLogic.enabled():
+        for task in PendingTasksLogic.get_queue(build_ids):
+            yield task.to_backend_dict()
+        return
+
+    # resolve all the batches at once, instead of per-build Build.blocked
+    blocked = BatchesLogic.build_blocked_checker()
+
+    def _filtered(query):
+        if build_ids is None:
+            yield from query
+            return
+        # don't hit the DB limits for the number of query parameters
+        for start in range(0, len(build_ids), 500):
+            chunk = build_ids[start:start+500]
+            yield from query.filter(models.Build.id.in_(chunk))
+
+    args = {"data_type": "for_backend"}
+
+    app.logger.info("Generating SRPM builds")
+    for build in _filtered(BuildsLogic.get_pending_srpm_build_tasks(**args)):
+        if blocked(build):
+            continue
+        record = get_srpm_build_record(build, for_backend=True)
+        yield record
+
+    app.logger.info("Generating RPM builds")
+    for build_chroot in _filtered(BuildsLogic.get_pending_build_tasks(**args)):
+        if blocked(build_chroot.build):
+            continue
+        record = get_build_record(build_chroot, for_backend=True)
+        yield record
+
+
 @backend_ns.route("/pending-jobs/")
 def pending_jobs():
     """
     Return the job queue.
     """
+    return streamed_json(_pending_jobs_records())
 
-    # This code is really expensive, and takes a long time when there is a large
-    # build queue.  We want to avoid repeated reload of models.Batch data, and
-    # for that we need to have it strongly referenced.
-    cache = set()
-
-    def build_ready(build):
-        """ Is the build blocked? """
-        cache.add(build.batch)
-        return not build.blocked
-
-    def _stream():
-        args = {"data_type": "for_backend"}
 
-        app.logger.info("Generating SRPM builds")
-        for build in BuildsLogic.get_pending_srpm_build_tasks(**args):
-            if not build_ready(build):
-                continue
-            record = get_srpm_build_record(build, for_backend=True)
-            yield record
+@backend_ns.route("/pending-jobs/cursor/")
+def pending_jobs_cursor():
+    """
+    Return the current cursor for the /pending-jobs/delta/ route.  Backend is
+    supposed to first get the cursor, and then the full /pending-jobs/ queue.
+    """
+    return flask.jsonify({"cursor": BuildsLogic.get_pending_jobs_cursor()})
 
-        app.logger.info("Generating RPM builds")
-        for build_chroot in BuildsLogic.get_pending_build_tasks(**args):
-            if not build_ready(build_chroot.build):
-                continue
-            record = get_build_record(build_chroot, for_backend=True)
-            yield record
 
-    return streamed_json(_stream())
+@backend_ns.route("/pending-jobs/delta/<int:cursor>/")
+def pending_jobs_delta(cursor):
+    """
+    Return the changes in the job queue since CURSOR.  Backend is supposed to
+    drop all the tasks belonging to the listed "builds", and replace them with
+    the listed "tasks".  The "full" field is set to True if the changes are not
+    available for the given cursor, and Backend needs to re-load the whole
+    /pending-jobs/ queue.
+    """
+    changes = BuildsLogic.get_pending_jobs_changes(cursor)
+    if changes is None:
+        return flask.jsonify({"full": True})
+
+    new_cursor, build_ids = changes
+    return flask.jsonify({
+        "full": False,
+        "cursor": new_cursor,
+        "builds": build_ids,
+        "tasks": list(_pending_jobs_records(build_ids)),
+    })
 
 
 @backend_ns.route("/get-build-task/<task_id>/")
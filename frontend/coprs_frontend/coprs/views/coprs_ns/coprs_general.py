@@ -21,7 +21,6 @@ from pygments.lexers import get_lexer_by_name
 from pygments.formatters import HtmlFormatter
 
 from coprs import app
-from coprs import cache
 from coprs import db
 from coprs import exceptions
 from coprs import forms
@@ -33,7 +32,11 @@ from coprs.logic.stat_logic import CounterStatLogic
 from coprs.logic.modules_logic import ModulesLogic, ModulemdGenerator, ModuleBuildFacade
 from coprs.mail import send_mail, LegalFlagMessage, PermissionRequestMessage, PermissionChangeMessage
 
-from coprs.logic.complex_logic import ComplexLogic, ReposLogic
+from coprs.logic.complex_logic import (
+    ComplexLogic,
+    RepoArtifactsCache,
+    ReposLogic,
+)
 from coprs.logic.outdated_chroots_logic import OutdatedChrootsLogic
 
 from coprs.views.misc import (
@@ -876,8 +879,35 @@ def _render_external_repo_template(dep, copr_dir, mock_chroot, dep_idx):
                                  url=baseurl) + "\n"
 
 
-@cache.memoize(timeout=5*60)
 def render_generate_repo_file(copr_dir, name_release, arch=None):
+    """
+    Return the (pre-rendered, see RepoArtifactsCache) repo file, count the
+    download.
+    """
+    artifact = RepoArtifactsCache.get(
+        copr_dir.copr,
+        "repo_{0}_{1}_{2}".format(copr_dir.id, name_release, arch),
+        lambda: _render_repo_file(copr_dir, name_release, arch),
+    )
+
+    response = flask.make_response(artifact["content"])
+    response.mimetype = "text/plain"
+    response.headers["Content-Disposition"] = \
+        "filename={0}.repo".format(copr_dir.repo_name)
+
+    name = helpers.get_stat_name(
+        CounterStatType.REPO_DL,
+        copr_dir=copr_dir,
+        name_release=artifact["name_release"],
+    )
+    CounterStatLogic.incr(name=name, counter_type=CounterStatType.REPO_DL)
+    db.session.commit()
+
+    response.set_etag(artifact["etag"])
+    return response.make_conditional(flask.request)
+
+
+def _render_repo_file(copr_dir, name_release, arch):
     copr = copr_dir.copr
 
     # redirect the aliased chroot only if it is not enabled yet
@@ -957,21 +987,7 @@ def render_generate_repo_file(copr_dir, name_release, arch=None):
             "on a Copr project {0} but that doesn't exist.".format(dep[7:])
         )
 
-    response = flask.make_response(response_content)
-
-    response.mimetype = "text/plain"
-    response.headers["Content-Disposition"] = \
-        "filename={0}.repo".format(copr_dir.repo_name)
-
-    name = helpers.get_stat_name(
-        CounterStatType.REPO_DL,
-        copr_dir=copr_dir,
-        name_release=name_release,
-    )
-    CounterStatLogic.incr(name=name, counter_type=CounterStatType.REPO_DL)
-    db.session.commit()
-
-    return response
+    return {"content": response_content, "name_release": name_release}
 
 
 #########################################################
@@ -9,6 +9,7 @@ from coprs.logic import batches_logic
 from coprs.logic import builds_logic
 from coprs.logic import complex_logic
 from coprs import cache
+from coprs import models
 
 PENDING_ALL_CACHE_SECONDS = 2*60
 
@@ -43,8 +44,6 @@ def pending_all():
     # Get "for_backend" type of data, which are much cheaper to get.  This page
     # is for admins, to analyze the build queue (to allow us to understand best
     # what backend sees).
-    rpm_tasks = builds_logic.BuildsLogic.get_pending_build_tasks(data_type="overview")
-
     owner_stats = Counter()
     owner_substats = defaultdict(lambda: {
         "projects": Counter(),
@@ -67,22 +66,18 @@ def pending_all():
         background_stats[background] += 1
 
 
-    for task in rpm_tasks:
-        _calc_task(
-            task.build.copr.owner.name,
-            task.build.copr.full_name,
-            task.mock_chroot.name,
-            task.build.is_background,
-        )
-
-    srpm_tasks = builds_logic.BuildsLogic.get_pending_srpm_build_tasks(data_type="overview").all()
-    for task in srpm_tasks:
-        _calc_task(
-            task.copr.owner.name,
-            task.copr.full_name,
-            "srpm-builds",
-            task.is_background,
-        )
+    if builds_logic.PendingTasksLogic.enabled():
+        pending_tasks = models.PendingTask.query.filter(
+            models.PendingTask.status == StatusEnum("pending"))
+        for task in pending_tasks:
+            _calc_task(
+                task.project_owner.lstrip("@"),
+                task.project,
+                "srpm-builds" if task.srpm else task.chroot,
+                task.background,
+            )
+    else:
+        _calc_tasks_from_builds(_calc_task)
 
     calculated_stats = {
         "owners": owner_stats,
@@ -100,6 +95,30 @@ def pending_all():
     )
 
 
+def _calc_tasks_from_builds(calc_task):
+    """
+    Call CALC_TASK for each pending SRPM and RPM build task, data are taken
+    directly from the Build and BuildChroot tables.
+    """
+    rpm_tasks = builds_logic.BuildsLogic.get_pending_build_tasks(data_type="overview")
+    for task in rpm_tasks:
+        calc_task(
+            task.build.copr.owner.name,
+            task.build.copr.full_name,
+            task.mock_chroot.name,
+            task.build.is_background,
+        )
+
+    srpm_tasks = builds_logic.BuildsLogic.get_pending_srpm_build_tasks(data_type="overview").all()
+    for task in srpm_tasks:
+        calc_task(
+            task.copr.owner.name,
+            task.copr.full_name,
+            "srpm-builds",
+            task.is_background,
+        )
+
+
 @status_ns.route("/running/")
 def running():
     rpm_tasks = builds_logic.BuildsLogic.get_build_tasks(StatusEnum("running")).all()
@@ -33,6 +33,9 @@ import commands.fail_build
 import commands.rawhide_to_release
 import commands.update_graphs
 import commands.vacuum_graphs
+import commands.vacuum_pending_jobs_changes
+import commands.rebuild_pending_tasks
+import commands.check_pending_tasks
 import commands.notify_outdated_chroots
 import commands.delete_outdated_chroots
 import commands.clean_expired_projects
@@ -87,6 +90,9 @@ commands_list =	[
     "rawhide_to_release",
     "update_graphs",
     "vacuum_graphs",
+    "vacuum_pending_jobs_changes",
+    "rebuild_pending_tasks",
+    "check_pending_tasks",
     "notify_outdated_chroots",
     "delete_outdated_chroots",
     "clean_expired_projects",
@@ -71,7 +71,8 @@ class ScmPackage(object):
             .filter(models.Copr.deleted.is_(False)) \
             .filter(models.Package.source_type.in_(SUPPORTED_SOURCE_TYPES)) \
             .filter(models.Package.webhook_rebuild) \
-            .filter(models.Package.source_json.ilike('%' + clone_url + '%'))
+            .filter(models.Package.clone_url_key ==
+                    helpers.git_url_lookup_key(clone_url))
 
         return [ScmPackage(row) for row in rows]
 
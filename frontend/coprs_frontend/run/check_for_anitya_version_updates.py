@@ -1,6 +1,7 @@
 #!/usr/bin/python3
 
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 import sys
 import os
 import json
@@ -33,8 +34,17 @@ def _get_parser():
 
     parser.add_argument('--backend', action='store', default='pypi', choices=['pypi', 'rubygems'],
                        help='only check for updates from backend BACKEND, default pypi')
-    parser.add_argument('--delta', action='store', type=int, metavar='SECONDS', default=86400,
-                       help='ignore updates older than SECONDS, default 86400')
+    parser.add_argument('--delta', action='store', type=int, metavar='SECONDS', default=None,
+                       help='ignore updates older than SECONDS, and ignore the '
+                            'saved high-water mark; by default only the updates '
+                            'since the last run are processed (or the last '
+                            '86400 seconds for the first run)')
+    parser.add_argument('--state-file', action='store', metavar='PATH', default=None,
+                       help='where the high-water mark (timestamp of the last '
+                            'processed update) is stored, default '
+                            'DATA_DIR/anitya-BACKEND.json')
+    parser.add_argument('--workers', action='store', type=int, default=4,
+                       help='number of datagrepper pages fetched concurrently, default 4')
     parser.add_argument('-v', '--version', action='version', version='1.0',
                        help='print program version and exit')
     return parser
@@ -45,20 +55,55 @@ def _get_json(url):
     return requestor.get(url).json()
 
 
-def get_updates_messages(delta):
-    url_template = 'https://apps.fedoraproject.org/datagrepper/raw?category=anitya&delta={delta}&topic=org.release-monitoring.prod.anitya.project.version.update&rows_per_page=64&order=asc&page={page}'
-    url = url_template.format(delta=delta, page=1)
+DEFAULT_DELTA = 86400
+
+
+def get_updates_messages(delta=None, start=None, workers=4):
+    """
+    Download all the anitya update messages from datagrepper, either not older
+    than DELTA seconds, or since the START timestamp.  The first page tells us
+    the number of pages, the rest is downloaded concurrently.
+    """
+    url_template = 'https://apps.fedoraproject.org/datagrepper/raw?category=anitya&{since}&topic=org.release-monitoring.prod.anitya.project.version.update&rows_per_page=64&order=asc&page={page}'
+    since = "start={0}".format(start) if start else "delta={0}".format(delta)
+    url = url_template.format(since=since, page=1)
     result_json = _get_json(url)
     messages = result_json['raw_messages']
     pages = result_json['pages']
 
-    for p in range(2, pages+1):
-        url = url_template.format(delta=delta, page=p)
-        result_json = _get_json(url)
-        messages += result_json['raw_messages']
+    urls = [url_template.format(since=since, page=p)
+            for p in range(2, pages+1)]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # map() keeps the order of pages
+        for result_json in executor.map(_get_json, urls):
+            messages += result_json['raw_messages']
 
     return messages
 
+
+def load_high_water_mark(state_file):
+    """
+    Return the timestamp of the last processed update message, or None
+    """
+    try:
+        with open(state_file, "r", encoding="utf-8") as fd:
+            return json.load(fd)["timestamp"]
+    except FileNotFoundError:
+        return None
+    except (ValueError, KeyError) as err:
+        log.error("Ignoring the corrupted %s file: %s", state_file, err)
+        return None
+
+
+def save_high_water_mark(state_file, timestamp):
+    """
+    Atomically store the timestamp of the last processed update message
+    """
+    tmp_file = state_file + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as fd:
+        json.dump({"timestamp": timestamp}, fd)
+    os.replace(tmp_file, state_file)
+
 def get_updated_packages(updates_messages, backend):
     updated_packages = {}
     for message in updates_messages:
@@ -176,18 +221,19 @@ def is_stable_release(version: str) -> bool:
             return False
     return True
 
-def main():
-    args = _get_parser().parse_args()
-    backend = args.backend.lower()
-    updated_packages = get_updated_packages(get_updates_messages(args.delta), backend)
-    log.info("Updated packages per datagrepper %s", len(updated_packages))
+def rebuild_updated_packages(backend, updated_packages):
+    """
+    Submit builds for the webhook-enabled packages matching UPDATED_PACKAGES
+    (name => version dict).
+    """
     for package, last_build in PackagesLogic.webhook_package_candidates(
-            helpers.BuildSourceEnum(args.backend.lower())):
+            helpers.BuildSourceEnum(backend),
+            upstream_names=list(updated_packages)):
         source_json = json.loads(package.source_json)
         rebuilder = package_from_source(backend, source_json)
         log.debug(
             "candidate %s package %s in %s",
-            args.backend,
+            backend,
             rebuilder.name,
             package.copr.full_name,
         )
@@ -235,6 +281,31 @@ def main():
 
     db.session.commit()
 
+
+def main():
+    args = _get_parser().parse_args()
+    backend = args.backend.lower()
+
+    state_file = args.state_file or os.path.join(
+        app.config["DATA_DIR"], "anitya-{0}.json".format(backend))
+    start = None
+    delta = args.delta
+    if delta is None:
+        start = load_high_water_mark(state_file)
+        if start is None:
+            delta = DEFAULT_DELTA
+
+    messages = get_updates_messages(delta, start, args.workers)
+    updated_packages = get_updated_packages(messages, backend)
+    log.info("Updated packages per datagrepper %s", len(updated_packages))
+    if updated_packages:
+        rebuild_updated_packages(backend, updated_packages)
+
+    if messages:
+        # datagrepper's start= is inclusive, so the last message is going to be
+        # re-checked next time (no-op, the version is already being built)
+        save_high_water_mark(state_file, max(m["timestamp"] for m in messages))
+
 if __name__ == '__main__':
     try:
         main()
@@ -9,6 +9,7 @@ import datetime
 import uuid
 
 import pytest
+import sqlalchemy
 from sqlalchemy import desc
 import decorator
 
@@ -89,6 +90,23 @@ class CoprsTestCase(object):
         cache.clear()
         self.context.pop()
 
+    @staticmethod
+    @contextmanager
+    def count_queries():
+        """
+        Count the SQL statements executed within the context, yields the list
+        of them
+        """
+        queries = []
+        def _count(_conn, _cursor, statement, *_args):
+            queries.append(statement)
+        engine = coprs.db.engine
+        sqlalchemy.event.listen(engine, "before_cursor_execute", _count)
+        try:
+            yield queries
+        finally:
+            sqlalchemy.event.remove(engine, "before_cursor_execute", _count)
+
     @staticmethod
     def load_test_data_file(filename):
         """
@@ -12,13 +12,14 @@ def run_patched_main(args, messages):
         with mock.patch("check_for_anitya_version_updates.log", app.logger):
             with mock.patch("check_for_anitya_version_updates._get_json") as get_json:
                 get_json.return_value = messages
-                return main()
+                main()
+                return get_json
 
 
 class TestAnitya(CoprsTestCase):
     @TransactionDecorator("u1")
     @pytest.mark.usefixtures("f_users", "f_users_api", "f_mock_chroots", "f_db")
-    def test_pypi(self):
+    def test_pypi(self, tmp_path):
         contents = self.load_test_data_file("anytia.json")
         messages = json.loads(contents)
         chroots = ["fedora-rawhide-i386"]
@@ -77,10 +78,23 @@ class TestAnitya(CoprsTestCase):
         self.api3.create_pypi_package("bar", "zod",
                                       options={"webhook_rebuild": True})
 
-        run_patched_main(["anitya", "--backend", "pypi", "--delta", "100"], messages)
+        state_file = str(tmp_path / "anitya.json")
+        run_patched_main(["anitya", "--backend", "pypi", "--delta", "100",
+                          "--state-file", state_file], messages)
 
         builds = models.Build.query.all()
         assert len(builds) == 11
+
+        # the high-water mark is the last message timestamp
+        with open(state_file, "r", encoding="utf-8") as fd:
+            assert json.load(fd) == {"timestamp": 1674492355.0}
+
+        # the next run continues from the high-water mark, and the same
+        # updates don't trigger any new builds
+        get_json = run_patched_main(["anitya", "--backend", "pypi",
+                                     "--state-file", state_file], messages)
+        assert "start=1674492355.0&" in get_json.call_args[0][0]
+        assert len(models.Build.query.all()) == 11
         for build in builds:
             if build.state == "succeeded":
                 continue  # the first two builds
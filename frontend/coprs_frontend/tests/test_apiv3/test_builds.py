@@ -170,6 +170,51 @@ class TestAPIv3Builds(CoprsTestCase):
         for error in errors:
             assert error in error_message
 
+    @pytest.mark.usefixtures("f_users", "f_coprs", "f_mock_chroots",
+                             "f_builds", "f_db")
+    def test_v3_build_list_status(self):
+        builds = [b for b in self.basic_builds if b.copr == self.c1]
+        endpoint = "/api_3/build/list/?ownername=user1&projectname=foocopr"
+        response = self.tc.get(endpoint)
+        assert {b["id"] for b in response.json["items"]} == \
+            {b.id for b in builds}
+
+        for state in ["succeeded", "importing", "failed", "unknown", "foo"]:
+            response = self.tc.get(endpoint + "&status=" + state)
+            assert response.status_code == 200
+            assert {b["id"] for b in response.json["items"]} == \
+                {b.id for b in builds if b.state == state}
+
+        # the limit applies to the filtered builds
+        response = self.tc.get(endpoint + "&status=succeeded&limit=1")
+        assert len(response.json["items"]) <= 1
+
+    @pytest.mark.usefixtures("f_users", "f_coprs", "f_mock_chroots",
+                             "f_builds", "f_db")
+    @pytest.mark.parametrize("order_type", ["ASC", "DESC"])
+    def test_v3_build_list_cursor(self, order_type):
+        expected = sorted([b.id for b in self.basic_builds if b.copr == self.c1],
+                          reverse=order_type == "DESC")
+        endpoint = ("/api_3/build/list/?ownername=user1&projectname=foocopr"
+                    "&limit=1&order_type=" + order_type)
+
+        ids = []
+        cursor = ""
+        while cursor is not None:
+            response = self.tc.get(endpoint + "&cursor=" + cursor)
+            assert response.status_code == 200
+            ids.extend(b["id"] for b in response.json["items"])
+            cursor = response.json["meta"]["next"]
+        assert ids == expected
+
+        # offset pagination doesn't report the cursor
+        response = self.tc.get(endpoint)
+        assert "next" not in response.json["meta"]
+
+        for params in ["&cursor=foo", "&cursor=&order=submitted_on"]:
+            response = self.tc.get(endpoint + params)
+            assert response.status_code == 400
+
     @pytest.mark.usefixtures("f_users", "f_users_api", "f_coprs",
                              "f_mock_chroots", "f_other_distgit", "f_db")
     def test_v3_get_build(self):
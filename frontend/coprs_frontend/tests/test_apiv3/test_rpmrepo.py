@@ -87,3 +87,33 @@ class TestApiRPMRepo(CoprsTestCase):
         for dirname in ['test', 'test:pr:11']:
             repodata = self.tc.get(f"/api_3/rpmrepo/user1/{dirname}/fedora-18/")
             assert repodata.json == DIRS
+
+    @pytest.mark.usefixtures("f_users", "f_coprs", "f_mock_chroots", "f_db")
+    def test_apiv3_rpmrepo_etag(self):
+        url = "/api_3/rpmrepo/{0}/{1}/fedora-18/".format(
+            self.u2.name, self.c3.name)
+        first = self.tc.get(url)
+        etag = first.headers["ETag"]
+        assert first.status_code == 200
+
+        again = self.tc.get(url, headers={"If-None-Match": etag})
+        assert again.status_code == 304
+        assert not again.data
+
+        # the project's dependency is renamed, so it doesn't exist anymore
+        self.c1.name = "renamed"
+        self.db.session.commit()
+        changed = self.tc.get(url, headers={"If-None-Match": etag})
+        assert changed.status_code == 200
+        assert changed.headers["ETag"] != etag
+        assert [dep["type"] for dep in changed.json["dependencies"]] \
+            == ["external_baseurl"]
+
+        # project settings changed
+        etag = changed.headers["ETag"]
+        self.c3.module_hotfixes = True
+        self.db.session.commit()
+        changed = self.tc.get(url, headers={"If-None-Match": etag})
+        assert changed.status_code == 200
+        assert changed.json["repos"]["fedora-18"]["arch"]["x86_64"]["opts"] \
+            == {"module_hotfixes": "1"}
@@ -151,27 +151,18 @@ class TestBatchesLogic(CoprsTestCase):
         #
         # 1. Get user1 info (for self.test_client).
         # 2. Large query for Source builds (get_pending_srpm_build_tasks).
-        # 3. Get info about Batch 1 - *expected* (even though it's in "finished"
-        #    state and is cached in Redis), this is triggered by lazy-loads from
-        #    accessing objects from query 1 => the source builds in the query
-        #    are from other batches (e.g. 3), but to check if Batch 3 is blocked
-        #    (already loaded) we have to check if Batch 2 is blocked (loaded)
-        #    and thus also if Batch 1 is blocked.  Because we ask for
-        #    'batch_1.blocked' it needs to be loaded **now** because it is not
-        #    yet (it is not loaded because all builds there are already
-        #    finished).
-        # 4. Read all builds (lazy) from Batch 2 to get Build statuses.  This is
-        #    the only Batch where we need to iterate through Builds (as there's
-        #    only one tree of batches).
-        # 5. Read BuildChroots (lazy) from ^^ to get statuses.
-        # 6. Large query for BuildChroots (get_pending_build_tasks).
+        # 3. Resolve the chains of batches the processing builds belong to
+        #    (recursive query, BatchesLogic.resolve_batches()).  This is
+        #    triggered by the first batched build in query 2.
+        # 4. Count the unfinished builds in all those batches at once.
+        # 5. Large query for BuildChroots (get_pending_build_tasks).
         #
         # The last batch (ID=2+more_bchs) contains one "ready" BuildChroot task
         # (the srpm upload emulation, see _prepare_project_with_batches()) which
-        # is only blocked by parent batch.  But because we cache Batch objects
-        # in pending_jobs() method - they are preloaded and we can be sure that
-        # we don't have to re-load the batch data to check if that is finished.
-        expected = 6
+        # is only blocked by parent batch.  But the batch states are resolved
+        # once per request, so we don't have to re-load the batch data to check
+        # if the parent is finished.
+        expected = 5
         if expected != len(dq):
             print()
             for n, query in enumerate(dq):
@@ -298,13 +289,11 @@ class TestBatchesLogic(CoprsTestCase):
         asserts = [
             sql_alchemy_time < fill_time/3*2,
             query_time < fill_time/20,
-            # - for each project two queries (for batch => one build +batch_build)
             # - two large queries (srpm + rpms)
+            # - two queries resolving the batch states, regardless of the
+            #   number of batches (BatchesLogic.resolve_batches())
             # - one query for self.tc initialization
-            # Note that we only lazily load first Build in each unblocked batch,
-            # because even that first Build in batch is not yet finished -
-            # meaning that the whole batch is not yet finished as well.
-            len(dq) == len(projects)*2 + 2 + 1,
+            len(dq) == 2 + 2 + 1,
         ]
 
         if not all(asserts):
@@ -315,3 +304,120 @@ class TestBatchesLogic(CoprsTestCase):
                 print("=== {} ===".format(n))
                 print(query)
             assert False
+
+    def test_resolve_batches(self):
+        self._prepare_project_with_batches(more=2)
+        self._succeed_first_batch()
+        batch_ids = [batch.id for batch in self.batches]
+        states = BatchesLogic.resolve_batches(batch_ids)
+        assert states == {
+            1: (False, True),
+            2: (False, False),
+            3: (True, False),
+            4: (True, False),
+        }
+        for batch in self.batches:
+            assert states[batch.id] == (batch.blocked, batch.finished)
+
+        # the finished batch has no processing build
+        assert BatchesLogic.blocked_batch_ids() == {3, 4}
+        # only a part of the chain
+        assert BatchesLogic.resolve_batches([2]) == {
+            1: (False, True),
+            2: (False, False),
+        }
+        assert BatchesLogic.resolve_batches([]) == {}
+
+        trees = BatchesLogic.pending_batch_trees()
+        assert len(trees) == 1
+        states = {node.name.id: node.state for node in trees[0].descendants}
+        states[trees[0].name.id] = trees[0].state
+        assert states == {1: "finished", 2: "processing", 3: "blocked",
+                          4: "blocked"}
+        resp = self.tc.get("/status/batches/")
+        assert resp.status_code == 200
+        assert "blocked" in resp.data.decode("utf-8")
+
+    def test_resolve_batches_build_states(self):
+        self._prepare_project_with_batches()
+        build_1, build_3 = self.batches[0].builds
+        # canceled build is finished, regardless of its chroots
+        build_1.canceled = True
+        # with build chroots, only the chroot states matter
+        build_3.source_status = StatusEnum("succeeded")
+        self.db.session.add(models.BuildChroot(
+            build=build_3, mock_chroot=self.mc1,
+            status=StatusEnum("succeeded")))
+        self.db.session.add(models.BuildChroot(
+            build=build_3, mock_chroot=self.mc2, status=None))
+        self.db.session.commit()
+        assert BatchesLogic.resolve_batches([1, 2]) == {
+            1: (False, False),
+            2: (True, False),
+        }
+
+        build_3.build_chroots[1].status = StatusEnum("failed")
+        self.db.session.commit()
+        assert BatchesLogic.resolve_batches([2]) == {
+            1: (False, True),
+            2: (False, False),
+        }
+        assert BatchesLogic.blocked_batch_ids() == set()
+
+
+
+class TestBatchesResolverQueries(CoprsTestCase):
+    batches = None
+
+    @pytest.fixture
+    def f_batch_chains(self, f_users, f_coprs, f_mock_chroots, f_db):
+        """
+        40 builds in 5 chains of batches (4 batches * 2 builds each).  In each
+        chain, the first batch is finished, the second one is processing, and
+        the rest is blocked.
+        """
+        _fixtures = f_users, f_coprs, f_mock_chroots, f_db
+        self.batches = []
+        for _chain in range(5):
+            parent = None
+            for _position in range(4):
+                parent = models.Batch(blocked_by=parent)
+                self.batches.append(parent)
+        self.db.session.add_all(self.batches)
+        self.db.session.flush()
+
+        builds = []
+        for index, batch in enumerate(self.batches):
+            first_in_chain = not index % 4
+            for _ in range(2):
+                builds.append(models.Build(
+                    copr_id=self.c1.id, copr_dir_id=self.c1_dir.id,
+                    user_id=self.u1.id, batch_id=batch.id,
+                    submitted_on=int(time.time()), canceled=False,
+                    source_status=StatusEnum("succeeded" if first_in_chain
+                                             else "pending"),
+                ))
+        self.db.session.bulk_save_objects(builds)
+        self.db.session.commit()
+
+    @pytest.mark.usefixtures("f_batch_chains")
+    def test_resolver_queries(self):
+        """
+        The set-based resolver gives the same results as the per-batch
+        Batch.blocked lookups, in two queries no matter how many batches
+        """
+        batch_ids = [batch.id for batch in self.batches]
+        self.db.session.expire_all()
+
+        with app.app_context():
+            states = BatchesLogic.resolve_batches()
+            assert len(get_debug_queries()) == 2
+
+        blocked = {batch_id for batch_id, state in states.items() if state[0]}
+        assert len(states) == 20
+        assert len(blocked) == 10
+
+        self.db.session.expire_all()
+        old_blocked = {batch.id for batch in models.Batch.query.filter(
+            models.Batch.id.in_(batch_ids)) if batch.blocked}
+        assert blocked == old_blocked
@@ -22,7 +22,9 @@ from coprs.exceptions import (ActionInProgressException,
 from coprs.logic.actions_logic import ActionsLogic
 from coprs.logic.builds_logic import (
     BuildsLogic,
+    BuildsMonitorLogic,
 )
+from coprs.logic.packages_logic import PackagesLogic
 
 from tests.coprs_test_case import CoprsTestCase, TransactionDecorator
 
@@ -638,3 +640,87 @@ class TestBuildsLogic(CoprsTestCase):
         build = models.Build.query.get(1)
         assert build.source_state == "succeeded"
         assert not os.path.exists(storage)
+
+
+class TestLatestBuildChroots(CoprsTestCase):
+    """ The LatestBuildChroot pointers, and the monitor queries using them """
+
+    @pytest.fixture
+    def f_foreign_keys(self):
+        """
+        Enforce the foreign keys in SQLite (the ON DELETE CASCADE rules), as
+        PostgreSQL does.  The in-memory database uses just one connection.
+        """
+        def _pragma(value):
+            self.db.session.commit()
+            connection = self.db.engine.raw_connection()
+            connection.execute("PRAGMA foreign_keys={0}".format(value))
+            assert connection.execute(
+                "PRAGMA foreign_keys").fetchone()[0] == value
+            connection.close()
+
+        _pragma(1)
+        yield
+        self.db.session.rollback()
+        _pragma(0)
+
+    @staticmethod
+    def _pointers(package):
+        return {(lbch.mock_chroot_id, lbch.build_id)
+                for lbch in models.LatestBuildChroot.query.filter_by(
+                    package_id=package.id)}
+
+    @pytest.mark.usefixtures("f_users", "f_coprs", "f_mock_chroots", "f_builds",
+                             "f_db", "f_foreign_keys")
+    def test_latest_build_chroots_maintained(self):
+        chroot_ids = [mch.id for mch in self.c1.active_chroots]
+        assert self._pointers(self.p1) == {(mch_id, self.b2.id)
+                                           for mch_id in chroot_ids}
+
+        monitor = list(BuildsMonitorLogic.package_build_chroots(self.c1_dir))
+        assert [pkg["name"] for pkg in monitor] == ["hello-world"]
+        assert monitor[0]["chroots"] == self.b2_bc
+
+        packages = PackagesLogic.get_packages_with_latest_builds_for_dir(
+            self.c1_dir, packages=[self.p1])
+        assert packages[0].latest_build.status == self.b2.status
+
+        # newer build
+        build = models.Build(
+            copr=self.c1, copr_dir=self.c1_dir, package=self.p1, user=self.u1,
+            submitted_on=100, source_status=StatusEnum("succeeded"))
+        self.db.session.add(models.BuildChroot(
+            build=build, mock_chroot=self.c1.active_chroots[0]))
+        self.db.session.commit()
+        assert self._pointers(self.p1) == {(chroot_ids[0], build.id)} | {
+            (mch_id, self.b2.id) for mch_id in chroot_ids[1:]}
+
+        # fallback to the older builds upon removal
+        self.db.session.delete(build)
+        self.db.session.delete(self.b2)
+        self.db.session.commit()
+        assert self._pointers(self.p1) == {(mch_id, self.b1.id)
+                                           for mch_id in chroot_ids}
+
+        # just one build chroot removed
+        self.db.session.delete(self.b1.build_chroots[0])
+        self.db.session.commit()
+        chroot_ids = [bch.mock_chroot_id for bch in self.b1.build_chroots]
+        assert self._pointers(self.p1) == {(mch_id, self.b1.id)
+                                           for mch_id in chroot_ids}
+
+        # the build is re-assigned to a different package
+        self.b1.package = self.p3
+        self.db.session.commit()
+        assert self._pointers(self.p1) == set()
+        assert self._pointers(self.p3) == {(mch_id, self.b1.id)
+                                           for mch_id in chroot_ids}
+
+    @pytest.mark.usefixtures("f_users", "f_coprs", "f_mock_chroots", "f_builds",
+                             "f_db")
+    def test_monitor_data(self):
+        pagination = BuildsMonitorLogic.get_monitor_data(self.c2)
+        package = pagination.items[0]
+        assert package.name == "whatsupthere-world"
+        assert [bch.build_id for bch in package.latest_build_chroots] == \
+            [self.b4.id] * len(self.c2.active_chroots)
@@ -4,8 +4,9 @@ from unittest import mock
 
 import flask
 import pytest
+from flask_caching.backends import SimpleCache
 
-from coprs import models, helpers
+from coprs import cache, db, models, helpers
 from copr_common.enums import ActionTypeEnum
 from coprs.logic.actions_logic import ActionsLogic
 from coprs.logic.complex_logic import (
@@ -13,6 +14,7 @@ from coprs.logic.complex_logic import (
     ComplexLogic,
     ProjectForking,
     ReposLogic,
+    RuntimeDependenciesCache,
 )
 from coprs.logic.coprs_logic import CoprChrootsLogic
 from tests.coprs_test_case import (
@@ -266,6 +268,84 @@ class TestProjectForking(CoprsTestCase):
         assert len(build_config["repos"]) == 2
         assert build_config["repos"][1]["id"] == "copr_non_existing"
 
+
+class TestRuntimeDependencies(CoprsTestCase):
+    GRAPH_SIZE = 50
+
+    @pytest.fixture
+    def f_simple_cache(self):
+        """ In-process cache backend, so the test doesn't need Redis """
+        extensions = self.app.extensions["cache"]
+        original = extensions[cache]
+        extensions[cache] = SimpleCache()
+        yield
+        extensions[cache] = original
+
+    def _create_graph(self):
+        """
+        Create GRAPH_SIZE projects, "dep-N" depends on "dep-(2N+1)" and
+        "dep-(2N+2)" (a binary tree), the leaves have an external dependency,
+        and "dep-0" also depends on a non-existing project.
+        """
+        public, private = [], []
+        for i in range(self.GRAPH_SIZE):
+            deps = ["copr://user1/dep-{0}".format(child)
+                    for child in [2*i + 1, 2*i + 2] if child < self.GRAPH_SIZE]
+            if not deps:
+                deps = ["https://example.com/dep-{0}/".format(i)]
+            if i == 0:
+                deps.append("copr://user1/non-existing")
+            public.append({"id": 1000 + i, "name": "dep-{0}".format(i),
+                           "user_id": self.u1.id,
+                           "runtime_dependencies": " ".join(deps)})
+            private.append({"copr_id": 1000 + i})
+        # pylint: disable=protected-access
+        db.session.execute(models._CoprPublic.__table__.insert(), public)
+        db.session.execute(models._CoprPrivate.__table__.insert(), private)
+        db.session.commit()
+
+    @pytest.mark.usefixtures("f_simple_cache", "f_users", "f_db")
+    def test_transitive_runtime_dependencies_cache(self):
+        self._create_graph()
+        root = models.Copr.query.get(1000)
+        get_deps = ComplexLogic.get_transitive_runtime_dependencies
+
+        with self.count_queries() as cold:
+            internal, external, non_existing = get_deps(root)
+        assert len(internal) == self.GRAPH_SIZE - 1
+        assert len(external) == (self.GRAPH_SIZE + 1) // 2
+        assert non_existing == ["copr://user1/non-existing"]
+        assert len(cold) >= self.GRAPH_SIZE
+
+        # the closure is cached, only the internal projects are loaded
+        with self.count_queries() as warm:
+            internal2, external2, non_existing2 = get_deps(root)
+        assert len(warm) <= 1
+        assert internal2 == internal
+        assert external2 == external
+        assert non_existing2 == non_existing
+
+        # an uncommitted change doesn't invalidate the cache
+        leaf = models.Copr.query.get(1000 + self.GRAPH_SIZE - 1)
+        leaf.runtime_dependencies = "copr://user1/dep-0"
+        db.session.flush()
+        generation, closure = RuntimeDependenciesCache.get(root.id)
+        assert closure is not None
+
+        db.session.commit()
+        assert RuntimeDependenciesCache.get(root.id)[0] != generation
+        internal, external, _ = get_deps(root)
+        assert len(internal) == self.GRAPH_SIZE - 1
+        assert len(external) == self.GRAPH_SIZE // 2 - 1
+
+        # renaming a project invalidates the closures, too
+        models.Copr.query.get(1001).name = "renamed"
+        db.session.commit()
+        internal, _, non_existing = get_deps(root)
+        assert len(internal) < self.GRAPH_SIZE // 2
+        assert "copr://user1/dep-1" in non_existing
+
+
 class FooModel(object):
     """
     Mocks SqlAlchemy db.Model
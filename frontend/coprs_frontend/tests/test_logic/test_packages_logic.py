@@ -1,5 +1,10 @@
+import json
+
 import pytest
+from sqlalchemy import inspect
 
+from copr_common.enums import BuildSourceEnum, StatusEnum
+from coprs import models
 from coprs.logic.packages_logic import PackagesLogic
 
 from tests.coprs_test_case import CoprsTestCase
@@ -14,6 +19,24 @@ class TestPackagesLogic(CoprsTestCase):
         assert builds_p5 == {self.b10: [self.b10_bc[0]],
                              self.b11: [self.b11_bc[1]]}
 
+    @pytest.mark.usefixtures("f_users", "f_coprs", "f_mock_chroots",
+                             "f_builds", "f_db")
+    def test_latest_build_without_chroots(self):
+        # e.g. an SRPM build that is still running
+        build = models.Build(
+            copr=self.c1, copr_dir=self.c1_dir, package=self.p1,
+            user=self.u1, submitted_on=60,
+            source_status=StatusEnum("running"))
+        self.db.session.add(build)
+        self.db.session.commit()
+        assert build.build_chroots == []
+
+        packages = PackagesLogic.get_packages_with_latest_builds_for_dir(
+            self.c1_dir)
+        assert [p.name for p in packages] == ["hello-world"]
+        assert packages[0].latest_build.submitted_on == 60
+        assert packages[0].latest_build.status == StatusEnum("running")
+
     @staticmethod
     @pytest.mark.parametrize(
         "ref, copr_pkg_name, result",
@@ -38,3 +61,26 @@ class TestPackagesLogic(CoprsTestCase):
     def test_ref_matches_copr_pkgname(ref, copr_pkg_name, result):
         # pylint: disable-next=protected-access
         assert PackagesLogic._ref_matches_copr_pkgname(ref, copr_pkg_name) == result
+
+    @pytest.mark.usefixtures("f_users", "f_coprs", "f_db")
+    def test_lookup_columns_maintained(self):
+        package = models.Package(
+            copr=self.c1, name="foo", source_type=BuildSourceEnum("scm"),
+            source_json=json.dumps({"clone_url": "https://GitHub.com/u/foo.git/"}))
+        self.db.session.add(package)
+        self.db.session.commit()
+        assert package.clone_url_key == "github.com/u/foo"
+        assert package.upstream_name is None
+
+        # loaded for the search indexer's on_commit hook
+        assert package.copr == self.c1
+        package.source_type = BuildSourceEnum("pypi")
+        package.source_json = json.dumps({"pypi_package_name": "Foo"})
+        self.db.session.commit()
+        assert package.clone_url_key is None
+        assert package.upstream_name == "foo"
+
+        # the look-up columns are indexed
+        indexes = {index["name"]: index["column_names"] for index
+                   in inspect(self.db.engine).get_indexes("package")}
+        assert indexes["ix_package_clone_url_key"] == ["clone_url_key"]
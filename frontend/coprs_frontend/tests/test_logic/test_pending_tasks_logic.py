@@ -0,0 +1,153 @@
+"""
+Tests for the materialized build queue (PendingTasksLogic)
+"""
+
+import json
+from unittest import mock
+
+import pytest
+from flask_sqlalchemy import get_debug_queries
+
+from copr_common.enums import StatusEnum
+from coprs import app, models
+from coprs.logic.builds_logic import PendingTasksLogic
+from coprs.logic.complex_logic import ComplexLogic
+from tests.coprs_test_case import CoprsTestCase
+
+
+class TestPendingTasksLogic(CoprsTestCase):
+    """ The PENDING_TASKS_MATERIALIZED mode """
+
+    @pytest.fixture(name="f_materialized")
+    def fixture_materialized(self):
+        """ Enable the PendingTask table """
+        with mock.patch.dict(app.config,
+                             {"PENDING_TASKS_MATERIALIZED": True}):
+            yield
+
+    def _pending_jobs(self, materialized=True):
+        with mock.patch.dict(app.config,
+                             {"PENDING_TASKS_MATERIALIZED": materialized}):
+            data = json.loads(self.tc.get("/backend/pending-jobs/").data)
+        for task in data:
+            # random for builds without known submitter
+            task.pop("sandbox")
+        # the order of tasks within one build is not guaranteed
+        return sorted(data, key=lambda task: (task["build_id"], task["task_id"]))
+
+    def _make_pending(self):
+        self.b2.source_status = StatusEnum("pending")
+        self.b2.is_background = True
+        for bch in self.b3_bc:
+            bch.status = StatusEnum("pending")
+        self.b4_bc[0].status = StatusEnum("running")
+        self.mc2.tags_raw = "foo bar"
+        self.db.session.commit()
+
+    @pytest.mark.usefixtures("f_users", "f_coprs", "f_mock_chroots", "f_builds",
+                             "f_db")
+    def test_rebuild(self):
+        self._make_pending()
+        assert models.PendingTask.query.count() == 0
+        assert PendingTasksLogic.rebuild() == 4
+        self.db.session.commit()
+        assert PendingTasksLogic.check() == []
+        assert self._pending_jobs() == self._pending_jobs(materialized=False)
+
+    @pytest.mark.usefixtures("f_users", "f_coprs", "f_mock_chroots", "f_builds",
+                             "f_db", "f_materialized")
+    def test_maintained_on_commit(self):
+        self._make_pending()
+        assert PendingTasksLogic.check() == []
+        assert self._pending_jobs() == self._pending_jobs(materialized=False)
+        assert models.PendingTask.query.count() == 4
+
+        self.b3.canceled = True
+        self.b4_bc[0].status = StatusEnum("succeeded")
+        self.db.session.commit()
+        assert PendingTasksLogic.check() == []
+        assert [task.task_id for task in models.PendingTask.query] == ["2"]
+
+        # rolled-back changes are not reflected
+        self.b4_bc[0].status = StatusEnum("pending")
+        self.db.session.flush()
+        self.db.session.rollback()
+        self.b2.source_status = StatusEnum("failed")
+        self.db.session.commit()
+        assert models.PendingTask.query.count() == 0
+        assert PendingTasksLogic.check() == []
+
+    @pytest.mark.usefixtures("f_users", "f_coprs", "f_mock_chroots", "f_builds",
+                             "f_batches", "f_db", "f_materialized")
+    def test_unblocked_batch(self):
+        self.b2.batch = self.batch2
+        self.b3.batch = self.batch3
+        self.batch3.blocked_by = self.batch2
+        self.b2.source_status = StatusEnum("running")
+        for bch in self.b3_bc:
+            bch.status = StatusEnum("pending")
+        self.db.session.commit()
+
+        assert PendingTasksLogic.check() == []
+        assert [task.task_id for task in PendingTasksLogic.get_queue()] == ["2"]
+        assert models.PendingTask.query.filter_by(blocked=True).count() == 2
+
+        self.b2.source_status = StatusEnum("succeeded")
+        for bch in self.b2_bc:
+            bch.status = StatusEnum("succeeded")
+        self.db.session.commit()
+        assert PendingTasksLogic.check() == []
+        assert {task.task_id for task in PendingTasksLogic.get_queue()} == {
+            "3-fedora-17-x86_64", "3-fedora-17-i386"}
+
+    @pytest.mark.usefixtures("f_users", "f_coprs", "f_mock_chroots", "f_builds",
+                             "f_db", "f_materialized")
+    def test_check(self):
+        self._make_pending()
+        models.PendingTask.query.filter_by(task_id="2").delete()
+        models.PendingTask.query.filter_by(task_id="4-fedora-17-x86_64").update(
+            {"status": StatusEnum("pending")})
+        self.db.session.add(models.PendingTask(
+            task_id="1", build_id=1, status=StatusEnum("pending"), srpm=True,
+            background=False, blocked=False, project_owner="user1",
+            project="user1/foocopr", sandbox="user1/foocopr--user1"))
+        self.db.session.commit()
+
+        problems = PendingTasksLogic.check()
+        assert len(problems) == 3
+        assert problems[0] == "Task 2 is missing"
+        assert problems[1].startswith("Task 4-fedora-17-x86_64 is outdated")
+        assert problems[2] == "Task 1 should be removed"
+
+        PendingTasksLogic.rebuild()
+        self.db.session.commit()
+        assert PendingTasksLogic.check() == []
+
+    @pytest.mark.usefixtures("f_users", "f_coprs", "f_mock_chroots", "f_builds",
+                             "f_db")
+    def test_queue_sizes(self):
+        self._make_pending()
+        expected = ComplexLogic.get_queue_sizes()
+        assert expected["pending"] == 2
+        assert expected["running"] == 1
+        PendingTasksLogic.rebuild()
+        self.db.session.commit()
+        with mock.patch.dict(app.config, {"PENDING_TASKS_MATERIALIZED": True}):
+            assert ComplexLogic.get_queue_sizes() == expected
+
+    @pytest.mark.usefixtures("f_users", "f_coprs", "f_mock_chroots", "f_builds",
+                             "f_db", "f_materialized")
+    def test_pending_jobs_single_query(self):
+        self._make_pending()
+        with app.app_context():
+            data = json.loads(self.tc.get("/backend/pending-jobs/").data)
+            assert len(get_debug_queries()) == 1
+        assert len(data) == 4
+
+    @pytest.mark.usefixtures("f_users", "f_coprs", "f_mock_chroots", "f_builds",
+                             "f_db", "f_materialized")
+    def test_pending_all(self):
+        self._make_pending()
+        page = self.tc.get("/status/pending/all/").data.decode("utf-8")
+        assert "user2/foocopr" in page
+        assert "fedora-17-i386" in page
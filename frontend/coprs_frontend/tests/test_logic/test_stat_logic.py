@@ -1,7 +1,8 @@
 # coding: utf-8
 import pytest
 
-from coprs.logic.stat_logic import CounterStatLogic
+from coprs import models
+from coprs.logic.stat_logic import CounterStatLogic, handle_be_stat_message
 from coprs.helpers  import CounterStatType
 from tests.coprs_test_case import CoprsTestCase
 
@@ -30,3 +31,43 @@ class TestStatLogic(CoprsTestCase):
         self.db.session.commit()
         csl = CounterStatLogic.get(self.counter_name).one()
         assert csl.counter == 1
+
+    def test_incr_many(self):
+        CounterStatLogic.incr(self.counter_name, self.counter_type)
+        self.db.session.commit()
+
+        CounterStatLogic.incr_many({
+            (self.counter_name, self.counter_type): 2,
+            ("repo_dl_stat::user@copr:fedora-39", self.counter_type): 3,
+        })
+        self.db.session.commit()
+        assert CounterStatLogic.get(self.counter_name).one().counter == 3
+        assert CounterStatLogic.get(
+            "repo_dl_stat::user@copr:fedora-39").one().counter == 3
+
+    def test_be_stat_message_bulk(self):
+        """
+        Ingest a 100k-keys payload with a constant number of statements per
+        UPSERT_CHUNK_SIZE keys.
+        """
+        keys = 100000
+        hits = {
+            "chroot_rpms_dl_stat|user{0}|project{1}|fedora-39-x86_64"
+            .format(i % 100, i): 1
+            for i in range(keys)
+        }
+        hits["project_rpms_dl_stat|user1|project1"] = 5
+
+        with self.count_queries() as statements:
+            handle_be_stat_message({"hits": hits})
+            handle_be_stat_message({"hits": hits})
+            self.db.session.commit()
+
+        chunks = -(-(keys + 1) // CounterStatLogic.UPSERT_CHUNK_SIZE)
+        assert len(statements) == 2 * chunks
+        assert models.CounterStat.query.count() == keys + 1
+        assert CounterStatLogic.get(
+            "chroot_rpms_dl_stat:hset::user1@project1:fedora-39-x86_64"
+        ).one().counter == 2
+        assert CounterStatLogic.get(
+            "project_rpms_dl_stat:hset::user1@project1").one().counter == 10
@@ -73,6 +73,58 @@ class TestBuildModel(CoprsTestCase):
         assert self.b1.finished
         assert self.b1.finished_early
 
+    @pytest.mark.usefixtures('f_users', 'f_coprs', 'f_mock_chroots', 'f_builds',
+                             'f_db')
+    def test_persisted_status(self):
+        """ the build.status column follows the build (chroot) changes """
+        def _persisted(build_id):
+            return self.db.session.query(self.models.Build._status).filter(
+                self.models.Build.id == build_id).scalar()
+
+        for build in self.basic_builds:
+            assert _persisted(build.id) == build.compute_status()
+
+        build_id = self.b1.id
+        self.db.session.commit()
+        build = self.models.Build.query.get(build_id)
+        assert "build_chroots" not in build.__dict__
+        assert build.status == StatusEnum("succeeded")
+
+        # not flushed yet, and the chroots are not loaded through the build
+        bch = self.models.BuildChroot.query.filter_by(build_id=build_id).first()
+        bch.status = StatusEnum("running")
+        assert "build_chroots" not in build.__dict__
+        assert build.status == StatusEnum("running")
+        self.db.session.commit()
+        assert _persisted(build_id) == StatusEnum("running")
+
+        build.canceled = True
+        self.db.session.commit()
+        assert _persisted(build_id) == StatusEnum("canceled")
+        assert self.models.Build.query.filter(
+            self.models.Build.status == StatusEnum("canceled")).one().id == build_id
+
+    @pytest.mark.usefixtures('f_users', 'f_coprs', 'f_mock_chroots', 'f_builds',
+                             'f_db')
+    def test_status_outdated_flag(self):
+        """ only the builds with changed chroots compute the status """
+        # pylint: disable=protected-access
+        build_id, other_id = self.b1.id, self.b2.id
+        self.db.session.commit()
+        build = self.models.Build.query.get(build_id)
+        other = self.models.Build.query.get(other_id)
+        bch = self.models.BuildChroot.query.filter_by(build_id=build_id).first()
+        assert not build._status_outdated_flag
+
+        bch.status = StatusEnum("failed")
+        assert build._status_outdated_flag
+        assert not other._status_outdated_flag
+        assert build.status == StatusEnum("failed")
+
+        self.db.session.flush()
+        assert not build._status_outdated_flag
+        assert build.status == build._status == StatusEnum("failed")
+
     @pytest.mark.usefixtures('f_users', 'f_coprs', 'f_mock_chroots', 'f_builds',
                              'f_db')
     def test_canceled(self):
@@ -1,3 +1,4 @@
+import gzip
 import json
 
 from unittest import mock, skip
@@ -8,7 +9,7 @@ from flask_sqlalchemy import get_debug_queries
 from copr_common.enums import BackendResultEnum, StatusEnum, DefaultActionPriorityEnum
 from tests.coprs_test_case import CoprsTestCase
 from coprs.logic.builds_logic import BuildsLogic
-from coprs import app
+from coprs import app, models
 
 
 # pylint: disable=unused-argument
@@ -150,6 +151,113 @@ class TestWaitingBuilds(CoprsTestCase):
             'tags': [],
         }]
 
+class TestPendingJobsDelta(CoprsTestCase):
+    """ The incremental /backend/pending-jobs/ feed """
+
+    def _settle(self):
+        """ Make all the changes recorded so far old enough """
+        models.PendingJobChange.query.update({"changed_on": 0})
+        self.db.session.commit()
+
+    def _get(self, url):
+        return json.loads(self.tc.get(url).data.decode("utf-8"))
+
+    def _delta(self, cursor):
+        return self._get("/backend/pending-jobs/delta/{}/".format(cursor))
+
+    @pytest.mark.usefixtures("f_users", "f_coprs", "f_mock_chroots", "f_builds",
+                             "f_db")
+    def test_pending_jobs_delta(self):
+        self._settle()
+        cursor = self._get("/backend/pending-jobs/cursor/")["cursor"]
+        assert cursor > 0
+        assert self._delta(cursor) == {
+            "full": False, "cursor": cursor, "builds": [], "tasks": []}
+
+        for bch in self.b3_bc:
+            bch.status = StatusEnum("pending")
+        self.db.session.commit()
+
+        # not settled yet, the cursor doesn't move but the change is there
+        data = self._delta(cursor)
+        assert data["cursor"] == cursor
+        assert data["builds"] == [self.b3.id]
+        assert {task["task_id"] for task in data["tasks"]} == {
+            "3-fedora-17-x86_64", "3-fedora-17-i386"}
+
+        # the same data as the full queue
+        full = self._get("/backend/pending-jobs/")
+        assert sorted(data["tasks"], key=lambda x: x["task_id"]) == \
+               sorted(full, key=lambda x: x["task_id"])
+
+        self._settle()
+        data = self._delta(cursor)
+        assert data["cursor"] > cursor
+        assert data["builds"] == [self.b3.id]
+        cursor = data["cursor"]
+        assert self._delta(cursor)["builds"] == []
+
+        # canceled builds are removed from the queue
+        self.b3.canceled = True
+        self.db.session.commit()
+        data = self._delta(cursor)
+        assert data["builds"] == [self.b3.id]
+        assert data["tasks"] == []
+
+    @pytest.mark.usefixtures("f_users", "f_coprs", "f_mock_chroots", "f_builds",
+                             "f_db")
+    def test_pending_jobs_delta_unchanged_attributes(self):
+        self._settle()
+        cursor = self._get("/backend/pending-jobs/cursor/")["cursor"]
+        # no "pending-jobs" related change
+        self.b3.result_dir = "changed"
+        self.b3.source_status = self.b3.source_status
+        self.db.session.commit()
+        assert self._delta(cursor)["builds"] == []
+
+    @pytest.mark.usefixtures("f_users", "f_coprs", "f_mock_chroots", "f_builds",
+                             "f_db")
+    def test_pending_jobs_delta_full(self):
+        self._settle()
+        cursor = self._get("/backend/pending-jobs/cursor/")["cursor"]
+        assert self._delta(cursor + 1) == {"full": True}
+
+        for build_chroots in [self.b3_bc, self.b4_bc]:
+            for bch in build_chroots:
+                bch.status = StatusEnum("pending")
+            self.db.session.commit()
+
+        # the latest change is always kept
+        BuildsLogic.vacuum_pending_jobs_changes(max_age=-10)
+        self.db.session.commit()
+        assert models.PendingJobChange.query.count() == 1
+        assert self._delta(cursor) == {"full": True}
+        assert self._delta(cursor + 1)["builds"] == [self.b4.id]
+
+    @pytest.mark.usefixtures("f_users", "f_coprs", "f_mock_chroots", "f_builds",
+                             "f_batches", "f_db")
+    def test_pending_jobs_delta_unblocked(self):
+        self.b2.batch = self.batch2
+        self.b3.batch = self.batch3
+        self.batch3.blocked_by = self.batch2
+        for bch in self.b3_bc:
+            bch.status = StatusEnum("pending")
+        self.db.session.commit()
+        self._settle()
+
+        cursor = self._get("/backend/pending-jobs/cursor/")["cursor"]
+
+        self.b2.source_status = StatusEnum("succeeded")
+        for bch in self.b2_bc:
+            bch.status = StatusEnum("succeeded")
+        self.db.session.commit()
+
+        data = self._delta(cursor)
+        assert data["builds"] == [self.b2.id, self.b3.id]
+        assert {task["task_id"] for task in data["tasks"]} == {
+            "3-fedora-17-x86_64", "3-fedora-17-i386"}
+
+
 # status = 0 # failure
 # status = 1 # succeeded
 class TestUpdateBuilds(CoprsTestCase):
@@ -278,6 +386,27 @@ class TestUpdateBuilds(CoprsTestCase):
         assert updated.status == 1
         assert updated.chroots_ended_on == {'fedora-18-x86_64': 1490866440}
 
+    def test_update_build_ended_gzip(self, f_users, f_coprs, f_mock_chroots,
+                                     f_builds, f_db):
+        self.db.session.commit()
+        headers = {"Content-Encoding": "gzip"}
+        headers.update(self.auth_header)
+        r = self.tc.post("/backend/update/",
+                         content_type="application/json",
+                         headers=headers,
+                         data=gzip.compress(self.data2.encode("utf-8")))
+        assert r.headers["Copr-FE-BE-API-Version"] == "8"
+        assert json.loads(r.data.decode("utf-8"))["updated_builds_ids"] == [1]
+        updated = self.models.Build.query.get(1)
+        assert updated.build_chroots[0].status == 1
+
+        r = self.tc.post("/backend/update/",
+                         content_type="application/json",
+                         headers=headers,
+                         data=self.data2)
+        assert r.status_code == 400
+        assert b"Can not decompress request body" in r.data
+
     def test_update_state_from_dict(self, f_users, f_fork_prepare):
         upd_dict = {'build_id': 6, 'chroot': 'srpm-builds',
                     'destdir': '/var/lib/copr/public_html/results', 'enable_net': False, 'ended_on': 1569919634,
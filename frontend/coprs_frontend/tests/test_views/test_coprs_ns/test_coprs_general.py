@@ -884,6 +884,32 @@ class TestCoprRepoGeneration(CoprsTestCase):
         assert repo_id == config.sections()[2]
         assert config.get(repo_id, "baseurl") == url
 
+    @pytest.mark.usefixtures("f_users", "f_coprs", "f_mock_chroots", "f_db")
+    def test_repofile_runtime_dep_settings_changed(self):
+        """
+        The pre-rendered repofile is re-rendered when the settings of the
+        runtime dependency change.
+        """
+        url = "/coprs/{0}/{1}/repo/fedora-18/some.repo".format(
+            self.u2.name, self.c3.name)
+        dep_section = "coprdep:localhost:{0}:{1}".format(self.u1.name,
+                                                       self.c1.name)
+
+        def _dep_options():
+            config = ConfigParser()
+            config.read_string(self.tc.get(url).data.decode("utf-8"))
+            return dict(config.items(dep_section))
+
+        assert "module_hotfixes" not in _dep_options()
+
+        self.c1.module_hotfixes = True
+        self.db.session.commit()
+        assert _dep_options()["module_hotfixes"] == "1"
+
+        self.c1.repo_priority = 42
+        self.db.session.commit()
+        assert _dep_options()["priority"] == "42"
+
     def test_repofile_group_copr_runtime_deps(self, f_users, f_coprs,
                                               f_mock_chroots, f_group_copr,
                                               f_group_copr_dependent):
@@ -1,6 +1,10 @@
 import os
 import json
+import uuid
 
+import pytest
+
+from copr_common.enums import BuildSourceEnum
 from tests.coprs_test_case import CoprsTestCase
 
 class TestCustomWebhook(CoprsTestCase):
@@ -156,6 +160,62 @@ class TestGithubWebhook(CoprsTestCase):
         )
         assert r.status_code == 403
 
+    @pytest.mark.usefixtures("f_users", "f_coprs", "f_mock_chroots", "f_db")
+    def test_push_burst(self):
+        """
+        Send a burst of push events against a project with many SCM packages,
+        the packages are looked-up by the normalized clone URL
+        """
+        self.c1.webhook_secret = str(uuid.uuid4())
+
+        def _package(name, clone_url):
+            self.db.session.add(self.models.Package(
+                copr=self.c1, name=name, webhook_rebuild=True,
+                source_type=BuildSourceEnum("scm"),
+                source_json=json.dumps({
+                    "type": "git", "clone_url": clone_url, "subdirectory": "",
+                    "committish": "", "spec": "", "srpm_build_method": "rpkg",
+                })))
+
+        # the clone URL spelled differently than in the events
+        for i, suffix in enumerate([".git", "", "/", ".git/"] * 2):
+            _package("pkg-{0}".format(i),
+                     "https://github.com/user1/pkg-{0}{1}".format(i, suffix))
+        # similar URLs, not to be rebuilt
+        for i in range(50):
+            _package("other-{0}".format(i),
+                     "https://github.com/user1/pkg-{0}-other.git".format(i))
+        self.db.session.commit()
+
+        def _event(index, owner, repo, modified):
+            return {
+                "ref": "refs/heads/main",
+                "before": "{0:040x}".format(index),
+                "after": "{0:040x}".format(index + 1),
+                "commits": [{"added": [], "removed": [],
+                             "modified": [modified]}],
+                "repository": {"clone_url": "https://github.com/{0}/{1}.git"
+                                            .format(owner, repo)},
+                "sender": {"login": owner,
+                           "url": "https://api.github.com/users/{0}"
+                                  .format(owner)},
+            }
+
+        # three pushes into each package, and pushes into unknown projects
+        events = [_event(i, "user1", "pkg-{0}".format(i % 8),
+                         "pkg-{0}.spec".format(i % 8)) for i in range(24)]
+        events += [_event(100 + i, "other", "unknown-{0}".format(i),
+                          "README.md") for i in range(8)]
+        for event in events:
+            r = self.github_post(event, self.c1.webhook_secret, self.c1.id,
+                                 {'X-GitHub-Event': 'push'})
+            assert r.status_code == 200
+
+        builds = {package.name: len(package.builds)
+                  for package in self.models.Package.query.all()}
+        assert builds == {
+            name: 3 if name.startswith("pkg-") else 0 for name in builds}
+
 
 class TestGitlabWebhook(CoprsTestCase):
     def gitlab_post(self, data, token, copr_id, headers):
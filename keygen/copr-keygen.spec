@@ -107,19 +107,23 @@ install -d %{buildroot}%{_datadir}/copr-keygen
 install -d %{buildroot}%{_bindir}
 install -d -m 500 %{buildroot}%{_sharedstatedir}/copr-keygen/phrases
 install -d -m 500 %{buildroot}%{_sharedstatedir}/copr-keygen/gnupg
+install -d -m 500 %{buildroot}%{_sharedstatedir}/copr-keygen/pool
 install -d %{buildroot}%{_localstatedir}/log/copr-keygen
 install -d %{buildroot}%{_sysconfdir}/logrotate.d/
 install -d %{buildroot}%{_sysconfdir}/cron.daily
+install -d %{buildroot}%{_sysconfdir}/cron.d
 
 %{__install} -p -m 0755 run/gpg_copr.sh %{buildroot}/%{_bindir}/gpg_copr.sh
 %{__install} -p -m 0755 run/gpg-copr %{buildroot}/%{_bindir}/
 %{__install} -p -m 0755 run/gpg-copr-prolong %{buildroot}/%{_bindir}/
+%{__install} -p -m 0755 run/gpg-copr-fill-pool %{buildroot}/%{_bindir}/
 
 %{__install} -p -m 0755 run/application.py %{buildroot}%{_datadir}/copr-keygen/
 %{__install} -p -m 0644 configs/logrotate %{buildroot}%{_sysconfdir}/logrotate.d/copr-keygen
 
 
 %{__install} -p -m 0755 configs/cron.daily %{buildroot}%{_sysconfdir}/cron.daily/copr-keygen
+%{__install} -p -m 0644 configs/cron.pool %{buildroot}%{_sysconfdir}/cron.d/copr-keygen-pool
 
 cp -a configs/sudoers/copr_signer %{buildroot}%{_sysconfdir}/sudoers.d/copr_signer
 
@@ -158,8 +162,10 @@ systemctl condrestart httpd &>/dev/null || :
 %{_bindir}/gpg_copr.sh
 %{_bindir}/gpg-copr
 %{_bindir}/gpg-copr-prolong
+%{_bindir}/gpg-copr-fill-pool
 
 %config %{_sysconfdir}/cron.daily/*
+%config %{_sysconfdir}/cron.d/copr-keygen-pool
 %config %{_sysconfdir}/logrotate.d/copr-keygen
 %config %{_sysconfdir}/sudoers.d/copr_signer
 
@@ -55,6 +55,7 @@ from copr_keygen.logic import (
     get_passphrase_location,
     validate_name_email,
 )
+from copr_keygen.pool import take_pooled_key
 
 
 @app.route('/ping')
@@ -126,14 +127,28 @@ def gen_key():
             response.status_code = 200
             return response
 
-        create_new_key(
-            app,
-            name_real=query["name_real"],
-            name_email=name_email,
-            name_comment=query.get("name_comment", None),
-            key_length=query.get("key_length", app.config["GPG_KEY_LENGTH"]),
-            expire=query.get("expire", app.config["GPG_EXPIRE"]),
-        )
+        key_length = query.get("key_length", app.config["GPG_KEY_LENGTH"])
+        expire = query.get("expire", app.config["GPG_EXPIRE"])
+
+        # the pre-generated keys have the default length
+        pooled = key_length == app.config["GPG_KEY_LENGTH"] and \
+            take_pooled_key(
+                app,
+                name_real=query["name_real"],
+                name_email=name_email,
+                name_comment=query.get("name_comment", None),
+                expire=expire,
+            )
+
+        if not pooled:
+            create_new_key(
+                app,
+                name_real=query["name_real"],
+                name_email=name_email,
+                name_comment=query.get("name_comment", None),
+                key_length=key_length,
+                expire=expire,
+            )
 
         response = Response("", content_type="text/plain;charset=UTF-8")
         response.status_code = 201
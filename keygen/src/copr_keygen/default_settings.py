@@ -8,6 +8,16 @@ GNUPG_HOMEDIR = "/var/lib/copr-keygen/gnupg"
 GPG_KEY_LENGTH = 2048
 GPG_EXPIRE = "5y"
 
+# Keep this number of pre-generated keys in a separate keyring (filled by
+# gpg-copr-fill-pool), so gen_key doesn't have to wait for the key generation.
+# Set to 0 to always generate the keys on demand.
+KEY_POOL_SIZE = 20
+KEY_POOL_HOMEDIR = "/var/lib/copr-keygen/pool"
+
+# Re-load the in-process index of the existing keys after this many seconds.
+# Keys removed from keyring are reported as existing until the re-load.
+UID_INDEX_TTL = 3600
+
 LOG_DIR = "/var/log/copr-keygen"
 import logging
 LOG_LEVEL = logging.INFO
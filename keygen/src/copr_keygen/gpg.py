@@ -5,3 +5,15 @@ gpg_cmd = [
     '--homedir', app.config['GNUPG_HOMEDIR'],
     '--no-auto-check-trustdb'
 ]
+
+
+def pool_gpg_cmd():
+    """
+    The gpg command operating on the separate keyring with the pool of
+    pre-generated keys
+    """
+    return [
+        app.config['GPG_BINARY'],
+        '--homedir', app.config['KEY_POOL_HOMEDIR'],
+        '--no-auto-check-trustdb'
+    ]
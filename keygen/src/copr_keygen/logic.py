@@ -2,6 +2,8 @@ import traceback
 import os
 import re
 import logging
+import threading
+import time
 
 from subprocess import PIPE, Popen
 import tempfile
@@ -66,6 +68,104 @@ def validate_name_email(name_email):
     return True
 
 
+class UidIndex(object):
+    """
+    In-process index of the e-mails having a key in keyring, loaded by one
+    `gpg --list-keys` call.  Only the positive answers are served from the
+    index; the unknown e-mails are still checked by gpg (the key might have
+    been created by another process in the meantime).
+
+    The index is re-loaded after UID_INDEX_TTL seconds, by one thread and
+    without holding the lock; the other threads keep using the old index
+    until the new one is swapped in.  Keys removed from keyring (copr-keygen
+    never does that, it is a manual admin action) are still reported as
+    existing until the next re-load, so restart the service after removing
+    them.
+    """
+
+    def __init__(self):
+        self.emails = set()
+        self.loaded = None
+        self.loading = False
+        # e-mails added while the index is being re-loaded
+        self.added = set()
+        self.lock = threading.Lock()
+
+    def clear(self):
+        """ Forget everything, the index is re-loaded upon the next check """
+        with self.lock:
+            self.emails = set()
+            self.loaded = None
+
+    def add(self, mail):
+        """ Remember that the key for MAIL exists in keyring """
+        with self.lock:
+            self.emails.add(mail)
+            if self.loading:
+                self.added.add(mail)
+
+    @staticmethod
+    def _load():
+        cmd = gpg_cmd + ["--batch", "--with-colons", "--list-keys"]
+        try:
+            handle = Popen(cmd, stdout=PIPE, stderr=PIPE)
+            stdout, stderr = handle.communicate()
+        except Exception as e:
+            raise GpgErrorException(msg="unhandled exception during gpg call",
+                                    cmd=" ".join(cmd), err=e)
+
+        if handle.returncode != 0:
+            raise GpgErrorException(msg="failed to list keys", cmd=cmd,
+                                    stdout=stdout.decode(),
+                                    stderr=stderr.decode())
+
+        emails = set()
+        for line in stdout.decode("utf-8", errors="replace").splitlines():
+            fields = line.split(":")
+            if fields[0] != "uid" or len(fields) < 10:
+                continue
+            match = re.search(r"<([^>]+)>$", fields[9])
+            if match:
+                emails.add(match.group(1))
+        return emails
+
+    def _reload(self):
+        try:
+            emails = self._load()
+        except GpgErrorException as err:
+            log.warning("can not load UID index: {}".format(err))
+            with self.lock:
+                self.loading = False
+                self.added = set()
+            return
+
+        with self.lock:
+            # the keys added during the listing might be missing in it
+            self.emails = emails | self.added
+            self.loaded = time.time()
+            self.loading = False
+            self.added = set()
+        log.debug("loaded {} UIDs from keyring".format(len(emails)))
+
+    def contains(self, app, mail):
+        """ True if the key for MAIL is known to exist in keyring """
+        with self.lock:
+            reload = not self.loading and (
+                self.loaded is None or
+                time.time() - self.loaded > app.config["UID_INDEX_TTL"])
+            if reload:
+                self.loading = True
+
+        if reload:
+            self._reload()
+
+        with self.lock:
+            return mail in self.emails
+
+
+uid_index = UidIndex()
+
+
 def user_exists(app, mail):
     """ Checks if the user identified by mail presents in keyring
 
@@ -73,6 +173,11 @@ def user_exists(app, mail):
     :raises: GpgErrorException
 
     """
+    if uid_index.contains(app, mail):
+        log.debug("user {} found in UID index".format(mail))
+        ensure_passphrase_exist(app, mail)
+        return True
+
     cmd = gpg_cmd + ["--armor", "--batch", "--export", "<{0}>".format(mail)]
 
     try:
@@ -87,6 +192,7 @@ def user_exists(app, mail):
         # TODO: validate that the key is ultimately trusted
         log.debug("user {} has keys in keyring".format(mail))
         ensure_passphrase_exist(app, mail)
+        uid_index.add(mail)
         return True
     elif "nothing exported" in stderr.decode("utf-8"):
         log.debug("user {} not found in keyring".format(mail))
@@ -0,0 +1,135 @@
+"""
+Pool of pre-generated GPG key-pairs.  Generating a new RSA key takes
+seconds, so the keys are generated in advance (by gpg-copr-fill-pool) into
+a separate keyring, and `gen_key` just binds one of them to the requested
+e-mail, and moves it to the main keyring.
+"""
+
+import logging
+import os
+import uuid
+from subprocess import PIPE, Popen
+
+from .exceptions import GpgErrorException
+from .gpg import gpg_cmd, pool_gpg_cmd
+from .logic import template, user_exists
+from .util import file_lock
+
+log = logging.getLogger(__name__)
+
+POOL_NAME_REAL = "copr-pool"
+POOL_EMAIL = "{0}@pool.copr-keygen.invalid"
+
+
+def _call_gpg(cmd, stdin=None):
+    log.debug("CMD: {}".format(" ".join(cmd)))
+    try:
+        handle = Popen(cmd, stdin=PIPE, stdout=PIPE, stderr=PIPE)
+        stdout, stderr = handle.communicate(stdin)
+    except Exception as e:
+        log.exception(e)
+        raise GpgErrorException(msg="unhandled exception during gpg call",
+                                cmd=" ".join(cmd), err=e)
+
+    if handle.returncode != 0:
+        raise GpgErrorException(msg="gpg call failed", cmd=" ".join(cmd),
+                                stdout=stdout.decode(errors="replace"),
+                                stderr=stderr.decode(errors="replace"))
+    return stdout
+
+
+def pool_keys():
+    """
+    Return the list of fingerprints of the keys in pool, the oldest first
+    """
+    cmd = pool_gpg_cmd() + ["--batch", "--with-colons", "--list-secret-keys"]
+    keys = []
+    in_sec = False
+    for line in _call_gpg(cmd).decode("utf-8").splitlines():
+        fields = line.split(":")
+        if fields[0] == "sec":
+            in_sec = True
+        elif fields[0] == "fpr" and in_sec:
+            keys.append(fields[9])
+            in_sec = False
+    return keys
+
+
+def fill_pool(app, size=None):
+    """
+    Generate new keys into the pool, so there's SIZE of them (by default
+    KEY_POOL_SIZE).  Return the number of generated keys.
+    """
+    size = app.config["KEY_POOL_SIZE"] if size is None else size
+    missing = size - len(pool_keys())
+    for _ in range(missing):
+        params = template.format(
+            key_type="RSA",
+            key_length=app.config["GPG_KEY_LENGTH"],
+            name_real=POOL_NAME_REAL,
+            comment="pre-generated",
+            name_email=POOL_EMAIL.format(uuid.uuid4().hex),
+            expire=0)
+        _call_gpg(pool_gpg_cmd() + ["--batch", "--gen-key"],
+                  stdin=params.encode("utf-8"))
+    if missing > 0:
+        log.info("Generated {} keys into the pool".format(missing))
+    return max(missing, 0)
+
+
+def take_pooled_key(app, name_real, name_email, expire=None,
+                    name_comment=None):
+    """
+    Bind one of the pre-generated keys to NAME_EMAIL, and move it to the main
+    keyring.  Return False if there's no key available in pool (the caller
+    is supposed to generate the key on demand), True on success.
+
+    :raises GpgErrorException: when the key was taken from pool, but failed
+        to be imported to keyring
+    """
+    homedir = app.config["KEY_POOL_HOMEDIR"]
+    if app.config["KEY_POOL_SIZE"] <= 0 or not os.path.isdir(homedir):
+        return False
+
+    uid = "{0} <{1}>".format(name_real, name_email)
+    if name_comment:
+        uid = "{0} ({1}) <{2}>".format(name_real, name_comment, name_email)
+
+    pool = pool_gpg_cmd() + ["--batch"]
+    with file_lock(homedir.rstrip("/") + ".lock"):
+        try:
+            keys = pool_keys()
+            if not keys:
+                log.warning("Key pool is empty")
+                return False
+            fingerprint = keys[0]
+            # Set the expiration first, the new UID self-signature inherits
+            # it.  The other way around gpg waits for the next second, so
+            # the new self-signature is newer than the UID one.
+            _call_gpg(pool + ["--quick-set-expire", fingerprint,
+                              str(expire or 0)])
+            _call_gpg(pool + ["--quick-add-uid", fingerprint, uid])
+            # export the key only with the requested UID, without the
+            # placeholder one
+            secret = _call_gpg(pool + [
+                "--export-filter", "keep-uid=mbox = {0}".format(name_email),
+                "--export-secret-keys", fingerprint])
+            # drop the key from pool before import, so one key is never
+            # assigned to two projects
+            _call_gpg(pool + ["--yes", "--delete-secret-and-public-key",
+                              fingerprint])
+        except GpgErrorException as err:
+            log.error("Can not take a key from pool: {}".format(err))
+            return False
+
+    _call_gpg(gpg_cmd + ["--batch", "--import"], stdin=secret)
+    # the same trust as the keys generated directly in keyring have
+    _call_gpg(gpg_cmd + ["--batch", "--import-ownertrust"],
+              stdin="{0}:6:\n".format(fingerprint).encode("utf-8"))
+
+    if not user_exists(app, name_email):
+        raise GpgErrorException(
+            msg="Key was imported from pool, but not found in keyring")
+    log.info("Assigned pre-generated key {} to: {}".format(fingerprint,
+                                                           name_email))
+    return True
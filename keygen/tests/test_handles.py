@@ -79,6 +79,37 @@ class TestGenKey(object):
         assert user_exists.called
         assert not create_new_key.called
 
+    def test_gen_key_from_pool(self, user_exists, create_new_key):
+        """ Check that the pre-generated key is used when available
+        """
+        user_exists.return_value = False
+
+        with mock.patch("copr_keygen.take_pooled_key") as take:
+            take.return_value = True
+            with app.test_client() as c:
+                rv = c.post('/gen_key', data=json_data)
+                assert rv.status_code == 201
+            assert take.called
+            assert not create_new_key.called
+
+            # pool is empty, or the non-default key length is requested
+            take.return_value = False
+            with app.test_client() as c:
+                rv = c.post('/gen_key', data=json_data)
+                assert rv.status_code == 201
+            assert create_new_key.call_count == 1
+
+            take.reset_mock()
+            with app.test_client() as c:
+                rv = c.post('/gen_key', data=json.dumps({
+                    "name_real": "foo_bar",
+                    "name_email": "foo#bar@example.com",
+                    "key_length": 4096,
+                }))
+                assert rv.status_code == 201
+            assert not take.called
+            assert create_new_key.call_count == 2
+
     def test_server_error_at_user_exists(self, user_exists, _):
         user_exists.side_effect = KeygenServiceBaseException()
 
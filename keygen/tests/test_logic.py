@@ -4,6 +4,7 @@ from unittest import TestCase
 import tempfile
 import shutil
 import os
+import threading
 
 import six
 
@@ -102,6 +103,9 @@ class MockPopenHandle(object):
 @mock.patch("copr_keygen.logic.ensure_passphrase_exist")
 @mock.patch("copr_keygen.logic.Popen")
 class TestUserExists(TestCase):
+    def setUp(self):
+        logic.uid_index.clear()
+
     def test_exists(self, popen, ensure_passphrase):
         stdout = "-----BEGIN PGP PUBLIC KEY BLOCK-----\n\nmQENB..."
         popen.return_value = MockPopenHandle(stdout=stdout)
@@ -126,6 +130,65 @@ class TestUserExists(TestCase):
             logic.user_exists(app, TEST_EMAIL)
 
 
+    def test_uid_index(self, popen, ensure_passphrase):
+        listing = "\n".join([
+            "pub:u:2048:1:8E2FD9C5B7E6A0D1:1600000000:::u:::scESC::::::23::0:",
+            "uid:u::::1600000000::AB12::foo_bar (None) <{0}>::::::::::0:",
+            "uid:r::::1600000000::CD34::revoked <old@example.com>::::::::::0:",
+        ]).format(TEST_EMAIL)
+        popen.return_value = MockPopenHandle(stdout=listing)
+        assert logic.user_exists(app, TEST_EMAIL)
+        assert logic.user_exists(app, "old@example.com")
+        assert logic.user_exists(app, TEST_EMAIL)
+        # one gpg call for the whole index
+        assert popen.call_count == 1
+
+        # the unknown e-mails are checked in keyring, and remembered
+        stdout = "-----BEGIN PGP PUBLIC KEY BLOCK-----\n\nmQENB..."
+        popen.return_value = MockPopenHandle(stdout=stdout)
+        assert logic.user_exists(app, "new@example.com")
+        assert logic.user_exists(app, "new@example.com")
+        assert popen.call_count == 2
+
+    def test_uid_index_reload(self, popen, ensure_passphrase):
+        stderr = "gpg: WARNING: nothing exported"
+        popen.return_value = MockPopenHandle(0, stderr=stderr)
+        with mock.patch.dict(app.config, {"UID_INDEX_TTL": -1}):
+            assert not logic.user_exists(app, TEST_EMAIL)
+            assert not logic.user_exists(app, TEST_EMAIL)
+        # listing + export, twice
+        assert popen.call_count == 4
+
+    def test_uid_index_reload_unlocked(self, popen, ensure_passphrase):
+        index = logic.UidIndex()
+        index.emails = {TEST_EMAIL}
+        index.loaded = 0
+        started = threading.Event()
+        finish = threading.Event()
+
+        def _load():
+            started.set()
+            assert finish.wait(10)
+            return {TEST_EMAIL, "listed@example.com"}
+
+        with mock.patch.object(index, "_load", side_effect=_load) as load:
+            reloading = threading.Thread(target=index.contains,
+                                         args=(app, TEST_EMAIL))
+            reloading.start()
+            assert started.wait(10)
+            # answered from the old index, while the other thread re-loads
+            assert index.contains(app, TEST_EMAIL)
+            assert not index.contains(app, "listed@example.com")
+            index.add("new@example.com")
+            finish.set()
+            reloading.join()
+        assert load.call_count == 1
+
+        # the key added during the re-load isn't forgotten
+        assert index.emails == {TEST_EMAIL, "listed@example.com",
+                                "new@example.com"}
+
+
 @mock.patch("copr_keygen.logic.user_exists")
 @mock.patch("copr_keygen.logic.Popen")
 class TestGenKey(TestCase):
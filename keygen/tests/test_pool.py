@@ -0,0 +1,89 @@
+"""
+Test the pool of pre-generated keys, with a real gpg binary
+"""
+
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+import pytest
+
+from copr_keygen import app
+import copr_keygen.logic as logic
+import copr_keygen.pool as pool
+
+GPG = shutil.which("gpg2") or shutil.which("gpg")
+
+TEST_EMAIL = "foo#bar@copr.fedorahosted.org"
+
+
+@pytest.mark.skipif(not GPG, reason="gpg binary not available")
+class TestPool(object):
+    workdir = None
+
+    def setup_method(self, method):
+        self.workdir = tempfile.mkdtemp(prefix="copr-keygen-test-")
+        for subdir in ["gnupg", "pool", "phrases"]:
+            os.mkdir(os.path.join(self.workdir, subdir), 0o700)
+        gpg_cmd = [GPG, "--homedir", os.path.join(self.workdir, "gnupg"),
+                   "--no-auto-check-trustdb"]
+        self.patchers = [
+            mock.patch.dict(app.config, {
+                "GPG_BINARY": GPG,
+                "GPG_KEY_LENGTH": 1024,
+                "KEY_POOL_SIZE": 2,
+                "KEY_POOL_HOMEDIR": os.path.join(self.workdir, "pool"),
+                "PHRASES_DIR": os.path.join(self.workdir, "phrases"),
+            }),
+            mock.patch("copr_keygen.logic.gpg_cmd", gpg_cmd),
+            mock.patch("copr_keygen.pool.gpg_cmd", gpg_cmd),
+        ]
+        for patcher in self.patchers:
+            patcher.start()
+        logic.uid_index.clear()
+
+    def teardown_method(self, method):
+        for patcher in self.patchers:
+            patcher.stop()
+        logic.uid_index.clear()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def _uids(self):
+        cmd = logic.gpg_cmd + ["--with-colons", "--list-secret-keys"]
+        stdout = pool._call_gpg(cmd).decode("utf-8")
+        return [line.split(":")[9] for line in stdout.splitlines()
+                if line.startswith("uid:")]
+
+    def test_take(self):
+        assert pool.fill_pool(app) == 2
+        assert pool.fill_pool(app) == 0
+        first, second = pool.pool_keys()
+
+        assert not logic.user_exists(app, TEST_EMAIL)
+        assert pool.take_pooled_key(app, "foo_bar", TEST_EMAIL, expire="5y")
+        assert pool.pool_keys() == [second]
+
+        # only the requested UID is moved to keyring
+        assert self._uids() == ["foo_bar <{0}>".format(TEST_EMAIL)]
+        assert logic.user_exists(app, TEST_EMAIL)
+        assert os.path.exists(os.path.join(self.workdir, "phrases",
+                                           TEST_EMAIL))
+        listing = pool._call_gpg(logic.gpg_cmd + [
+            "--with-colons", "--list-keys", first]).decode("utf-8")
+        pub = [line.split(":") for line in listing.splitlines()
+               if line.startswith("pub:")][0]
+        assert pub[8] == "u"  # ultimate ownertrust
+        assert pub[6]  # expires
+
+        assert pool.take_pooled_key(app, "foo_baz", "foo#baz@example.com")
+        # the pool is empty now
+        assert not pool.take_pooled_key(app, "a", "foo#a@example.com")
+        assert pool.fill_pool(app) == 2
+
+    def test_pool_disabled(self):
+        app.config["KEY_POOL_SIZE"] = 0
+        assert not pool.take_pooled_key(app, "foo_bar", TEST_EMAIL)
+        app.config["KEY_POOL_SIZE"] = 2
+        app.config["KEY_POOL_HOMEDIR"] = os.path.join(self.workdir, "missing")
+        assert not pool.take_pooled_key(app, "foo_bar", TEST_EMAIL)
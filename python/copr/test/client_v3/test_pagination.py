@@ -0,0 +1,57 @@
+from requests import Response, PreparedRequest
+from copr.test import mock
+from copr.v3.pagination import next_page, unlimited, all_pages
+from copr.v3.requests import munchify
+
+
+URL = "http://copr/api_3/package/list?ownername=user&projectname=p&limit=2"
+
+
+def _page(items, meta, url):
+    request = PreparedRequest()
+    request.prepare(method="GET", url=url)
+    response = mock.Mock(spec=Response)
+    response.json.return_value = {"items": items, "meta": meta}
+    response.request = request
+    return munchify(response)
+
+
+class TestPagination(object):
+    @mock.patch("requests.Session.send")
+    def test_offset(self, send):
+        meta = {"limit": 2, "offset": 0, "order": "id", "order_type": "ASC"}
+        first = _page([{"id": 1}, {"id": 2}], meta, URL)
+        send.side_effect = [
+            _page([{"id": 3}], dict(meta, offset=2), URL).__response__,
+            _page([], dict(meta, offset=4), URL).__response__,
+        ]
+
+        assert [p.id for p in unlimited(first)] == [1, 2, 3]
+        assert "offset=2" in send.call_args_list[0][0][0].url
+        assert send.call_count == 2
+
+    @mock.patch("requests.Session.send")
+    def test_cursor(self, send):
+        meta = {"limit": 2, "offset": 0, "order": "id", "order_type": "ASC"}
+        pages = {
+            "first": [{"id": 3}, {"id": 4}],
+            "second": [{"id": 5}],
+        }
+
+        def _send(request):
+            cursor = request.url.split("cursor=")[1]
+            items = pages[cursor]
+            return _page(items, dict(meta, next=None if cursor == "second"
+                                     else "second"), request.url).__response__
+        send.side_effect = _send
+
+        first = _page([{"id": 1}, {"id": 2}], dict(meta, next="first"),
+                      URL + "&cursor=")
+        assert [p.id for p in all_pages(first)] == [1, 2, 3, 4, 5]
+        assert send.call_count == 2
+        assert "offset" not in send.call_args_list[0][0][0].url
+
+        # the last page doesn't trigger any request
+        last = next_page(next_page(first))
+        assert list(next_page(last)) == []
+        assert send.call_count == 4
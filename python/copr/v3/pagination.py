@@ -1,6 +1,7 @@
 from __future__ import absolute_import
 
 import requests
+from .helpers import List
 from .requests import munchify
 
 try:
@@ -12,12 +13,24 @@ except ImportError:
 
 
 def next_page(objects):
+    """
+    Fetch the page following the OBJECTS page.  If the OBJECTS page was
+    requested with the "cursor" pagination parameter (and the server supports
+    it), follow the "next" cursor instead of increasing the offset.
+    """
     request = objects.__response__.request
 
-    # Add offset to the previous request URL
     url_parts = list(urlparse.urlparse(request.url))
-    query = dict(urlparse.parse_qsl(url_parts[4]))
-    query.update({"offset": objects.meta.offset + objects.meta.limit})
+    query = dict(urlparse.parse_qsl(url_parts[4], keep_blank_values=True))
+    if "next" in objects.meta:
+        if objects.meta.next is None:
+            # no more objects, return an empty page
+            return List([], meta=objects.meta, response=objects.__response__)
+        query.pop("offset", None)
+        query.update({"cursor": objects.meta.next})
+    else:
+        # Add offset to the previous request URL
+        query.update({"offset": objects.meta.offset + objects.meta.limit})
     url_parts[4] = urlencode(query)
     request.url = urlparse.urlunparse(url_parts)
 
@@ -36,12 +49,14 @@ def all_pages(objects):
 
 
 def unlimited(objects):
+    """
+    Iterate over all the objects, starting with the OBJECTS page, and fetching
+    the following pages on demand.
+    """
     if not objects:
         objects = next_page(objects)
 
-    if not objects:
-        return
-
-    yield objects.pop()
-    for item in unlimited(objects):
-        yield item
+    while objects:
+        for item in objects:
+            yield item
+        objects = next_page(objects)
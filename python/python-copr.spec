@@ -7,7 +7,7 @@
 %endif
 
 Name:       python-copr
-Version:    1.130
+Version:    1.130.1.dev1
 Release:    1%{?dist}
 Summary:    Python interface for Copr
 